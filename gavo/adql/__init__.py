@@ -34,6 +34,8 @@ from gavo.adql.ufunctions import userFunction
 
 from gavo.adql.postproc import builtinMorph
 
+from gavo.adql import descent
+
 
 def getSymbols():
 	return getTreeBuildingGrammar()[0]
@@ -41,12 +43,35 @@ def getSymbols():
 def getGrammar():
 	return getTreeBuildingGrammar()[1]
 
+def _pyparseToTree(adqlStatement):
+	return utils.pyparseString(getGrammar(), adqlStatement)[0]
+
+PARSERS = {
+	"pyparsing": _pyparseToTree,
+	"descent": descent.parseToTree,
+}
+_parseToTree = _pyparseToTree
+
+def useParser(parserName):
+	"""selects the parser used by parseToTree.
+
+	parserName is a key of PARSERS, i.e., pyparsing (the grammar in
+	adql.grammar, the default) or descent (the recursive descent parser
+	in adql.descent).
+	"""
+	global _parseToTree
+	try:
+		_parseToTree = PARSERS[parserName]
+	except KeyError:
+		raise utils.logOldExc(
+			Error("Unknown ADQL parser: %s"%parserName))
+
 def parseToTree(adqlStatement):
 	"""returns a "naked" parse tree for adqlStatement.
 
 	It contains no annotations, so you'll usually not want to use this.
 	"""
-	return utils.pyparseString(getGrammar(), adqlStatement)[0]
+	return _parseToTree(adqlStatement)
 
 def parseAnnotating(adqlStatement, fieldInfoGetter):
 	"""returns a tuple of context, parsedTree for parsing and annotating
@@ -0,0 +1,1208 @@
+"""
+A hand-written recursive descent parser for ADQL.
+
+The pyparsing grammar in grammar.py is nice to read and to extend, but it
+is slow, in particular on queries with deeply nested expressions, and
+pyparsing needs a global lock (see utils.pyparseString).  This module
+provides a drop-in replacement for adql.parseToTree; see adql.useParser
+and the [adql]parser configuration item for how to select it.
+
+The parser builds exactly the same trees as the pyparsing grammar.  To
+make sure of that, it collects the tokens into pyparsing ParseResults
+just like the pyparsing grammar does, including the results names,
+and then feeds them to the node builders bound to the grammar symbols
+in tree.py.  Hence, nodes.py does not care which parser built a tree,
+and the parse methods below are named after the symbols in grammar.py
+(which you will want to have open when working on this).
+
+The rules also follow pyparsing's semantics (ordered choice, greedy
+repetition, "-" making failures fatal, errors reported at the location
+of the alternative that got farthest).  Value expressions are memoized
+per token, which is what keeps the backtracking in predicates and
+parenthesized expressions cheap.
+
+There is one intended difference: function names and the DISTINCT and
+ALL quantifiers in set functions are matched as whole words, whereas the
+pyparsing regular expressions also match prefixes (i.e., the pyparsing
+grammar parses COUNT(allstars) as COUNT(ALL stars)).
+
+If you change grammar.py, you must change this module, too; the
+tests in adqltest.DescentParserTest compare the two parsers' trees.
+"""
+
+#c Copyright 2008-2017, the GAVO project
+#c
+#c This program is free software, covered by the GNU GPL.  See the
+#c COPYING file in the source distribution.
+
+
+import re
+import time
+
+from gavo import stc
+from gavo import utils
+from gavo.adql import grammar
+from gavo.adql import tree
+from gavo.imp.pyparsing import (
+	ParseException, ParseResults, ParseSyntaxException)
+
+
+_tokenRE = re.compile(r"""
+	(?P<ws>[ \t\n\r]+|--[^\n\r]*)
+	|(?P<num>(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?)
+	|(?P<str>'(?:[^'\n\r\\]|''|\\x[0-9a-fA-F]+|\\.)*')
+	|(?P<qid>(?:"[^"]*")+)
+	|(?P<id>[A-Za-z][A-Za-z0-9_]*)
+	|(?P<op>\|\||<=|>=|!=|[=<>(),.*+/-])
+	|(?P<junk>.)""", re.VERBOSE|re.DOTALL)
+
+_tapCoordLiteralRE = re.compile("(?i)'(?P<sys>%s)'$"%"|".join(
+	stc.TAP_SYSTEMS))
+_userDefinedFunctionNameRE = re.compile("(?i)%s_[A-Za-z_]+$"%
+	grammar.userFunctionPrefix)
+
+_COMP_OPS = frozenset(["=", "!=", "<=", ">=", "<", ">"])
+_SET_FUNCTION_TYPES = frozenset(["AVG", "MAX", "MIN", "SUM", "COUNT"])
+_GEOMETRY_KEYWORDS = frozenset(
+	["BOX", "POINT", "CIRCLE", "POLYGON", "REGION", "CENTROID"])
+_TRIG1_FUNCTIONS = frozenset(["ACOS", "ASIN", "ATAN", "COS", "COT", "SIN",
+	"TAN"])
+_MATH1_FUNCTIONS = frozenset(["ABS", "CEILING", "DEGREES", "EXP", "FLOOR",
+	"LOG10", "LOG", "RADIANS", "SQUARE", "SQRT"])
+_OPT_PREC_FUNCTIONS = frozenset(["ROUND", "TRUNCATE"])
+_MATH2_FUNCTIONS = frozenset(["POWER", "MOD"])
+_PREDICATE_GEO_FUNCTIONS = frozenset(["CONTAINS", "INTERSECTS"])
+_POINT_FUNCTIONS = frozenset(["COORD1", "COORD2", "COORDSYS"])
+
+
+_builders = None
+
+def _getBuilders():
+	"""returns a dictionary mapping grammar symbol names to lists of
+	node builders.
+
+	Like tree.getTreeBuildingGrammar, this is computed on first use, so
+	everything passed to tree.registerNode before that is picked up.
+	"""
+	global _builders
+	if _builders is None:
+		builders = {}
+		for symName, nodeClass in tree.iterNodeBindings():
+			builders.setdefault(symName, []).append(
+				tree.getNodeBuilder(nodeClass))
+		_builders = builders
+	return _builders
+
+
+def _maxException(*exceptions):
+	"""returns the exception that got farthest (the first one of these
+	for ties).
+
+	This is what pyparsing's MatchFirst reports for failed alternatives.
+	"""
+	res = exceptions[0]
+	for ex in exceptions[1:]:
+		if ex.loc>res.loc:
+			res = ex
+	return res
+
+
+def _named(toks, name, asList=False, listAll=False):
+	"""returns toks with the results name name set in pyparsing's manner.
+	"""
+	return ParseResults(toks, name, asList=asList, modal=not listAll)
+
+
+class _Parser(object):
+	"""a parser for a single ADQL statement.
+
+	The statement is broken up into tokens on construction.  The lexical
+	conventions are those of grammar.py.  Tokens are kept in parallel lists;
+	the current position is in the attribute i (an index into these lists).
+	"""
+	def __init__(self, adqlStatement):
+		self.source = adqlStatement.expandtabs()
+		self.kinds, self.texts, self.uppers, self.starts = [], [], [], []
+		self.builders = _getBuilders()
+		self.veMemo, self.cveMemo = {}, {}
+		self._tokenize()
+		self.i = 0
+
+	def _tokenize(self):
+		source = self.source
+		for mat in _tokenRE.finditer(source):
+			kind = mat.lastgroup
+			if kind=="ws":
+				continue
+			start, text = mat.start(), mat.group()
+			self.kinds.append(kind)
+			self.texts.append(text)
+			self.starts.append(start)
+			self.uppers.append(text.upper() if kind=="id" else None)
+		self.kinds.append("eof")
+		self.texts.append("")
+		self.uppers.append(None)
+		self.starts.append(len(source))
+
+	############### Helpers
+
+	def _exception(self, msg, index=None):
+		"""returns a ParseException for msg at the current token (or
+		at the token index).
+		"""
+		if index is None:
+			index = self.i
+		return ParseException(self.source, self.starts[index], msg)
+
+	def _isKeyword(self, keyword, offset=0):
+		return self.uppers[self.i+offset]==keyword
+
+	def _isLiteral(self, literal, offset=0):
+		index = self.i+offset
+		return self.kinds[index]=="op" and self.texts[index]==literal
+
+	def _isIdentifier(self, offset=0):
+		index = self.i+offset
+		return (self.kinds[index]=="qid"
+			or (self.kinds[index]=="id"
+				and self.uppers[index] not in grammar.allReservedWords))
+
+	def _isUnsignedInteger(self):
+		return self.kinds[self.i]=="num" and self.texts[self.i].isdigit()
+
+	def _keyword(self, keyword):
+		"""returns ParseResults for keyword if it is the current token, raises
+		a ParseException otherwise.
+		"""
+		if not self._isKeyword(keyword):
+			raise self._exception('Expected "%s"'%keyword)
+		self.i += 1
+		return ParseResults([keyword])
+
+	def _literal(self, literal, msg=None):
+		"""returns ParseResults for literal if it is the current token, raises
+		a ParseException otherwise.
+		"""
+		if not self._isLiteral(literal):
+			raise self._exception(msg or 'Expected "%s"'%literal)
+		self.i += 1
+		return ParseResults([literal])
+
+	def _optionalKeyword(self, keyword):
+		if self._isKeyword(keyword):
+			self.i += 1
+			return ParseResults([keyword])
+		return ParseResults([])
+
+	def _build(self, symName, toks, name=None):
+		"""runs the node builders for symName on toks and returns the
+		resulting ParseResults, named name if given.
+		"""
+		for builder in self.builders.get(symName, ()):
+			res = builder(toks)
+			if res is not None:
+				toks = ParseResults(res)
+		if name:
+			toks = _named(toks, name)
+		return toks
+
+	def _firstOf(self, *alternatives):
+		"""returns the result of the first parse method in alternatives
+		that succeeds (pyparsing's MatchFirst).
+		"""
+		start, exceptions = self.i, []
+		for alternative in alternatives:
+			try:
+				return alternative()
+			except ParseException, ex:
+				exceptions.append(ex)
+				self.i = start
+		raise _maxException(*exceptions)
+
+	def _args(self, toks, asList=False):
+		"""returns toks as the args of a function (grammar.Args).
+
+		asList must be true when toks come from a sequence without a
+		node builder.
+		"""
+		return _named(toks, "args", asList=asList, listAll=True)
+
+	############### Lexical things
+
+	def parse_unsignedInteger(self):
+		if not self._isUnsignedInteger():
+			raise self._exception("Expected unsigned integer")
+		self.i += 1
+		return ParseResults([self.texts[self.i-1]])
+
+	def parse_identifier(self):
+		kind = self.kinds[self.i]
+		if kind=="id":
+			if self.uppers[self.i] in grammar.allReservedWords:
+				raise self._exception("Reserved word not allowed here")
+			res = self.texts[self.i]
+		elif kind=="qid":
+			res = utils.QuotedName(
+				str(self.texts[self.i])[1:-1].replace('""', '"'))
+		else:
+			raise self._exception("Expected identifier")
+		self.i += 1
+		return ParseResults([res])
+
+	def parse_signedInteger(self):
+		toks = ParseResults([])
+		if self.kinds[self.i]=="op" and self.texts[self.i] in "+-":
+			toks += ParseResults([self.texts[self.i]])
+			self.i += 1
+		toks += self.parse_unsignedInteger()
+		return toks
+
+	def parse_characterStringLiteral(self, symName="characterStringLiteral"):
+		if self.kinds[self.i]!="str":
+			raise self._exception("Expected string enclosed in single quotes")
+		start = self.i
+		while self.kinds[self.i]=="str":
+			self.i += 1
+		return self._build(symName, ParseResults(self.texts[start:self.i]))
+
+	############### Identifiers and references
+
+	def parse_qualifier(self, maxParts=3):
+		toks = self.parse_identifier()
+		for _ in range(maxParts-1):
+			if not (self._isLiteral(".") and self._isIdentifier(1)):
+				break
+			self.i += 1
+			toks += ParseResults(["."])
+			toks += self.parse_identifier()
+		return toks
+
+	def parse_tableName(self):
+		return self._build("tableName", self.parse_qualifier(), "tableName")
+
+	def parse_columnReferenceByUCD(self):
+		toks = self._keyword("UCDCOL")
+		toks += self._literal("(")
+		toks += self.parse_characterStringLiteral()
+		toks += self._literal(")")
+		return self._build("columnReferenceByUCD", toks)
+
+	def parse_columnReference(self, symName="columnReference"):
+		if self._isKeyword("UCDCOL"):
+			toks = self._firstOf(self.parse_columnReferenceByUCD,
+				lambda: self.parse_qualifier(4))
+		elif self._isIdentifier():
+			toks = self.parse_qualifier(4)
+		else:
+			raise self._exception('Expected "UCDCOL"')
+		return self._build(symName, toks)
+
+	############### Value expressions
+
+	def parse_setFunctionSpecification(self):
+		start = self.i
+		upper = self.uppers[start]
+		if upper not in _SET_FUNCTION_TYPES:
+			raise self._exception('Expected "COUNT"')
+		self.i += 1
+		toks = _named(ParseResults([self.texts[start]]), "fName")
+		toks += self._literal("(")
+
+		if upper=="COUNT" and self._isLiteral("*") and self._isLiteral(")", 1):
+			self.i += 2
+			toks = _named(ParseResults(["COUNT"]), "fName")
+			toks += ParseResults(["("])
+			toks += self._args(ParseResults(["*"]))
+			toks += ParseResults([")"])
+		else:
+			if self.uppers[self.i] in ("DISTINCT", "ALL"):
+				toks += ParseResults([self.texts[self.i]])
+				self.i += 1
+			toks += self._args(self.parse_valueExpression())
+			toks += self._literal(")")
+		return self._build("setFunctionSpecification", toks)
+
+	def parse_valueExpressionPrimary(self):
+		kind = self.kinds[self.i]
+		if kind=="num":
+			self.i += 1
+			return ParseResults([self.texts[self.i-1]])
+
+		elif kind=="id" or kind=="qid":
+			start = self.i
+			try:
+				return self.parse_columnReference()
+			except ParseException, colRefEx:
+				self.i = start
+			try:
+				return self.parse_setFunctionSpecification()
+			except ParseException, setFunctionEx:
+				raise _maxException(colRefEx, setFunctionEx)
+
+		elif self._isLiteral("("):
+			toks = self._literal("(")
+			toks += self.parse_valueExpression()
+			toks += self._literal(")")
+			return toks
+
+		else:
+			raise self._exception("Expected unsigned literal")
+
+	def _parseNumericArg(self):
+		return self._args(self.parse_numericValueExpression(build=False), True)
+
+	def _parseFunctionCall(self, fName, argParsers):
+		"""parses a function call with arguments parsed by the
+		argParsers.
+
+		fName is the token to use for the function name; the current token is
+		assumed to be the function name.
+		"""
+		self.i += 1
+		toks = _named(ParseResults([fName]), "fName")
+		toks += self._literal("(")
+		for index, parseArg in enumerate(argParsers):
+			if index:
+				toks += self._literal(",")
+			toks += parseArg()
+		toks += self._literal(")")
+		return toks
+
+	def parse_trigFunction(self):
+		if self.uppers[self.i]=="ATAN2":
+			return self._parseFunctionCall("ATAN2",
+				[self._parseNumericArg, self._parseNumericArg])
+		return self._parseFunctionCall(self.texts[self.i],
+			[self._parseNumericArg])
+
+	def parse_mathFunction(self):
+		upper, fName = self.uppers[self.i], self.texts[self.i]
+		if upper=="PI":
+			return self._parseFunctionCall(fName, [])
+
+		elif upper=="RAND":
+			self.i += 1
+			toks = _named(ParseResults([fName]), "fName")
+			toks += self._literal("(")
+			if self._isUnsignedInteger():
+				toks += _named(self.parse_unsignedInteger(), "args", listAll=True)
+			toks += self._literal(")")
+			return toks
+
+		elif upper in _OPT_PREC_FUNCTIONS:
+			self.i += 1
+			toks = _named(ParseResults([fName]), "fName")
+			toks += self._literal("(")
+			toks += self._parseNumericArg()
+			start = self.i
+			if self._isLiteral(","):
+				try:
+					self.i += 1
+					precision = _named(self.parse_signedInteger(), "args",
+						asList=True, listAll=True)
+					toks += ParseResults([","])
+					toks += precision
+				except ParseException:
+					self.i = start
+			toks += self._literal(")")
+			return toks
+
+		elif upper in _MATH2_FUNCTIONS:
+			return self._parseFunctionCall(fName,
+				[self._parseNumericArg, self._parseNumericArg])
+
+		else:
+			return self._parseFunctionCall(fName, [self._parseNumericArg])
+
+	def parse_inUnitFunction(self):
+		toks = self._keyword("IN_UNIT")
+		try:
+			toks += self._literal("(")
+			toks += self.parse_numericValueExpression()
+			toks += self._literal(",")
+			toks += self.parse_characterStringLiteral()
+			toks += self._literal(")")
+		except ParseException, ex:
+			raise ParseSyntaxException(ex)
+		return self._build("inUnitFunction", toks)
+
+	def _parseUserDefinedFunctionParam(self):
+		return self._args(self.parse_valueExpression())
+
+	def parse_userDefinedFunction(self):
+		if not (self.kinds[self.i]=="id"
+				and _userDefinedFunctionNameRE.match(self.texts[self.i])):
+			raise self._exception("Expected Name of locally defined function")
+		self.i += 1
+		toks = _named(ParseResults([self.texts[self.i-1]]), "fName")
+		toks += self._literal("(")
+		toks += self._parseUserDefinedFunctionParam()
+		while self._isLiteral(","):
+			start = self.i
+			try:
+				self.i += 1
+				more = ParseResults([","])
+				more += self._parseUserDefinedFunctionParam()
+			except ParseException:
+				self.i = start
+				break
+			toks += more
+		toks += self._literal(")")
+		return self._build("userDefinedFunction", toks)
+
+	def _parseGeometryArg(self):
+		return self._args(self.parse_geometryValueExpression())
+
+	def _parseCoordValue(self):
+		if self._isKeyword("POINT"):
+			return self._args(self.parse_point())
+		return self._args(self.parse_columnReference())
+
+	def parse_numericGeometryFunction(self):
+		upper, fName = self.uppers[self.i], self.texts[self.i]
+		if upper in _PREDICATE_GEO_FUNCTIONS:
+			return self._build("predicateGeometryFunction",
+				self._parseFunctionCall(fName,
+					[self._parseGeometryArg, self._parseGeometryArg]))
+		elif upper=="DISTANCE":
+			return self._build("distanceFunction",
+				self._parseFunctionCall("DISTANCE",
+					[self._parseCoordValue, self._parseCoordValue]))
+		elif upper in _POINT_FUNCTIONS:
+			return self._build("pointFunction",
+				self._parseFunctionCall(fName, [self._parseCoordValue]))
+		else: # AREA
+			return self._build("area",
+				self._parseFunctionCall("AREA", [self._parseGeometryArg]))
+
+	def _numericFunctionParser(self):
+		"""returns a method parsing the numeric value function starting
+		at the current token, or None if it cannot start one.
+		"""
+		if self.kinds[self.i]!="id":
+			return None
+		upper = self.uppers[self.i]
+		if upper in _TRIG1_FUNCTIONS or upper=="ATAN2":
+			return self.parse_trigFunction
+		elif (upper in _MATH1_FUNCTIONS
+				or upper in _OPT_PREC_FUNCTIONS
+				or upper in _MATH2_FUNCTIONS
+				or upper=="PI"
+				or upper=="RAND"):
+			return self.parse_mathFunction
+		elif upper=="CROSSMATCH":
+			return lambda: self._parseFunctionCall("CROSSMATCH",
+				[self._parseNumericArg]*5)
+		elif upper=="IN_UNIT":
+			return self.parse_inUnitFunction
+		elif _userDefinedFunctionNameRE.match(self.texts[self.i]):
+			return self.parse_userDefinedFunction
+		elif (upper in _PREDICATE_GEO_FUNCTIONS
+				or upper in _POINT_FUNCTIONS
+				or upper=="DISTANCE"
+				or upper=="AREA"):
+			return self.parse_numericGeometryFunction
+		return None
+
+	def parse_numericValueFunction(self):
+		parse = self._numericFunctionParser()
+		if parse is None:
+			raise self._exception("Expected numeric expression")
+		return self._build("numericValueFunction", parse())
+
+	def parse_numericPrimary(self):
+		start, functionEx = self.i, None
+		if self._numericFunctionParser():
+			try:
+				return self.parse_numericValueFunction()
+			except ParseException, functionEx:
+				self.i = start
+
+		try:
+			return self.parse_valueExpressionPrimary()
+		except ParseException, primaryEx:
+			if functionEx is None:
+				functionEx = self._exception("Expected numeric expression", start)
+			raise _maxException(functionEx, primaryEx)
+
+	def parse_factor(self):
+		toks = ParseResults([])
+		if self.kinds[self.i]=="op" and self.texts[self.i] in "+-":
+			toks += ParseResults([self.texts[self.i]])
+			self.i += 1
+		toks += self.parse_numericPrimary()
+		return self._build("factor", toks)
+
+	def _parseOperatorChain(self, operators, parseOperand):
+		"""parses operands separated by operators (as in term and
+		numericValueExpression).
+		"""
+		toks = ParseResults([])
+		toks += parseOperand()
+		while self.kinds[self.i]=="op" and self.texts[self.i] in operators:
+			start = self.i
+			try:
+				more = ParseResults([self.texts[self.i]])
+				self.i += 1
+				more += parseOperand()
+			except ParseException:
+				self.i = start
+				break
+			toks += more
+		return toks
+
+	def parse_term(self):
+		return self._build("term",
+			self._parseOperatorChain(("*", "/"), self.parse_factor))
+
+	def parse_numericValueExpression(self, build=True):
+		toks = self._parseOperatorChain(("+", "-"), self.parse_term)
+		if build:
+			toks = self._build("numericValueExpression", toks)
+		return toks
+
+	def parse_foldFunction(self):
+		if self._isKeyword("UPPER"):
+			toks = _named(self._keyword("UPPER"), "fName")
+		elif self._isKeyword("LOWER"):
+			toks = _named(self._keyword("LOWER"), "fName")
+		else:
+			raise self._exception('Expected "UPPER"')
+		try:
+			toks += self._literal("(")
+			toks += self._args(
+				self.parse_characterValueExpression(build=False), True)
+			toks += self._literal(")")
+		except ParseException, ex:
+			raise ParseSyntaxException(ex)
+		return self._build("stringValueFunction", toks)
+
+	def parse_characterPrimary(self):
+		if self._isKeyword("UPPER") or self._isKeyword("LOWER"):
+			return self.parse_foldFunction()
+		elif self.kinds[self.i]=="str":
+			return self.parse_characterStringLiteral("generalLiteral")
+		else:
+			try:
+				return self.parse_valueExpressionPrimary()
+			except ParseException, ex:
+				raise _maxException(self._exception('Expected "UPPER"'), ex)
+
+	def parse_characterValueExpression(self, build=True):
+		if build:
+			return self._memoized(self.cveMemo,
+				lambda: self.parse_characterValueExpression(False),
+				"stringValueExpression")
+		return self._parseOperatorChain(("||",), self.parse_characterPrimary)
+
+	############### Geometries
+
+	def parse_coordSys(self):
+		if self.kinds[self.i]=="str":
+			mat = _tapCoordLiteralRE.match(self.texts[self.i])
+			if mat:
+				self.i += 1
+				return _named(ParseResults([mat.group("sys").upper()]), "coordSys")
+		elif self._isKeyword("NULL"):
+			self.i += 1
+			return _named(ParseResults(["UNKNOWN"]), "coordSys")
+		raise self._exception(
+			"Expected coordinate system literal (ICRS, GALACTIC,...)")
+
+	def _parseCoordinates(self):
+		toks = self._parseNumericArg()
+		toks += self._literal(",")
+		toks += self._parseNumericArg()
+		return toks
+
+	def _parseGeometryConstructor(self, keyword, parseRest):
+		"""parses a geometry constructor with a coordinate system.
+
+		parseRest is a function returning the tokens after the coordinate
+		system; everything after the keyword is fatal in these constructors.
+		"""
+		toks = _named(self._keyword(keyword), "fName")
+		try:
+			toks += self._literal("(")
+			toks += self.parse_coordSys()
+			toks += self._literal(",")
+			toks += self._parseCoordinates()
+			toks += parseRest()
+			toks += self._literal(")")
+		except ParseException, ex:
+			raise ParseSyntaxException(ex)
+		return self._build(keyword.lower(), toks)
+
+	def parse_point(self):
+		return self._parseGeometryConstructor("POINT",
+			lambda: ParseResults([]))
+
+	def parse_box(self):
+		def parseRest():
+			toks = self._literal(",")
+			toks += self._parseCoordinates()
+			return toks
+		return self._parseGeometryConstructor("BOX", parseRest)
+
+	def parse_circle(self):
+		def parseRest():
+			toks = self._literal(",")
+			toks += self._parseNumericArg()
+			return toks
+		return self._parseGeometryConstructor("CIRCLE", parseRest)
+
+	def parse_polygon(self):
+		def parseRest():
+			toks, matched = ParseResults([]), 0
+			while self._isLiteral(","):
+				start = self.i
+				try:
+					more = self._literal(",")
+					more += self._parseCoordinates()
+				except ParseException:
+					if not matched:
+						raise
+					self.i = start
+					break
+				toks += more
+				matched += 1
+			if not matched:
+				raise self._exception('Expected ","')
+			return toks
+		return self._parseGeometryConstructor("POLYGON", parseRest)
+
+	def parse_region(self):
+		toks = _named(self._keyword("REGION"), "fName")
+		toks += self._literal("(")
+		toks += self._args(
+			self.parse_characterValueExpression(build=False), True)
+		toks += self._literal(")")
+		return self._build("region", toks)
+
+	def parse_centroid(self):
+		toks = _named(self._keyword("CENTROID"), "fName")
+		toks += self._literal("(")
+		toks += self._parseGeometryArg()
+		toks += self._literal(")")
+		return self._build("centroid", toks)
+
+	def parse_geometryValueExpression(self):
+		upper = self.uppers[self.i]
+		if upper in _GEOMETRY_KEYWORDS:
+			return getattr(self, "parse_"+upper.lower())()
+		try:
+			return self.parse_columnReference("geometryValue")
+		except ParseException, ex:
+			raise _maxException(self._exception('Expected "BOX"'), ex)
+
+	############### valueExpression and memoization
+
+	def _memoized(self, memo, parse, symName):
+		"""returns the result of parse() built as symName, memoized
+		per start token in the dictionary memo.
+
+		Failures are memoized, too.
+		"""
+		start = self.i
+		if start not in memo:
+			try:
+				memo[start] = (self._build(symName, parse())[0], self.i)
+			except ParseException, ex:
+				memo[start] = (ex, start)
+		res, self.i = memo[start]
+		if isinstance(res, ParseException):
+			raise res
+		return ParseResults([res])
+
+	def _parseValueExpressionAlternatives(self):
+# pyparsing's LongestMatch of numericValueExpression,
+# stringValueExpression, and geometryValueExpression.  Of these,
+# geometry only matches things numeric and string cannot, and string only
+# gets farther than numeric if there's a concatenation operator.
+		start = self.i
+		if self.uppers[start] in _GEOMETRY_KEYWORDS:
+			return self.parse_geometryValueExpression()
+
+		numericEx = None
+		try:
+			numeric = self.parse_numericValueExpression()
+			if not self._isLiteral("||"):
+				return numeric
+			numericEnd = self.i
+		except ParseException, numericEx:
+			pass
+
+		self.i = start
+		try:
+			string = self.parse_characterValueExpression()
+		except ParseException, stringEx:
+			if numericEx is None:
+				self.i = numericEnd
+				return numeric
+			raise _maxException(numericEx, stringEx)
+
+		if numericEx is None and numericEnd>=self.i:
+			self.i = numericEnd
+			return numeric
+		return string
+
+	def parse_valueExpression(self):
+		return self._memoized(self.veMemo,
+			self._parseValueExpressionAlternatives, "valueExpression")
+
+	############### Select lists
+
+	def parse_derivedColumn(self):
+		toks = _named(self.parse_valueExpression(), "expr")
+		if self._isKeyword("AS") and self._isIdentifier(1):
+			self.i += 1
+			toks += ParseResults(["AS"])
+			toks += _named(self.parse_identifier(), "alias")
+		return self._build("derivedColumn", toks)
+
+	def parse_qualifiedStar(self):
+		toks = self.parse_qualifier()
+		toks += self._literal(".")
+		toks += self._literal("*")
+		return self._build("qualifiedStar", toks)
+
+	def parse_selectSublist(self):
+		return _named(
+			self._firstOf(self.parse_qualifiedStar, self.parse_derivedColumn),
+			"fieldSel", listAll=True)
+
+	def parse_selectList(self):
+		if self._isLiteral("*"):
+			return self._build("selectList",
+				_named(self._literal("*"), "starSel"))
+
+		start = self.i
+		try:
+			toks = self.parse_selectSublist()
+		except ParseException, ex:
+			raise _maxException(self._exception('Expected "*"', start), ex)
+		while self._isLiteral(","):
+			toks += self._literal(",")
+			try:
+				toks += self.parse_selectSublist()
+			except ParseException, ex:
+				raise ParseSyntaxException(ex)
+		return self._build("selectList", toks)
+
+	############### Predicates and search conditions
+
+	def parse_comparisonPredicate(self):
+		toks = self.parse_valueExpression()
+		if not (self.kinds[self.i]=="op" and self.texts[self.i] in _COMP_OPS):
+			raise self._exception("Expected comparison operator")
+		toks += ParseResults([self.texts[self.i]])
+		self.i += 1
+		toks += self.parse_valueExpression()
+		return self._build("comparisonPredicate", toks)
+
+	def parse_betweenPredicate(self):
+		toks = self.parse_valueExpression()
+		toks += self._optionalKeyword("NOT")
+		toks += self._keyword("BETWEEN")
+		try:
+			toks += self.parse_valueExpression()
+			toks += self._keyword("AND")
+			toks += self.parse_valueExpression()
+		except ParseException, ex:
+			raise ParseSyntaxException(ex)
+		return toks
+
+	def _parseInValueList(self):
+		toks = self._literal("(")
+		toks += self.parse_valueExpression()
+		while self._isLiteral(","):
+			start = self.i
+			try:
+				more = self._literal(",")
+				more += self.parse_valueExpression()
+			except ParseException:
+				self.i = start
+				break
+			toks += more
+		toks += self._literal(")")
+		return toks
+
+	def parse_inPredicate(self):
+		toks = self.parse_valueExpression()
+		toks += self._optionalKeyword("NOT")
+		toks += self._keyword("IN")
+		toks += self._firstOf(self.parse_subquery, self._parseInValueList)
+		return toks
+
+	def parse_likePredicate(self):
+		toks = self.parse_characterValueExpression()
+		toks += self._optionalKeyword("NOT")
+		toks += self._keyword("LIKE")
+		toks += self.parse_characterValueExpression()
+		return toks
+
+	def parse_nullPredicate(self):
+		toks = self.parse_columnReference()
+		toks += self._keyword("IS")
+		toks += self._optionalKeyword("NOT")
+		try:
+			toks += self._keyword("NULL")
+		except ParseException, ex:
+			raise ParseSyntaxException(ex)
+		return toks
+
+	def parse_existsPredicate(self):
+		toks = self._keyword("EXISTS")
+		try:
+			toks += self.parse_subquery()
+		except ParseException, ex:
+			raise ParseSyntaxException(ex)
+		return toks
+
+	def parse_predicate(self):
+		return self._firstOf(
+			self.parse_comparisonPredicate,
+			self.parse_betweenPredicate,
+			self.parse_inPredicate,
+			self.parse_likePredicate,
+			self.parse_nullPredicate,
+			self.parse_existsPredicate)
+
+	def parse_booleanPrimary(self):
+		if self._isLiteral("("):
+			start = self.i
+			try:
+				toks = self._literal("(")
+				toks += self.parse_searchCondition()
+				toks += self._literal(")")
+				return toks
+			except ParseException, openerEx:
+				self.i = start
+		else:
+			openerEx = self._exception("Expected boolean expression")
+
+		try:
+			return self.parse_predicate()
+		except ParseException, ex:
+			raise _maxException(openerEx, ex)
+
+	def parse_booleanFactor(self):
+		toks = self._optionalKeyword("NOT")
+		toks += self.parse_booleanPrimary()
+		return toks
+
+	def _parseFatalChain(self, keyword, parseOperand):
+		"""parses operands joined by keyword, where everything after keyword
+		is fatal (booleanTerm, searchCondition).
+		"""
+		toks = parseOperand()
+		while self._isKeyword(keyword):
+			toks += self._keyword(keyword)
+			try:
+				toks += parseOperand()
+			except ParseException, ex:
+				raise ParseSyntaxException(ex)
+		return toks
+
+	def parse_booleanTerm(self):
+		return self._parseFatalChain("AND", self.parse_booleanFactor)
+
+	def parse_searchCondition(self):
+		return self._parseFatalChain("OR", self.parse_booleanTerm)
+
+	############### Tables and joins
+
+	def parse_subquery(self):
+		toks = self._literal("(", "Expected subquery")
+		if self._isKeyword("SELECT"):
+			toks += self.parse_querySpecification()
+		else:
+			toks += self._firstOf(
+				self.parse_querySpecification, self.parse_joinedTable)
+		toks += self._literal(")")
+		return toks
+
+	def _parseCorrelationSpecification(self):
+		toks = self._keyword("AS")
+		toks += _named(self.parse_identifier(), "alias")
+		return toks
+
+	def parse_possiblyAliasedTable(self):
+		toks = self.parse_tableName()
+		if self._isKeyword("AS") and self._isIdentifier(1):
+			toks += self._parseCorrelationSpecification()
+		return self._build("possiblyAliasedTable", toks)
+
+	def parse_derivedTable(self):
+		toks = self.parse_subquery()
+		toks += self._parseCorrelationSpecification()
+		return self._build("derivedTable", toks)
+
+	def parse_subJoin(self):
+		toks = self._literal("(")
+		toks += self.parse_joinedTable()
+		toks += self._literal(")")
+		return self._build("subJoin", toks)
+
+	def parse_joinOperand(self):
+		if self._isLiteral("("):
+			return self._firstOf(self.parse_derivedTable, self.parse_subJoin)
+		return self.parse_possiblyAliasedTable()
+
+	def parse_joinOperator(self):
+		if self._isLiteral(","):
+			return self._build("joinOperator", self._literal(","))
+
+		start = self.i
+		toks = self._optionalKeyword("NATURAL")
+		upper = self.uppers[self.i]
+		if self._isKeyword("INNER") or self._isKeyword("CROSS"):
+			toks += self._keyword(upper)
+		elif (upper in ("LEFT", "RIGHT", "FULL") and self._isKeyword(upper)
+				and self._isKeyword("OUTER", 1)):
+			toks += self._keyword(upper)
+			toks += self._keyword("OUTER")
+		try:
+			toks += self._keyword("JOIN")
+		except ParseException, ex:
+			raise _maxException(ex, self._exception('Expected ","', start))
+		return self._build("joinOperator", toks)
+
+	def parse_joinSpecification(self):
+		if self._isKeyword("ON"):
+			toks = self._keyword("ON")
+			try:
+				toks += self.parse_searchCondition()
+			except ParseException, ex:
+				raise ParseSyntaxException(ex)
+
+		else:
+			toks = self._keyword("USING")
+			toks += self._literal("(")
+			columnNames = self.parse_identifier()
+			while self._isLiteral(",") and self._isIdentifier(1):
+				columnNames += self._literal(",")
+				columnNames += self.parse_identifier()
+			toks += _named(columnNames, "columnNames", asList=True)
+			toks += self._literal(")")
+
+		return self._build("joinSpecification", toks)
+
+	def parse_joinedTable(self):
+		toks = self.parse_joinOperand()
+		while True:
+			start = self.i
+			try:
+				more = self.parse_joinOperator()
+				more += self.parse_joinOperand()
+			except ParseException:
+				self.i = start
+				break
+			if self._isKeyword("ON") or self._isKeyword("USING"):
+				specStart = self.i
+				try:
+					more += self.parse_joinSpecification()
+				except ParseException:
+					self.i = specStart
+			toks += more
+		return self._build("joinedTable", toks)
+
+	############### Table expressions and select statements
+
+	def parse_fromClause(self):
+		toks = self._keyword("FROM")
+		toks += self.parse_joinedTable()
+		return self._build("fromClause", toks, "fromClause")
+
+	def parse_whereClause(self):
+		toks = self._keyword("WHERE")
+		try:
+			toks += self.parse_searchCondition()
+		except ParseException, ex:
+			raise ParseSyntaxException(ex)
+		return self._build("whereClause", toks, "whereClause")
+
+	def parse_groupByClause(self):
+		toks = self._keyword("GROUP")
+		toks += self._keyword("BY")
+		toks += self.parse_columnReference()
+		while self._isLiteral(","):
+			start = self.i
+			try:
+				more = self._literal(",")
+				more += self.parse_columnReference()
+			except ParseException:
+				self.i = start
+				break
+			toks += more
+		return self._build("groupByClause", toks, "groupby")
+
+	def parse_havingClause(self):
+		toks = self._keyword("HAVING")
+		toks += self.parse_searchCondition()
+		return self._build("havingClause", toks, "having")
+
+	def parse_sortSpecification(self):
+		if self._isUnsignedInteger():
+			toks = self.parse_unsignedInteger()
+		else:
+			toks = self.parse_identifier()
+		if self._isKeyword("ASC") or self._isKeyword("DESC"):
+			toks += self._keyword(self.uppers[self.i])
+		return self._build("sortSpecification", toks)
+
+	def parse_orderByClause(self):
+		toks = self._keyword("ORDER")
+		toks += self._keyword("BY")
+		toks += self.parse_sortSpecification()
+		while self._isLiteral(","):
+			start = self.i
+			try:
+				more = self._literal(",")
+				more += self.parse_sortSpecification()
+			except ParseException:
+				self.i = start
+				break
+			toks += more
+		return _named(toks, "orderBy", asList=True)
+
+	def _parseOptional(self, keyword, parse, toks):
+		"""adds the result of parse to toks if the current token
+		is keyword and parse succeeds.
+		"""
+		if self._isKeyword(keyword):
+			start = self.i
+			try:
+				toks += parse()
+			except ParseException:
+				self.i = start
+
+	def parse_tableExpression(self):
+		toks = self.parse_fromClause()
+		self._parseOptional("WHERE", self.parse_whereClause, toks)
+		self._parseOptional("GROUP", self.parse_groupByClause, toks)
+		self._parseOptional("HAVING", self.parse_havingClause, toks)
+		self._parseOptional("ORDER", self.parse_orderByClause, toks)
+		return toks
+
+	def parse_selectNoParens(self):
+		toks = self._keyword("SELECT")
+		if self._isKeyword("DISTINCT") or self._isKeyword("ALL"):
+			toks += _named(self._keyword(self.uppers[self.i]), "setQuantifier")
+		if self._isKeyword("TOP"):
+			toks += self._keyword("TOP")
+			try:
+				toks += _named(self.parse_unsignedInteger(), "setLimit")
+			except ParseException, ex:
+				raise ParseSyntaxException(ex)
+		toks += self.parse_selectList()
+		toks += self.parse_tableExpression()
+		return self._build("selectNoParens", toks)
+
+	def _parseIntersections(self, toks):
+		"""adds (INTERSECT [ALL] selectNoParens)* to toks.
+		"""
+		while self._isKeyword("INTERSECT"):
+			start = self.i
+			try:
+				more = self._keyword("INTERSECT")
+				more += self._optionalKeyword("ALL")
+				more += self.parse_selectNoParens()
+			except ParseException:
+				self.i = start
+				break
+			toks += more
+		return toks
+
+	def parse_setTerm(self):
+		if self._isLiteral("("):
+			toks = self._literal("(")
+			toks += self.parse_querySpecification()
+			toks += self._literal(")")
+		else:
+			toks = self._parseIntersections(self.parse_selectNoParens())
+		return self._build("setTerm", toks)
+
+	def parse_offsetSpec(self):
+		toks = self._keyword("OFFSET")
+		try:
+			toks += _named(self.parse_unsignedInteger(), "offset")
+		except ParseException, ex:
+			raise ParseSyntaxException(ex)
+		return self._build("offsetSpec", toks)
+
+	def parse_querySpecification(self):
+		toks = ParseResults([])
+		toks += self._parseIntersections(self.parse_selectNoParens())
+		while self._isKeyword("UNION") or self._isKeyword("EXCEPT"):
+			start = self.i
+			try:
+				more = self._keyword(self.uppers[self.i])
+				more += self._optionalKeyword("ALL")
+				more += self.parse_setTerm()
+			except ParseException:
+				self.i = start
+				break
+			toks += more
+		if self._isKeyword("OFFSET"):
+			toks += self.parse_offsetSpec()
+		return self._build("querySpecification", toks)
+
+	def parse_statement(self):
+		toks = self.parse_querySpecification()
+		if self.kinds[self.i]!="eof":
+			raise self._exception("Expected end of text")
+		return toks
+
+
+def parseToTree(adqlStatement):
+	"""returns a "naked" parse tree for adqlStatement.
+
+	This is a replacement for adql.parseToTree using the recursive descent
+	parser; it raises the same ParseExceptions as the pyparsing grammar.
+	"""
+	return _Parser(adqlStatement).parse_statement()[0]
+
+
+_BENCHMARK_QUERIES = [
+	"select * from ivoa.obscore",
+	"select top 10 ra, dec, mag from gaia.dr1 where 1=contains("
+		"point('ICRS', ra, dec), circle('ICRS', 10, 20, 0.5)) order by mag",
+	"""select ivo_string_agg(name, '/') as columns, table_name
+		from rr.res_table
+		natural join rr.table_column
+		where ucd in ('time.age', 'pos.eq.ra;meta.main', 'pos.eq.dec;meta.main')
+		and 1=ivo_hasword(table_description, 'star')
+		group by table_name
+		having count(*)>2""",
+	"select a.x, b.y, sqrt(power(a.x-b.x, 2)+power(a.y-b.y, 2)) as d"
+		" from t1 as a join t2 as b on (a.id=b.id and a.z between 1 and 2)"
+		" where ((a.u+b.v)*2>(a.w-3)/4) or a.q is not null",
+	"select x from t where "+"("*20+"x"+")"*20+"=1",
+]
+
+def benchmark(queries=_BENCHMARK_QUERIES, repeat=10):
+	"""returns pairs of parser name and milliseconds per query for
+	parsing queries with each parser in adql.PARSERS.
+	"""
+	from gavo import adql
+	res = []
+	for name, parse in sorted(adql.PARSERS.items()):
+		for query in queries:  # warm up caches and grammars
+			parse(query)
+		startTime = time.time()
+		for i in range(repeat):
+			for query in queries:
+				parse(query)
+		res.append((name,
+			(time.time()-startTime)*1000./repeat/len(queries)))
+	return res
+
+
+if __name__=="__main__":
+	import sys
+	queries = _BENCHMARK_QUERIES
+	if len(sys.argv)>1:
+		queries = [open(fName).read() for fName in sys.argv[1:]]
+	for name, msPerQuery in benchmark(queries):
+		print "%-10s %8.2f ms/query"%(name, msPerQuery)
@@ -29,49 +29,67 @@ def registerNode(node):
 	_additionalNodes.append(node)
 
 
+def getNodeBuilder(nodeClass):
+	"""returns a function turning parse results into nodeClass instances.
+
+	nodeClass can also be a symbolAction.  For collapsible node classes,
+	this inserts autocollapse into the constructor chain.
+	"""
+	if getattr(nodeClass, "collapsible", False):
+		return lambda toks: nodes.autocollapse(nodeClass, toks)
+	else:
+		return nodeClass.fromParseResult
+
+
+def iterNodeBindings():
+	"""iterates over pairs of (symbol name, node class) for the node classes
+	and symbol actions in nodes and the ones registered through registerNode.
+
+	Use getNodeBuilder to obtain functions that turn parse results into nodes.
+	"""
+# To do the bindings, we iterate over the names in the node module, look for
+# all children classes derived from nodes.ADQLNode (but not ADQLNode itself) and
+# first check for a bindings attribute and then their type attribute.
+	def iterForObject(ob):
+		if isinstance(ob, type) and issubclass(ob, nodes.ADQLNode):
+			for binding in getattr(ob, "bindings", [ob.type]):
+				if binding:
+					yield binding, ob
+		if hasattr(ob, "parseActionFor"):
+			for sym in ob.parseActionFor:
+				yield sym, ob
+
+	for name in dir(nodes):
+		for binding in iterForObject(getattr(nodes, name)):
+			yield binding
+
+	for ob in _additionalNodes:
+		for binding in iterForObject(ob):
+			yield binding
+
+
 def getTreeBuildingGrammar():
 	"""returns a pyparsing symbol that can parse ADQL expressions into
 	simple trees of ADQLNodes.
 
 	This symbol is shared, so don't change anything on it.
 	"""
-# To do the bindings, we iterate over the names in the node module, look for
-# all children classes derived from nodes.ADQLNode (but not ADQLNode itself) and
-# first check for a bindings attribute and then their type attribute.  These
-# are then used to add actions to the corresponding symbols.
-
 	global _grammarCache
 	if _grammarCache:
 		return _grammarCache
 	syms, root = grammar.getADQLGrammarCopy()
 
 	def bind(symName, nodeClass):
+		builder = getNodeBuilder(nodeClass)
 		try:
-			if getattr(nodeClass, "collapsible", False):
-				syms[symName].addParseAction(lambda s, pos, toks: 
-					nodes.autocollapse(nodeClass, toks))
-			else:
-				syms[symName].addParseAction(lambda s, pos, toks: 
-					nodeClass.fromParseResult(toks))
+			syms[symName].addParseAction(lambda s, pos, toks: builder(toks))
 		except KeyError:
 			raise utils.logOldExc(
 				KeyError("%s asks for non-existing symbol %s"%(
 					nodeClass.__name__ , symName)))
 
-	def bindObject(ob):
-		if isinstance(ob, type) and issubclass(ob, nodes.ADQLNode):
-			for binding in getattr(ob, "bindings", [ob.type]):
-				if binding:
-					bind(binding, ob)
-		if hasattr(ob, "parseActionFor"):
-			for sym in ob.parseActionFor:
-				bind(sym, ob)
-
-	for name in dir(nodes):
-		bindObject(getattr(nodes, name))
-
-	for ob in _additionalNodes:
-		bindObject(ob)
+	for symName, nodeClass in iterNodeBindings():
+		bind(symName, nodeClass)
 
 	_grammarCache = syms, root
 	return syms, root
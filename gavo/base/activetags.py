@@ -520,16 +520,14 @@ class ReplayedEventsWithFreeAttributesBase(DelayedReplayBase):
 		if self.source and self.source.DEFAULTS is not None:
 			for key, value in self.source.DEFAULTS.defaults.iteritems():
 				if not hasattr(self, "macro_"+key):
-					setattr(self, "macro_"+key, lambda v=value: v)
+					setattr(self, "macro_"+key, macros.ConstantMacro(value))
 		self._completeElementNext(ReplayedEventsWithFreeAttributesBase, ctx)
 
 	def getAttribute(self, name):
 		try:
 			return DelayedReplayBase.getAttribute(self, name)
 		except common.StructureError: # no "real" attribute, it's a macro def
-			def m():
-				return getattr(self, name)
-			setattr(self, "macro_"+name.strip(), m)
+			setattr(self, "macro_"+name.strip(), macros.AttributeMacro(self, name))
 			self.managedAttrs[name] = attrdef.UnicodeAttribute(name)
 			return self.managedAttrs[name]
 
@@ -646,7 +644,7 @@ class Loop(ReplayedEventsWithFreeAttributesBase):
 				if name is None:
 					raise utils.StructureError(
 						"Too many CSV items (extra data: %s)"%value)
-				setattr(self, "macro_"+name.strip(), lambda v=value: v)
+				setattr(self, "macro_"+name.strip(), macros.ConstantMacro(value))
 			self._replayer()
 
 
@@ -16,6 +16,12 @@ base.caches.<accessorName>(key)
 You can additionally provide an isDirty(res) function when calling makeCache.
 This can return True if the resource is out of date and should be reloaded.
 
+Caches made by makeCache are BoundedCache instances.  Unless you
+pass maxEntries, they keep at most [general]memoCacheSize entries;
+by passing maxEntries, maxBytes, or ttl to makeCache, you can limit
+their growth differently (pass maxEntries=None for an unbounded cache).
+getCacheStats returns hit/miss/eviction statistics for all such caches.
+
 An alternative interface to registering caches is the registerCache function
 (see there).
 """
@@ -26,68 +32,280 @@ An alternative interface to registering caches is the registerCache function
 #c COPYING file in the source distribution.
 
 
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
 class CacheRegistry:
 	"""is a registry for caches kept to be able to clear them.
 
-	A cache is assumed to be a dicitonary here.
+	A cache is assumed to be a dicitonary (or a BoundedCache) here.
 	"""
 	def __init__(self):
 		self.knownCaches = []
+		self.namedCaches = {}
 	
 	def clearall(self):
 		for cache in self.knownCaches:
-			for key in cache.keys():
-				del cache[key]
+			cache.clear()
 
 	def clearForName(self, key):
 		for cache in self.knownCaches:
-			if key in cache:
-				del cache[key]
+			cache.pop(key, None)
 
-	def register(self, cache):
+	def register(self, cache, name=None):
 		self.knownCaches.append(cache)
+		if name is not None:
+			self.namedCaches[name] = cache
+
+	def getStats(self):
+		return dict((name, cache.getStats())
+			for name, cache in self.namedCaches.iteritems()
+			if hasattr(cache, "getStats"))
 
 
 _cacheRegistry = CacheRegistry()
 clearCaches = _cacheRegistry.clearall
 clearForName = _cacheRegistry.clearForName
+getCacheStats = _cacheRegistry.getStats
+
+
+def estimateSize(ob):
+	"""returns a (very) rough estimate of the memory taken up by ob in bytes.
+
+	This looks into strings, sequences and dictionaries one level deep;
+	for everything else, it just returns sys.getsizeof.
+	"""
+	size = sys.getsizeof(ob)
+	if isinstance(ob, dict):
+		for key, value in ob.iteritems():
+			size += sys.getsizeof(key)+sys.getsizeof(value)
+	elif isinstance(ob, (list, tuple)):
+		for item in ob:
+			size += sys.getsizeof(item)
+	return size
+
+
+_MISSING = object()
+
+
+class BoundedCache(object):
+	"""A thread-safe, dictionary-like cache with optional bounds.
+
+	The constructor arguments are:
+
+	- maxEntries -- if not None, the least recently used items are evicted
+	  when there are more entries than this.
+	- maxBytes -- if not None, the least recently used items are evicted
+	  when the estimated total size of the values exceeds this; values
+	  larger than maxBytes are not stored at all.
+	- ttl -- if not None, entries older than ttl seconds are discarded
+	  on access.
+	- sizeFunction -- a function returning the size of a value in bytes;
+	  this defaults to estimateSize.  It is only called when maxBytes is
+	  given.
+
+	Only get counts towards the hit and miss statistics; use it rather
+	than a combination of in and item access if you want meaningful
+	statistics.
+	"""
+	def __init__(self, maxEntries=None, maxBytes=None, ttl=None,
+			sizeFunction=estimateSize):
+		self.maxEntries, self.maxBytes, self.ttl = maxEntries, maxBytes, ttl
+		self.sizeFunction = sizeFunction
+		self.lock = threading.RLock()
+		self.entries = OrderedDict()
+		self.totalBytes = 0
+		self.hits = self.misses = self.evictions = self.expirations = 0
+
+	def _isExpired(self, storedAt):
+		return self.ttl is not None and time.time()-storedAt>self.ttl
+
+	def _remove(self, key):
+		value, size, storedAt = self.entries.pop(key)
+		self.totalBytes -= size
+		return value
+
+	def _evict(self):
+		while self.entries and (
+				(self.maxEntries is not None 
+					and len(self.entries)>self.maxEntries)
+				or (self.maxBytes is not None 
+					and self.totalBytes>self.maxBytes)):
+			self._remove(iter(self.entries).next())
+			self.evictions += 1
+
+	def _lookup(self, key):
+		"""returns the value for key or _MISSING, discarding expired entries
+		and updating the LRU order.
+		"""
+		if key not in self.entries:
+			return _MISSING
+		value, size, storedAt = self.entries[key]
+		if self._isExpired(storedAt):
+			self._remove(key)
+			self.expirations += 1
+			return _MISSING
+		del self.entries[key]
+		self.entries[key] = (value, size, storedAt)
+		return value
+
+	def get(self, key, default=None):
+		with self.lock:
+			value = self._lookup(key)
+			if value is _MISSING:
+				self.misses += 1
+				return default
+			self.hits += 1
+			return value
 
+	def peek(self, key, default=None):
+		"""returns the value for key or default without changing the statistics.
+		"""
+		with self.lock:
+			value = self._lookup(key)
+		if value is _MISSING:
+			return default
+		return value
 
-def _makeCache(creator, isDirty):
+	def __getitem__(self, key):
+		with self.lock:
+			value = self._lookup(key)
+		if value is _MISSING:
+			raise KeyError(key)
+		return value
+
+	def __contains__(self, key):
+		with self.lock:
+			return self._lookup(key) is not _MISSING
+
+	def __setitem__(self, key, value):
+		size = 0
+		if self.maxBytes is not None:
+			size = self.sizeFunction(value)
+		with self.lock:
+			if key in self.entries:
+				self._remove(key)
+			if self.maxBytes is not None and size>self.maxBytes:
+				self.evictions += 1
+				return
+			self.entries[key] = (value, size, time.time())
+			self.totalBytes += size
+			self._evict()
+
+	def __delitem__(self, key):
+		with self.lock:
+			self._remove(key)
+
+	def __len__(self):
+		return len(self.entries)
+
+	def pop(self, key, default=None):
+		with self.lock:
+			if key in self.entries:
+				return self._remove(key)
+			return default
+
+	def keys(self):
+		with self.lock:
+			return self.entries.keys()
+
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
+			self.totalBytes = 0
+
+	def getStats(self):
+		"""returns a dictionary of statistics on this cache.
+		"""
+		with self.lock:
+			return {
+				"entries": len(self.entries),
+				"bytes": self.totalBytes,
+				"hits": self.hits,
+				"misses": self.misses,
+				"evictions": self.evictions,
+				"expirations": self.expirations,}
+
+
+def _makeCache(creator, isDirty, name=None, **cacheArgs):
 	"""returns a callable that memoizes the results of creator.
 
 	The creator has to be a function taking an id and returning the 
 	designated object.
 
-	The whole thing is thread-safe only when the creators are.  It is
-	possible that arbitrarily many creators for the same id run.  Only one
-	will win in the end.
+	Concurrent requests for an id not yet in the cache are "single-flight":
+	only one thread runs creator, the others wait for its result.  A creator
+	requesting its own id (in the same thread) will cause creator to be 
+	called recursively, though.
 
-	Race conditions are possible when exceptions occur, but then creators
-	behaviour should only depend on id, and so it shouldn't matter.
+	Exceptions raised by creator are cached as well and raised again on
+	further requests for the id.
 
 	isDirty can be a function returning true when the cache should be
 	cleared.  The function is passed the current resource.  If isDirty
 	is None, no such check is performed.
+
+	The remaining keyword arguments are passed to BoundedCache.
 	"""
-	cache = {}
-	_cacheRegistry.register(cache)
+	cache = BoundedCache(**cacheArgs)
+	_cacheRegistry.register(cache, name)
+	inFlight = {}
+	inFlightLock = threading.Lock()
 
-	def func(id):
-		if isDirty is not None and id in cache and isDirty(cache[id]):
-			clearForName(id)
+	def create(id):
+		with inFlightLock:
+			if id in inFlight:
+				lock, justWait = inFlight[id], True
+			else:
+				lock, justWait = threading.RLock(), False
+				lock.acquire()
+				inFlight[id] = lock
 
-		if not id in cache:
+		if justWait:
+			# someone else is already creating; wait for them to finish
+			# and try the cache again (but only once; if the result has
+			# been evicted again or we are the creating thread, just do it 
+			# ourselves).
+			with lock:
+				res = cache.peek(id, _MISSING)
+			if res is _MISSING:
+				res = creator(id)
+			return res
+
+		try:
 			try:
-				cache[id] = creator(id)
+				res = creator(id)
 			except Exception, exc:
 				cache[id] = exc
 				raise
-		if isinstance(cache[id], Exception):
-			raise cache[id]
+			cache[id] = res
+			return res
+		finally:
+			with inFlightLock:
+				del inFlight[id]
+			lock.release()
+
+	def func(id):
+		res = cache.get(id, _MISSING)
+		if (res is not _MISSING 
+				and isDirty is not None 
+				and not isinstance(res, Exception)
+				and isDirty(res)):
+			clearForName(id)
+			res = _MISSING
+
+		if res is _MISSING:
+			res = create(id)
+
+		if isinstance(res, Exception):
+			raise res
 		else:
-			return cache[id]
+			return res
 
+	func.cache = cache
 	return func
 
 
@@ -105,13 +323,21 @@ def registerCache(name, cacheDict, creationFunction):
 	and such.  For normal use, use makeCache.
 	"""
 	globals()[name] = creationFunction
-	_cacheRegistry.register(cacheDict)
+	_cacheRegistry.register(cacheDict, name)
 	
 
-def makeCache(name, callable, isDirty=None):
+def makeCache(name, callable, isDirty=None, **cacheArgs):
 	"""creates a new function name to cache results to calls to callable.
 
 	isDirty can be a function returning true when the cache should be
 	cleared.  The function is passed the current resource.
+
+	You can pass maxEntries, maxBytes, ttl, and sizeFunction to limit
+	the cache's growth; see BoundedCache for details.  maxEntries
+	defaults to [general]memoCacheSize.
 	"""
-	globals()[name] = _makeCache(callable, isDirty)
+	if "maxEntries" not in cacheArgs:
+		# config imports quite a bit of base, so we can't import it at the top.
+		from gavo.base import config
+		cacheArgs["maxEntries"] = config.get("memoCacheSize")
+	globals()[name] = _makeCache(callable, isDirty, name=name, **cacheArgs)
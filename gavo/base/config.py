@@ -388,6 +388,18 @@ _config = Configuration(
 				" this could be the same as contact.email; in practice, it is"
 				" shown in more technical circumstances, so it's adviable"
 				" to have a narrower distribution here."),
+		BooleanConfigItem("pickleRDs", "False",
+			description="Keep pickles of loaded RDs in cacheDir/rds and restore"
+				" RDs from them rather than parsing them when neither the RD nor"
+				" any RD it used while being parsed has changed.  This speeds up"
+				" server startup and dachs commands.  RDs that cannot be pickled"
+				" (e.g., because they contain execute elements or LOOPs with"
+				" codeItems) or take values from the database are always parsed."),
+		IntConfigItem("memoCacheSize", "1000",
+			description="Maximal number of entries in each of the in-memory"
+				" caches made through base.caches.makeCache (e.g., the per-RD"
+				" page caches of the server); least recently used entries are"
+				" evicted when this is exceeded."),
 		),
 
 	Section('web', 'Settings related to serving content to the web.',
@@ -422,8 +434,33 @@ _config = Configuration(
 			"URL to the documentation of VOPlot"),
 		IntConfigItem("sqlTimeout", "15",
 			"Default timeout for db queries via the web"),
+		IntConfigItem("pageCacheSize", "50000000",
+			"Maximal number of bytes taken up by cached web pages (including"
+			" their gzipped variants); least recently used pages are evicted"
+			" when this is exceeded."),
+		IntConfigItem("sesameCacheSize", "20000",
+			"Maximal number of object names whose resolutions through Simbad"
+			" are kept (in memory and on disk); least recently used ones"
+			" are forgotten when this is exceeded."),
 		WebRelativeConfigItem("previewCache", "previewcache",
 			"Webdir-relative directory to store cached previews in"),
+		IntConfigItem("previewCacheSize", "500000000",
+			"Maximal number of bytes taken up by cached previews; least"
+			" recently used previews are removed when this is exceeded."),
+		IntConfigItem("previewWorkers", "2",
+			"Number of processes computing previews; set to 0 to compute"
+			" previews in threads of the server process."),
+		IntConfigItem("previewQueueSize", "200",
+			"Maximal number of previews waiting for computation; further"
+			" requests for uncached previews are rejected."),
+		IntConfigItem("previewTimeout", "120",
+			"Time (in seconds) after which the computation of a preview in a"
+			" worker process is given up (this is also how the server notices"
+			" workers that died)."),
+		IntConfigItem("fitsQueueSize", "50",
+			"Maximal number of requests waiting for FITS operations that"
+			" need pyfits (e.g., FITS tables, cutouts from compressed images);"
+			" further requests are rejected."),
 		WebRelativeConfigItem("favicon", "None",
 			"Webdir-relative path to a favicon"),
 		BooleanConfigItem("enableTests", "False",
@@ -455,6 +492,13 @@ _config = Configuration(
 	Section('adql', "Settings concerning the built-in ADQL core",
 		IntConfigItem("webDefaultLimit", "2000",
 			"Default match limit for ADQL queries via a web form"),
+		IntConfigItem("morphCacheSize", "1000",
+			"Number of translated ADQL queries kept in memory for re-use;"
+			" set to 0 to disable caching."),
+		EnumeratedConfigItem("parser", "pyparsing",
+			"Parser used for ADQL queries: pyparsing is the reference grammar,"
+			" descent a much faster hand-written parser building the"
+			" same trees.", options=["pyparsing", "descent"]),
 	),
 
 	Section('async', "Settings concerning TAP, UWS, and friends",
@@ -466,6 +510,14 @@ _config = Configuration(
 			" TAP jobs running at a time"),
 		IntConfigItem("maxUserUWSRunningDefault", "2", "Maximum number of"
 			" user UWS jobs running at a time"),
+		IntConfigItem("poolWorkers", "2", "Number of pre-started processes"
+			" executing TAP, datalink and user UWS jobs; when all are busy"
+			" (or with 0), jobs are run in freshly started processes."),
+		IntConfigItem("poolWorkerMaxJobs", "50", "Number of jobs after"
+			" which a pooled UWS worker is replaced."),
+		IntConfigItem("poolWorkerMaxGrowth", "500", "Growth of the peak"
+			" memory usage, in megabytes, after which a pooled UWS worker is"
+			" replaced."),
 		IntConfigItem("defaultLifetime", "172800", "Default"
 			" time to destruction for UWS jobs, in seconds"),
 		IntConfigItem("defaultMAXREC", "2000",
@@ -475,6 +527,9 @@ _config = Configuration(
 			" for ADQL queries via the UWS/TAP"),
 		StringConfigItem("csvDialect", "excel", "CSV dialect as defined"
 			" by the python csv module used when writing CSV files."),
+		BooleanConfigItem("streamSync", "True", "Stream results of sync TAP"
+			" queries without uploads to the client as they come from the"
+			" database rather than running them through a UWS job first."),
 ),
 
 	Section('ui', "Settings concerning the local user interface",
@@ -522,6 +577,11 @@ _config = Configuration(
 			"Version of the spectral data model we generate our spectra"
 			" as (unless someone asks for another version explicitly).",
 			options=["1", "2"]),
+		BooleanConfigItem("materializeObscore", "False",
+			"Keep the rows of ivoa.obscore in an indexed table that is updated"
+			" as contributing tables are imported or dropped rather than"
+			" computing them from a union over all contributing tables on each"
+			" query.  After changing this, run gavo imp //obscore create."),
 	),
 )
 
@@ -19,6 +19,7 @@ log them in some form appropriate to the client.
 
 import contextlib
 import sys
+import time
 
 from gavo import utils
 
@@ -61,6 +62,31 @@ class DispatcherType(type):
 				cls._makeNotifier(name[6:], val)
 
 
+class ImportProgress(object):
+	"""aggregated information on the progress of an import.
+
+	These are what subscribers to the Progress event receive.  They have
+	the following attributes:
+
+	* totalRead, totalShippedOut -- as on the EventDispatcher
+	* sourceName -- the name of the source currently processed (or None)
+	* sourceRead -- the number of rows read from the current source so far
+	* sourceSeconds -- the time spent on the current source so far
+	* rowsPerSecond -- the rate at which rows were read since the last
+	  progress report (for final reports, the average for the source)
+	* sourceDone -- true if this is the final report for a source.
+	"""
+	def __init__(self, totalRead, totalShippedOut, sourceName, 
+			sourceRead, sourceSeconds, rowsPerSecond, sourceDone):
+		self.totalRead, self.totalShippedOut = totalRead, totalShippedOut
+		self.sourceName, self.sourceRead = sourceName, sourceRead
+		self.sourceSeconds, self.rowsPerSecond = sourceSeconds, rowsPerSecond
+		self.sourceDone = sourceDone
+
+	def asDict(self):
+		return self.__dict__.copy()
+
+
 class EventDispatcher(object):
 	"""is the central event dispatcher.
 
@@ -69,6 +95,9 @@ class EventDispatcher(object):
 	"""
 	__metaclass__ = DispatcherType
 
+	# minimal time in seconds between two Progress events within a source
+	progressInterval = 2
+
 	def __init__(self):
 		self.callbacks = dict((name, []) for name in self.eventTypes)
 		self.sourceStack = [None]
@@ -76,6 +105,10 @@ class EventDispatcher(object):
 		self.totalShippedOut = 0
 		self.totalRead = 0
 		self.lastRow = None
+		# pairs of start time and totalRead at start for the sources
+		# in sourceStack
+		self.sourceStarts = [(time.time(), 0)]
+		self.lastProgress = (time.time(), 0)
 
 	@contextlib.contextmanager
 	def suspended(self, evName):
@@ -140,6 +173,8 @@ class EventDispatcher(object):
 			sourceName = utils.makeEllipsis(repr(sourceToken), maxLen=160)
 		self.curSource = sourceName
 		self.sourceStack.append(sourceName)
+		self.sourceStarts.append((time.time(), self.totalRead))
+		self.lastProgress = (time.time(), self.totalRead)
 		return sourceName
 
 	def notifySourceError(self):
@@ -151,6 +186,8 @@ class EventDispatcher(object):
 			lastSource = self.sourceStack.pop()
 		else:
 			lastSource = "Undefined"
+		if len(self.sourceStarts)>1:
+			self.sourceStarts.pop()
 		try:
 			self.curSource = self.sourceStack[-1]
 		except IndexError: # this would be an internal error...
@@ -163,6 +200,10 @@ class EventDispatcher(object):
 		The curSource attribute is updated, and its old value is propagated
 		to the callbacks.
 		"""
+		if len(self.sourceStarts)>1:
+			self.notifyProgress(sourceDone=True)
+			self.sourceStarts.pop()
+
 		try:
 			lastSource = self.sourceStack.pop()
 			self.curSource = self.sourceStack[-1]
@@ -197,6 +238,47 @@ class EventDispatcher(object):
 		self.lastRow = row
 		return row
 
+	def notifyIncomingRows(self, numRows, lastRow):
+		"""is called when a grammar has yielded numRows rows, the last 
+		of which was lastRow.
+
+		This is a batched version of IncomingRow; RowIterators use it
+		rather than notifying every single row.  The side effects on totalRead
+		and lastRow are as for IncomingRow.  The callbacks receive numRows.
+
+		Progress is notified if the last progress report is older than
+		progressInterval.
+		"""
+		self.totalRead += numRows
+		self.lastRow = lastRow
+		if time.time()-self.lastProgress[0]>=self.progressInterval:
+			self.notifyProgress()
+		return numRows
+
+	def notifyProgress(self, sourceDone=False):
+		"""is called when progress on an import should be reported.
+
+		The callbacks receive an ImportProgress instance.  Within a
+		source, this is notified at most every progressInterval seconds,
+		as part of IncomingRows notifications.  Also, SourceFinished 
+		notifies a final Progress for the source (with sourceDone=True) 
+		before its own callbacks are run.
+		"""
+		now = time.time()
+		sourceStart, readAtStart = self.sourceStarts[-1]
+		sourceRead = self.totalRead-readAtStart
+
+		if sourceDone:
+			lastTime, lastRead = sourceStart, readAtStart
+		else:
+			lastTime, lastRead = self.lastProgress
+		self.lastProgress = (now, self.totalRead)
+
+		return ImportProgress(self.totalRead, self.totalShippedOut,
+			self.curSource, sourceRead, now-sourceStart,
+			(self.totalRead-lastRead)/max(now-lastTime, 1e-6),
+			sourceDone)
+
 	def notifyIndexCreation(self, indexName):
 		"""is called when an index on a DB table is created.
 
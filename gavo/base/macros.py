@@ -126,6 +126,10 @@ class MacroPackage(object):
 	Basically, you inherit from this class and define macro_xxx functions.
 	MacroExpander can then call \xxx, possibly with arguments.
 	"""
+	# the expander is re-created on demand (and contains a parser that
+	# cannot be pickled)
+	_volatileAttributes = frozenset(["_MacroPackage__macroExpander"])
+
 	def __findMacro(self, macName):
 		fun = getattr(self, "macro_"+macName, None)
 		if fun is not None:
@@ -278,6 +282,30 @@ class StandardMacroMixin(MacroPackage):
 		return "test macro expansion"
 
 
+class ConstantMacro(object):
+	"""a macro function always returning value.
+
+	Use these rather than closures or lambdas when defining macros on
+	structures, since they can be pickled.
+	"""
+	def __init__(self, value):
+		self.value = value
+	
+	def __call__(self):
+		return self.value
+
+
+class AttributeMacro(object):
+	"""a macro function returning the current value of ob's attribute
+	attName.
+	"""
+	def __init__(self, ob, attName):
+		self.ob, self.attName = ob, attName
+	
+	def __call__(self):
+		return getattr(self.ob, self.attName)
+
+
 class MacDef(structure.Structure):
 	"""A macro definition within an RD.
 
@@ -298,9 +326,8 @@ class MacDef(structure.Structure):
 
 	def onElementComplete(self):
 		self._onElementCompleteNext(MacDef)
-		def mac():
-			return self.content_
-		setattr(self.parent, "macro_"+self.name, mac)
+		setattr(self.parent, "macro_"+self.name, 
+			AttributeMacro(self, "content_"))
 
 
 def MacDefAttribute(**kwargs):
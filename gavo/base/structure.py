@@ -304,7 +304,21 @@ class StructureBase(object):
 				if hasattr(child, "breakCircles"):
 					child.breakCircles()
 				delattr(child, "parent")
-		
+
+	def __getstate__(self):
+		"""returns the instance dictionary for pickling.
+
+		This leaves out values memoized on the structure (which frequently
+		are closures and will be re-computed on demand) as well as
+		any attributes named in the _volatileAttributes attributes of
+		the structure's classes (including mixins).
+		"""
+		volatile = set()
+		for cls in self.__class__.__mro__:
+			volatile.update(cls.__dict__.get("_volatileAttributes", ()))
+		return dict((key, value) for key, value in self.__dict__.iteritems()
+			if not key.startswith("_cache") and key not in volatile)
+
 
 class ParseableStructure(StructureBase, common.Parser):
 	"""is a base class for Structures parseable from EventProcessors (and
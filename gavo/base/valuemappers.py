@@ -108,12 +108,17 @@ class SerManager(utils.IdManagerMixin):
 			useGlobals=dict(("map%d"%index, mapper) 
 				for index, mapper in enumerate(self.mappers)))
 
-	def _makeDictFactory(self):
+	def _makeDictFactory(self, rowClass=None):
 		"""returns a function that returns a dictionary of mapped values
 		for a row dictionary.
+
+		If rowClass is a utils.CompactRow class, the function takes
+		rows of that class instead.
 		"""
 		colLabels = [str(c["name"]) for c in self]
 		funDef = ["def buildRec(rowDict):"]
+		if rowClass is not None:
+			funDef.append("\trowDict = rowDict.asDict()")
 		for index, label in enumerate(colLabels):
 			if self.mappers[index] is not utils.identity:
 				funDef.append("\trowDict[%r] = map%d(rowDict[%r])"%(
@@ -121,38 +126,64 @@ class SerManager(utils.IdManagerMixin):
 		funDef.append("\treturn rowDict")
 		return self._compileMapFunction(funDef)
 
-	def _makeTupleFactory(self):
+	def _makeTupleFactory(self, rowClass=None):
 		"""returns a function that returns a tuple of mapped values
 		for a row dictionary.
+
+		If rowClass is a utils.CompactRow class, the function takes
+		rows of that class instead and picks the values by position,
+		which saves the dictionary lookups.
 		"""
-		funDef = ["def buildRec(rowDict):", "\treturn ("]
+		if rowClass is None:
+			funDef = ["def buildRec(rowDict):", "\treturn ("]
+			getSource = lambda name: "rowDict[%r]"%name
+		else:
+			funDef = ["def buildRec(row):",
+				"\t%s, = row"%", ".join(
+					"v%d"%i for i in range(len(rowClass.fieldNames))),
+				"\treturn ("]
+			getSource = lambda name: "v%d"%rowClass.fieldIndex[name]
+
 		for index, cd in enumerate(self):
 			if self.mappers[index] is utils.identity:
-				funDef.append("\t\trowDict[%r],"%cd["name"])
+				funDef.append("\t\t%s,"%getSource(cd["name"]))
 			else:
-				funDef.append("\t\tmap%d(rowDict[%r]),"%(index, cd["name"]))
+				funDef.append("\t\tmap%d(%s),"%(index, getSource(cd["name"])))
 		funDef.append("\t)")
 		return self._compileMapFunction(funDef)
 
-	def _iterWithMaps(self, buildRec):
+	def _iterWithMaps(self, makeFactory):
 		"""helps getMapped(Values|Tuples).
+
+		makeFactory is one of the _make*Factory methods; it is called
+		with the class of the table's rows if these are utils.CompactRows.
 		"""
 		colLabels = [f.name for f in self.table.tableDef]
 		if not colLabels:
 			yield ()
 			return
-		for row in self.table:
+
+		rows = iter(self.table)
+		for row in rows:
+			if isinstance(row, utils.CompactRow):
+				buildRec = makeFactory(row.__class__)
+			else:
+				buildRec = makeFactory()
+			yield buildRec(row)
+			break
+
+		for row in rows:
 			yield buildRec(row)
 
 	def getMappedValues(self):
 		"""iterates over the table's rows as dicts with mapped values.
 		"""
-		return self._iterWithMaps(self._makeDictFactory())
+		return self._iterWithMaps(self._makeDictFactory)
 
 	def getMappedTuples(self):
 		"""iterates over the table's rows as tuples with mapped values.
 		"""
-		return self._iterWithMaps(self._makeTupleFactory())
+		return self._iterWithMaps(self._makeTupleFactory)
 
 
 def needsQuoting(identifier, forRowmaker=False):
@@ -104,22 +104,40 @@ def _makeValueArray(values, colInd, colDesc):
 	return typecode, arr
 
 
-def _makeExtension(serMan):
-	"""returns a pyfits hdu for the valuemappers.SerManager instance table.
+def _makeColumnArrays(serMan):
+	"""returns a list of pairs of (colDesc, (typecode, array)) for the
+	columns of the valuemappers.SerManager instance serMan.
+
+	This is where the actual data is mapped and converted; it does not
+	use pyfits and hence does not need the fitsLock.
 	"""
 	values = list(serMan.getMappedTuples())
-	columns = []
-	utypes = []
-	descriptions = []
+	columnArrays = []
 
 	for colInd, colDesc in enumerate(serMan):
-		descriptions.append(colDesc["description"])
 		if colDesc["datatype"]=="char" or colDesc["datatype"]=="unicodeChar":
 			makeArray = _makeStringArray
 		else:
 			makeArray = _makeValueArray
-		
-		typecode, arr = makeArray(values, colInd, colDesc)
+		columnArrays.append((colDesc, makeArray(values, colInd, colDesc)))
+	
+	return columnArrays
+
+
+def _makeExtension(serMan, columnArrays=None):
+	"""returns a pyfits hdu for the valuemappers.SerManager instance table.
+
+	columnArrays is what _makeColumnArrays returns for serMan; it is
+	computed if not passed in.
+	"""
+	if columnArrays is None:
+		columnArrays = _makeColumnArrays(serMan)
+	columns = []
+	utypes = []
+	descriptions = []
+
+	for colInd, (colDesc, (typecode, arr)) in enumerate(columnArrays):
+		descriptions.append(colDesc["description"])
 		if typecode in 'ED':
 			nullValue = None  # (NaN implied)
 		else:
@@ -164,21 +182,32 @@ def _makeExtension(serMan):
 	return hdu
 	
 
-def _makeFITSTableNOLOCK(dataSet, acquireSamples=True):
-	"""returns a hdulist containing extensions for the tables in dataSet.
+def _makeHDUList(tables, columnArrays):
+	"""returns a hdulist for SerManagers tables with _makeColumnArrays results 
+	columnArrays.
 
 	You must make sure that this function is only executed once
 	since pyfits is not thread-safe.
 	"""
-	tables = [base.SerManager(table, acquireSamples=acquireSamples) 
-		for table in dataSet.tables.values()]
-	extensions = [_makeExtension(table) for table in tables]
+	extensions = [_makeExtension(table, arrays) 
+		for table, arrays in zip(tables, columnArrays)]
 	primary = pyfits.PrimaryHDU()
 	primary.header.update("DATE", time.strftime("%Y-%m-%d"), 
 		"Date file was written")
 	return pyfits.HDUList([primary]+extensions)
 
 
+def _makeFITSTableNOLOCK(dataSet, acquireSamples=True):
+	"""returns a hdulist containing extensions for the tables in dataSet.
+
+	You must make sure that this function is only executed once
+	since pyfits is not thread-safe.
+	"""
+	tables = [base.SerManager(table, acquireSamples=acquireSamples) 
+		for table in dataSet.tables.values()]
+	return _makeHDUList(tables, [_makeColumnArrays(t) for t in tables])
+
+
 def makeFITSTable(dataSet, acquireSamples=False):
 	"""returns a hdulist containing extensions for the tables in dataSet.
 
@@ -186,11 +215,17 @@ def makeFITSTable(dataSet, acquireSamples=False):
 	the main server, always use threads or separate processes (until
 	pyfits is fixed to be thread-safe).
 
+	Mapping and converting the values happens before the fitsLock
+	is acquired, so only building the HDUs themselves is serialised.
+
 	This will add table parameters as header cards on the resulting FITS
 	header.
 	"""
-	with utils.fitsLock():
-		return _makeFITSTableNOLOCK(dataSet, acquireSamples)
+	tables = [base.SerManager(table, acquireSamples=acquireSamples) 
+		for table in dataSet.tables.values()]
+	columnArrays = [_makeColumnArrays(t) for t in tables]
+	with utils.fitsLock("fitstable"):
+		return _makeHDUList(tables, columnArrays)
 
 
 def writeFITSTableFile(hdulist):
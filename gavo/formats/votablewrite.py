@@ -540,6 +540,48 @@ def makeTable(ctx, table):
 			overflowElement=ctx.overflowElement)
 
 
+class _StreamStatusElement(votable.OverflowElement):
+	"""An OverflowElement for rsc.StreamingQueryTables.
+
+	These know whether they overflowed or failed once they are exhausted, 
+	so rather than comparing delivered rows with a limit, we ask them.
+	overflowStan may be None if overflows are reported elsewhere.
+	"""
+	def __init__(self, table, overflowStan):
+		self.table, self.reportOverflow = table, overflowStan is not None
+		if overflowStan is None:
+			overflowStan = V.INFO()
+		votable.OverflowElement.__init__(self, table.matchLimit, overflowStan)
+
+	def write(self, outputFile):
+		if self.table.error is not None:
+			errorStan = V.INFO(name="QUERY_STATUS", value="ERROR")[
+				unicode(self.table.error)]
+			errorStan._fixedTagMaterial = ""
+			votable.write(errorStan, outputFile, xmlDecl=False)
+		elif self.reportOverflow and self.table.overflowed:
+			votable.write(self.overflowStan, outputFile, xmlDecl=False)
+
+
+def _iterStreamStatusElements(ctx, data):
+	"""yields status elements for the streaming tables in data.
+
+	These report errors occurring while the rows are fetched and, unless
+	the context already has an overflow element, overflows.  Database 
+	errors while writing these tables will therefore not be raised but 
+	reported in-band.
+	"""
+	for table in data:
+		if isinstance(table, rsc.StreamingQueryTable):
+			table.errorsInBand = True
+			overflowStan = None
+			if ctx.overflowElement is None and table.matchLimit:
+				overflowStan = V.INFO(name="QUERY_STATUS", value="OVERFLOW")[
+					"The query limit was reached.  Increase it"
+					" to retrieve more matches."]
+			yield _StreamStatusElement(table, overflowStan)
+
+
 def _makeResource(ctx, data):
 	"""returns a Resource node for the rsc.Data instance data.
 	"""
@@ -556,6 +598,7 @@ def _makeResource(ctx, data):
 			with ctx.buildingFromTable(table):
 				res[makeTable(ctx, table)]
 		res[ctx.overflowElement]
+		res[list(_iterStreamStatusElements(ctx, data))]
 	return res
 
 ############################# Toplevel/User-exposed code
@@ -314,8 +314,15 @@ class RowIterator(object):
 
 	_iterRows should arrange for the instance variable recNo to be incremented
 	by one for each item returned.
+
+	If notify is true, the RowIterator tells base.ui about the rows it
+	yields; to keep this cheap, it does so in chunks of notifyChunkSize
+	rows (and when the source is exhausted or fails).
 	"""
 	notify = True
+	notifyChunkSize = 1000
+	# class defaults so user RowIterators not calling our __init__ work
+	_pendingRows, _lastRow = 0, None
 
 	def __init__(self, grammar, sourceToken, sourceRow=None):
 		self.grammar, self.sourceToken = grammar, sourceToken
@@ -353,14 +360,34 @@ class RowIterator(object):
 						d.update(self.sourceRow)
 					d["parser_"] = self
 
+					if self.notify:
+						self._pendingRows += 1
+						self._lastRow = row
+						if self._pendingRows>=self.notifyChunkSize:
+							self._notifyPendingRows()
+
 				yield row
+		except GeneratorExit:
+			# our consumer has had enough (e.g., maxRows); make sure the
+			# rows it has seen are accounted for and the source is closed.
+			self._notifyPendingRows()
+			if self.notify:
+				base.ui.notifySourceFinished()
+			raise
 		except Exception:
+			self._notifyPendingRows()
 			base.ui.notifySourceError()
 			raise
 
+		self._notifyPendingRows()
 		if self.notify:
 			base.ui.notifySourceFinished()
 
+	def _notifyPendingRows(self):
+		if self._pendingRows:
+			base.ui.notifyIncomingRows(self._pendingRows, self._lastRow)
+			self._pendingRows, self._lastRow = 0, None
+
 	def _filteredIter(self, baseIter):
 		for row in baseIter:
 			if not self.grammar.ignoreOn(row):
@@ -10,6 +10,7 @@ A grammars defined by code embedded in the RD.
 
 from gavo import base
 from gavo import rscdef
+from gavo import utils
 from gavo.grammars import common
 
 
@@ -88,8 +89,7 @@ class EmbeddedGrammar(common.Grammar, base.RestrictionMixin):
 			" for other grammars; embedded grammars often have odd source"
 			" tokens for which you don't want that).", copyable=True)
 	
-	def onElementComplete(self):
-		self._onElementCompleteNext(EmbeddedGrammar)
+	def _makeRowIterator(self):
 		class RowIterator(common.RowIterator):
 			_iterRows = self.iterator.compile()
 			notify = self.notify
@@ -97,4 +97,15 @@ class EmbeddedGrammar(common.Grammar, base.RestrictionMixin):
 		if self.pargetter:
 			RowIterator.getParameters = self.pargetter.compile()
 
-		self.rowIterator = RowIterator
+		return RowIterator
+
+	# this is memoized rather than set as an attribute in onElementComplete
+	# so pickled RDs (see rscdesc) don't need to contain the class.
+	@property
+	def rowIterator(self):
+		return utils.memoizeOn(self, self, self._makeRowIterator)
+
+	def onElementComplete(self):
+		self._onElementCompleteNext(EmbeddedGrammar)
+		# compile the code now so errors are reported while parsing
+		self.rowIterator
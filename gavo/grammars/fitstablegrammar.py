@@ -13,17 +13,81 @@ from gavo.grammars import common
 
 from gavo.utils import pyfits
 
+
+def _toNativeOrder(arr):
+	"""returns arr in the machine's native byte order.
+
+	FITS data is big-endian; converting a column once per chunk is much
+	cheaper than having numpy swap bytes for every single value we pull
+	out.
+	"""
+	if not arr.dtype.isnative:
+		return arr.astype(arr.dtype.newbyteorder("="))
+	return arr
+
+
+def _columnToList(arr):
+	"""returns a list of python values for the column array arr.
+
+	Array-valued columns (more than one dimension) come back as
+	a list of numpy arrays, one per row, as in the row-based parse.
+	"""
+	if arr.ndim>1:
+		return list(arr)
+	return arr.tolist()
+
+
 class FITSTableIterator(common.RowIterator):
 	"""The row iterator for FITSTableGrammars.
+
+	If the grammar has a chunkSize, the table is memory-mapped and
+	processed in slices of that many rows.
 	"""
+	def _openTable(self):
+		return pyfits.open(self.sourceToken, 
+			memmap=self.grammar.chunkSize is not None)
+
+	def _iterChunks(self):
+		"""iterates over dictionaries mapping column names to numpy arrays
+		(in native byte order) with at most chunkSize rows.
+		"""
+		hdus = self._openTable()
+		try:
+			fitsTable = hdus[self.grammar.hdu].data
+			names = fitsTable.dtype.names
+			chunkSize = self.grammar.chunkSize
+
+			for start in xrange(0, len(fitsTable), chunkSize):
+				chunk = fitsTable[start:start+chunkSize]
+				yield dict((name, _toNativeOrder(chunk.field(name)))
+					for name in names)
+		finally:
+			hdus.close()
+
+	def _iterRowsChunked(self):
+		for columns in self._iterChunks():
+			names = columns.keys()
+			for values in zip(*[_columnToList(columns[name]) for name in names]):
+				self.recNo += 1
+				yield dict(zip(names, values))
+
 	def _iterRows(self):
+		if self.grammar.chunkSize is not None:
+			for row in self._iterRowsChunked():
+				yield row
+			return
+
 		hdus = pyfits.open(self.sourceToken)
 		fitsTable = hdus[self.grammar.hdu].data
 		names = [n for n in fitsTable.dtype.names]
 		for row in fitsTable:
+			self.recNo += 1
 			res = dict(zip(names, row))
 			yield res
 
+	def getLocator(self):
+		return "%s, row %s"%(self.sourceToken, self.recNo)
+
 
 class FITSTableGrammar(common.Grammar):
 	"""A grammar parsing from FITS tables.
@@ -34,6 +98,11 @@ class FITSTableGrammar(common.Grammar):
 
 	The keys of the result dictionaries are simpily the names given in
 	the FITS.
+
+	For large tables, set chunkSize.  The grammar will then memory-map the
+	file and convert the table in slices of that many rows, such that 
+	tables larger than the available RAM can be ingested.  In this mode,
+	scalar values come as python rather than numpy values.
 	"""
 	name_ = "fitsTableGrammar"
 
@@ -41,4 +110,13 @@ class FITSTableGrammar(common.Grammar):
 		description="Take the data from this extension (primary=0)."
 			" Tabular data typically resides in the first extension.")
 
+	_chunkSize = base.IntAttribute("chunkSize", default=None,
+		description="If given, memory-map the FITS file and read the table"
+			" in chunks of this many rows (try 10000 or so for large tables).")
+
 	rowIterator = FITSTableIterator
+
+	def validate(self):
+		self._validateNext(FITSTableGrammar)
+		if self.chunkSize is not None and self.chunkSize<1:
+			raise base.StructureError("chunkSize must be positive.")
@@ -8,6 +8,7 @@ Code to bind the adql library to the data center software.
 #c COPYING file in the source distribution.
 
 
+import re
 import sys
 
 
@@ -259,10 +260,63 @@ def _addTableMeta(query, tree, table):
 			pass
 
 
-def morphADQL(query, metaProfile=None, tdsForUploads=[], 
+class _MorphedQuery(object):
+	"""The result of morphing an ADQL query, as kept in the morph cache.
+
+	This has the postgres query, the TableDef of the result, the meta items
+	to add to result tables (morphADQL passes an instance in place of the
+	result table to collect them), and the ids and load times of the RDs 
+	the query's tables come from.
+	"""
+	def __init__(self, tableDef):
+		self.tableDef = tableDef
+		self.query = None
+		self.rdVersions = []
+		self.metaCalls = []
+	
+	def addMeta(self, *args, **kwargs):
+		self.metaCalls.append((args, kwargs))
+	
+	def isCurrent(self):
+		"""returns False if any RD the query was morphed against has been
+		reloaded in the meantime.
+		"""
+		for rdId, loadedAt in self.rdVersions:
+			try:
+				if base.caches.getRD(rdId).loadedAt!=loadedAt:
+					return False
+			except Exception:
+				return False
+		return True
+
+	def makeTable(self):
+		"""returns a fresh result table for the query.
+		"""
+		table = rsc.TableForDef(self.tableDef)
+		for args, kwargs in self.metaCalls:
+			table.addMeta(*args, **kwargs)
+		return table
+
+
+def _getRDVersions(tree):
+	"""returns pairs of RD id and load time for the RDs of the tables 
+	contributing to the parsed ADQL tree.
+	"""
+	mth = base.caches.getMTH(None)
+	versions = set()
+	for tableName in tree.getContributingNames():
+		try:
+			rd = mth.getTableDefForTable(tableName).rd
+		except base.Error:
+			# not a table we know; the morph will not depend on it then.
+			continue
+		versions.add((rd.sourceId, rd.loadedAt))
+	return list(versions)
+
+
+def _morphADQLUncached(query, metaProfile=None, tdsForUploads=[], 
 		externalLimit=None, hardLimit=None):
-	"""returns an postgres query and an (empty) result table for the
-	ADQL in query.
+	"""returns a _MorphedQuery for the ADQL in query.
 	"""
 	ctx, t = adql.parseAnnotating(query,
 		getFieldInfoGetter(metaProfile, tdsForUploads))
@@ -272,23 +326,79 @@ def morphADQL(query, metaProfile=None, tdsForUploads=[],
 		else:
 			t.setLimit = str(int(externalLimit))
 
-	table = rsc.TableForDef(_getTableDescForOutput(t))
+	morphed = _MorphedQuery(_getTableDescForOutput(t))
 	if hardLimit and int(t.setLimit)>hardLimit:
-		table.addMeta("_warning", "This service as a hard row limit"
+		morphed.addMeta("_warning", "This service as a hard row limit"
 			" of %s.  Your row limit was decreased to this value."%hardLimit)
 		t.setLimit = str(hardLimit)
 
 	morphStatus, morphedTree = adql.morphPG(t)
 	for warning in morphStatus.warnings:
-		table.addMeta("_warning", warning)
+		morphed.addMeta("_warning", warning)
 
 	# escape % to hide them form dbapi replacing
-	query = adql.flatten(morphedTree).replace("%", "%%")
+	morphed.query = adql.flatten(morphedTree).replace("%", "%%")
+
+	morphed.tableDef.setLimit = t.setLimit and int(t.setLimit)
+	_addTableMeta(morphed.query, t, morphed)
+	if not tdsForUploads:
+		morphed.rdVersions = _getRDVersions(t)
+
+	return morphed
 
-	table.tableDef.setLimit = t.setLimit and int(t.setLimit)
-	_addTableMeta(query, t, table)
 
-	return query, table
+adql.useParser(base.getConfig("adql", "parser"))
+
+
+# morphADQL keeps its results keyed on normalized ADQL and the
+# morph parameters in this cache.
+_morphCache = base.caches.BoundedCache(
+	maxEntries=base.getConfig("adql", "morphCacheSize"))
+base.caches.registerCache("getMorphedADQL", _morphCache, 
+	lambda key: _morphCache.get(key))
+
+# string literals, delimited identifiers, comments, and runs of whitespace
+_QUERY_TOKENS = re.compile(
+	r"""('(?:[^']|'')*'|"(?:[^"]|"")*"|--[^\n]*\n?|\s+)""")
+
+def normalizeADQL(query):
+	r"""returns query with whitespace outside of string literals, delimited
+	identifiers, and comments collapsed.
+
+	This is what the morph cache is keyed on.
+
+	>>> normalizeADQL("  SELECT  *\n\tFROM x WHERE a = 'b  c' ")
+	"SELECT * FROM x WHERE a = 'b  c'"
+	"""
+	return _QUERY_TOKENS.sub(
+		lambda mat: " " if mat.group().isspace() else mat.group(),
+		query).strip()
+
+
+def morphADQL(query, metaProfile=None, tdsForUploads=[], 
+		externalLimit=None, hardLimit=None):
+	"""returns an postgres query and an (empty) result table for the
+	ADQL in query.
+
+	Morphing results are cached (except for queries with uploads) 
+	until one of the RDs defining the queried tables is reloaded.
+	"""
+	if tdsForUploads or not _morphCache.maxEntries:
+		morphed = _morphADQLUncached(query, metaProfile, tdsForUploads,
+			externalLimit, hardLimit)
+
+	else:
+		key = (normalizeADQL(query), metaProfile, externalLimit, hardLimit)
+		morphed = _morphCache.get(key)
+		if morphed is not None and not morphed.isCurrent():
+			_morphCache.pop(key)
+			morphed = None
+		if morphed is None:
+			morphed = _morphADQLUncached(query, metaProfile, tdsForUploads,
+				externalLimit, hardLimit)
+			_morphCache[key] = morphed
+
+	return morphed.query, morphed.makeTable()
 
 
 def query(querier, query, timeout=15, metaProfile=None, tdsForUploads=[],
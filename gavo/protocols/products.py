@@ -32,8 +32,11 @@ in the forseeable future.
 
 from __future__ import with_statement
 
+import cPickle as pickle
 import datetime
 import gzip
+import itertools
+import multiprocessing
 import re
 import os
 import struct
@@ -48,7 +51,9 @@ import Image
 from nevow import inevow
 from nevow import static
 from twisted.internet import defer
+from twisted.internet import reactor
 from twisted.internet import threads
+from twisted.python import failure
 from zope.interface import implements
 
 from gavo import base
@@ -123,7 +128,16 @@ def makePreviewFromFITS(product):
 		else:
 			inFile = product.getFile()
 
-		with utils.fitsLock():
+		if isinstance(inFile, file):
+			# plain images are read by our own (thread-safe) row iterator
+			hdr = fitstools.readPrimaryHeaderQuick(inFile)
+			if fitstools.canSeekCutout(hdr):
+				return imgtools.jpegFromNumpyArray(numpy.array([row 
+					for row in fitstools.iterScaledRows(inFile, 
+						destSize=PREVIEW_SIZE, hdr=hdr)]))
+			inFile.seek(0)
+
+		with utils.fitsLock("preview"):
 			pixels = numpy.array([row 
 				for row in fitstools.iterScaledRows(inFile, 
 					destSize=PREVIEW_SIZE)])
@@ -170,6 +184,161 @@ def computePreviewFor(product):
 			sourceMime)
 
 
+class PreviewQueueFull(base.ReportableError):
+	"""is raised when too many previews are already waiting for computation.
+	"""
+
+
+def _computePreviewInWorker(job):
+	"""returns a pair of (success, payload) for a preview of the product
+	described by job.
+
+	This is what runs in the preview worker processes.  job is a pair
+	of a stringified RAccref and the product's row from the products table;
+	passing in the row means the workers do not need database access.
+	Since exceptions may not survive pickling, failures are returned
+	as (False, message).
+	"""
+	rAccrefString, productsRow = job
+	try:
+		rAccref = RAccref.fromString(rAccrefString)
+		rAccref.params.pop("preview", None)
+		rAccref._productsRowCache = productsRow
+		return True, computePreviewFor(getProductForRAccref(rAccref))
+	except Exception, ex:
+		return False, "%s: %s"%(ex.__class__.__name__, ex)
+
+
+def _makePreviewJob(product):
+	"""returns a job for _computePreviewInWorker for product, or None if
+	product cannot be reconstructed within a worker process.
+	"""
+	rAccref, productsRow = getattr(product, "rAccref", None), getattr(
+		product, "pr", None)
+	if rAccref is None or productsRow is None:
+		return None
+	job = (str(rAccref), dict(productsRow))
+	try:
+		# multiprocessing pickles in a background thread and would
+		# swallow errors there; so, make sure now that this will work.
+		pickle.dumps(job, 2)
+	except Exception:
+		return None
+	return job
+
+
+class PreviewPool(object):
+	"""A pool of worker processes computing previews.
+
+	Computing previews is CPU-bound and mostly holds the GIL, so doing it
+	in server threads stalls the server.  Instead, submit(product) ships
+	the product's accref and products row to one of nWorkers processes
+	and returns a deferred firing the preview data.
+
+	At most maxQueued jobs may be waiting or running; when that limit is
+	reached, submit raises a PreviewQueueFull.  Products that cannot be
+	passed to the workers (and all products when nWorkers is 0) are 
+	processed in the reactor's thread pool.
+
+	Jobs in worker processes not finished after timeout seconds are
+	given up and errbacked; this in particular happens when a worker 
+	dies (e.g., killed by the OOM killer), in which case multiprocessing
+	never reports back.
+
+	The server forks the worker processes at startup (see start); 
+	elsewhere, this happens when the first job comes in.  The workers are
+	terminated when the reactor shuts down.
+	"""
+	def __init__(self, nWorkers, maxQueued, timeout=120):
+		self.nWorkers, self.maxQueued = nWorkers, maxQueued
+		self.timeout = timeout
+		self.pending = 0
+		self.pool = None
+
+	def start(self):
+		"""forks the worker processes if that has not happened yet.
+
+		Call this early, before the server has started threads; workers
+		forked while some thread holds a lock (e.g., the fitsLock) may
+		deadlock.
+		"""
+		if self.pool is None and self.nWorkers:
+			self.pool = multiprocessing.Pool(self.nWorkers)
+			# without this, the server hangs on exit waiting for the workers
+			reactor.addSystemEventTrigger("before", "shutdown", self.close)
+
+	def _getPool(self):
+		self.start()
+		return self.pool
+
+	def close(self):
+		"""terminates the worker processes.
+		"""
+		if self.pool is not None:
+			self.pool.terminate()
+			self.pool = None
+
+	def _deliver(self, result, d):
+		if d.called:
+			# the job has already been given up by _expireJob
+			return
+		success, payload = result
+		if success:
+			d.callback(payload)
+		else:
+			d.errback(base.ReportableError(
+				"Preview generation failed: %s"%payload))
+
+	def _expireJob(self, asyncResult, d):
+		"""errbacks d unless the job behind asyncResult has finished.
+		"""
+		if d.called or asyncResult.ready():
+			# if it's ready, _deliver is already queued in the reactor
+			return
+		d.errback(base.ReportableError("Preview generation took too long"
+			" or failed in its worker process."))
+
+	def _runInWorker(self, job):
+		"""returns a deferred firing the result of job in a worker process.
+		"""
+		d = defer.Deferred()
+		asyncResult = self._getPool().apply_async(
+			_computePreviewInWorker, (job,),
+			callback=lambda res: reactor.callFromThread(self._deliver, res, d))
+		watchdog = reactor.callLater(
+			self.timeout, self._expireJob, asyncResult, d)
+
+		def cancelWatchdog(result):
+			if watchdog.active():
+				watchdog.cancel()
+			return result
+
+		return d.addBoth(cancelWatchdog)
+
+	def _jobDone(self, result):
+		self.pending -= 1
+		return result
+
+	def submit(self, product):
+		"""returns a deferred firing the preview data for product.
+		"""
+		if self.pending>=self.maxQueued:
+			raise PreviewQueueFull("Too many previews are being computed"
+				" right now.", hint="Please try again later.")
+
+		job = None
+		if self.nWorkers:
+			job = _makePreviewJob(product)
+
+		if job is None:
+			d = threads.deferToThread(computePreviewFor, product)
+		else:
+			d = self._runInWorker(job)
+
+		self.pending += 1
+		return d.addBoth(self._jobDone)
+
+
 class PreviewCacheManager(object):
 	"""is a class that manages the preview cache.
 
@@ -179,16 +348,37 @@ class PreviewCacheManager(object):
 	getPreviewFor.  If a cached preview already exists, you get back its content
 	(the mime type must be taken from the products table).
 
-	If the file does not exist yet, some internal magic tries to come up with
-	a preview and determines whether it should be cached, in which case it does
-	so provided a preview has been generated successfully.
+	If the file does not exist yet, the preview is computed by the
+	PreviewPool; concurrent requests for the same preview share a single
+	computation.  Where previews are representative for their accref,
+	they are then saved to the cache.
+
+	A cache file is touched when it is used.  When the cache grows beyond
+	[web]previewCacheSize bytes, the files that have not been used for the
+	longest time are removed.
 
-	A cache file is touched when it is used, so you can clean up rarely used
-	cache files by deleting all files in the preview cache older than some 
-	limit.
+	To fill the cache in bulk, use prewarm (or dachs admin cacheprev).
 	"""
 	cachePath = base.getConfig("web", "previewCache")
 
+	# maps keys of running preview computations to lists of deferreds
+	# waiting for them
+	_waiting = {}
+	_pool = None
+	# the estimated number of bytes in the cache; None means not known yet.
+	_cacheBytes = None
+
+	@classmethod
+	def getPool(cls):
+		"""returns the PreviewPool for this server.
+		"""
+		if cls._pool is None:
+			cls._pool = PreviewPool(
+				base.getConfig("web", "previewWorkers"),
+				base.getConfig("web", "previewQueueSize"),
+				base.getConfig("web", "previewTimeout"))
+		return cls._pool
+
 	@classmethod
 	def getCacheName(cls, accref):
 		"""returns the full path a preview for accref is be stored under.
@@ -198,44 +388,170 @@ class PreviewCacheManager(object):
 	@classmethod
 	def getCachedPreviewPath(cls, accref):
 		"""returns the path to a cached preview if it exists, None otherwise.
+
+		The cached preview is touched, which protects it from eviction.
 		"""
 		cacheName = cls.getCacheName(accref)
 		if os.path.exists(cacheName):
+			try:
+				os.utime(cacheName, None)
+			except os.error:
+				pass   # don't fail just because we can't touch
 			return cacheName
 		return None
 
 	@classmethod
-	def saveToCache(self, data, cacheName):
+	def _iterCacheFiles(cls):
+		"""iterates over (mtime, size, path) triples for the files in the cache.
+		"""
 		try:
-			with open(cacheName, "w") as f:
+			names = os.listdir(cls.cachePath)
+		except os.error:
+			return
+		for name in names:
+			path = os.path.join(cls.cachePath, name)
+			try:
+				stat = os.stat(path)
+			except os.error:  # removed while we looked
+				continue
+			yield stat.st_mtime, stat.st_size, path
+
+	@classmethod
+	def _enforceSizeLimit(cls, addedBytes):
+		"""removes least recently used previews if the cache has grown beyond
+		[web]previewCacheSize.
+
+		To avoid scanning the cache directory all the time, we keep a
+		running estimate of the cache size and, when cleaning up, remove
+		files until the cache is 10% below the limit.
+		"""
+		limit = base.getConfig("web", "previewCacheSize")
+		if cls._cacheBytes is None:
+			cls._cacheBytes = sum(size for _, size, _ in cls._iterCacheFiles())
+		else:
+			cls._cacheBytes += addedBytes
+		if cls._cacheBytes<=limit:
+			return
+
+		files = sorted(cls._iterCacheFiles())
+		total = sum(size for _, size, _ in files)
+		for mtime, size, path in files:
+			if total<=limit*0.9:
+				break
+			try:
+				os.unlink(path)
+				total -= size
+			except os.error:
+				pass
+		cls._cacheBytes = total
+
+	@classmethod
+	def saveToCache(cls, data, cacheName):
+		try:
+			# write to a temporary file first so nobody reads a partial preview
+			tempName = "%s.%d.tmp"%(cacheName, os.getpid())
+			with open(tempName, "w") as f:
 				f.write(data)
-		except IOError: # caching failed, don't care
+			os.rename(tempName, cacheName)
+			cls._enforceSizeLimit(len(data))
+		except (IOError, os.error): # caching failed, don't care
 			pass
 		return data
 
+	@classmethod
+	def _notifyWaiting(cls, result, key):
+		for d in cls._waiting.pop(key):
+			if isinstance(result, failure.Failure):
+				d.errback(result)
+			else:
+				d.callback(result)
+		return result
+
+	@classmethod
+	def _computeOnce(cls, key, product, cacheName=None):
+		"""returns a deferred firing a preview for product.
+
+		While the computation for key is running, further requests for key
+		get deferreds waiting for its result.
+		"""
+		if key in cls._waiting:
+			d = defer.Deferred()
+			cls._waiting[key].append(d)
+			return d
+
+		try:
+			d = cls.getPool().submit(product)
+		except PreviewQueueFull:
+			return defer.fail()
+
+		cls._waiting[key] = []
+		if cacheName is not None:
+			d.addCallback(cls.saveToCache, cacheName)
+		return d.addBoth(cls._notifyWaiting, key)
+
 	@classmethod
 	def getPreviewFor(cls, product):
 		"""returns a deferred firing the data for a preview.
 		"""
 		if not product.rAccref.previewIsCacheable():
-			return threads.deferToThread(computePreviewFor, product)
+			return cls._computeOnce(str(product.rAccref), product)
 
 		accref = product.rAccref.accref
-		cacheName = cls.getCacheName(accref)
-		if os.path.exists(cacheName):
+		cacheName = cls.getCachedPreviewPath(accref)
+		if cacheName is not None:
 			# Cache hit
-			try:
-				os.utime(cacheName, None)
-			except os.error:
-				pass   # don't fail just because we can't touch
-
 			with open(cacheName) as f:
 				return defer.succeed(f.read())
 
 		else:
 			# Cache miss
-			return threads.deferToThread(computePreviewFor, product
-				).addCallback(cls.saveToCache, cacheName)
+			return cls._computeOnce(accref, product, cls.getCacheName(accref))
+
+	@classmethod
+	def prewarm(cls, accrefs):
+		"""computes and caches previews for the accrefs (strings) passed in.
+
+		This is for use outside of the server; it blocks until all previews
+		are computed, using [web]previewWorkers processes.  Accrefs that 
+		already have cached previews are skipped.
+
+		The function returns a pair of the numbers of previews computed and
+		of failures.
+		"""
+		toCompute, jobs = [], []
+		for accref in accrefs:
+			if cls.getCachedPreviewPath(accref) is not None:
+				continue
+			rAccref = RAccref(accref)
+			try:
+				jobs.append((str(rAccref), rAccref.productsRow))
+			except base.NotFoundError:
+				base.ui.notifyWarning("No product for %s, skipping"%accref)
+				continue
+			toCompute.append(accref)
+
+		nWorkers = base.getConfig("web", "previewWorkers")
+		if nWorkers and len(jobs)>1:
+			pool = multiprocessing.Pool(nWorkers)
+			results = pool.imap(_computePreviewInWorker, jobs, chunksize=4)
+		else:
+			pool = None
+			results = itertools.imap(_computePreviewInWorker, jobs)
+
+		computed = failed = 0
+		try:
+			for accref, (success, payload) in itertools.izip(toCompute, results):
+				if success:
+					cls.saveToCache(payload, cls.getCacheName(accref))
+					computed += 1
+				else:
+					base.ui.notifyWarning("Preview for %s failed: %s"%(
+						accref, payload))
+					failed += 1
+		finally:
+			if pool is not None:
+				pool.terminate()
+		return computed, failed
 
 
 class ProductBase(object):
@@ -620,8 +936,10 @@ class CutoutProduct(ProductBase):
 	This only works for local FITS files with two axes.  For everything 
 	else, use datalink.
 	
-	We assume the cutouts are smallish -- they are, right now, not
-	streamed, but accumulated in memory.
+	For plain FITS files, the cutout is computed from the header and
+	only the pixels needed are read and streamed out (see 
+	fitstools.SeekCutout).  Other (e.g., compressed) images are
+	cut out in memory under the fitsLock.
 	"""
 	def _makeName(self):
 		self.name = "<cutout-"+os.path.basename(self.pr["accessPath"])
@@ -638,9 +956,37 @@ class CutoutProduct(ProductBase):
 				and rAccref.productsRow["mime"]=="image/fits"):
 			return cls(rAccref)
 
-	def _getCutoutHDU(self):
+	def _getCuts(self, header):
+		"""returns cut specs as for fitstools.cutoutFITS for an image with
+		header.
+		"""
 		ra, dec, sra, sdec = [self.rAccref.params[k] for k in self._myKeys]
-		with utils.fitsLock():
+		skyWCS = coords.getWCS(header)
+		pixelFootprint = numpy.asarray(
+			numpy.round(skyWCS.wcs_sky2pix([
+				(ra-sra/2., dec-sdec/2.),
+				(ra+sra/2., dec+sdec/2.)], 1)), numpy.int32)
+		return [
+			(skyWCS.longAxis, min(pixelFootprint[:,0]), max(pixelFootprint[:,0])),
+			(skyWCS.latAxis, min(pixelFootprint[:,1]), max(pixelFootprint[:,1]))]
+
+	def _getSeekCutout(self):
+		"""returns a fitstools.SeekCutout for the product, or None if
+		the source file cannot be cut out that way.
+		"""
+		if self.rAccref.localpath.endswith(".gz"):
+			return None
+		cutout = fitstools.SeekCutout(self.rAccref.localpath)
+		if not cutout.isSupported():
+			return None
+		return cutout.cutout(*self._getCuts(cutout.origHeader))
+
+	def _getCutoutHDU(self):
+		cutout = self._getSeekCutout()
+		if cutout is not None:
+			return cutout.getHDU()
+
+		with utils.fitsLock("cutout"):
 			# The following memmap=False works around a weird bug in pyfits 3.3,
 			# where it performs a separate memmap for each call to section(),
 			# which makes us run out of FDs for largeish images.  We might
@@ -649,20 +995,19 @@ class CutoutProduct(ProductBase):
 			hdus = pyfits.open(self.rAccref.localpath, do_not_scale_image_data=True,
 				memmap=False)
 			try:
-				skyWCS = coords.getWCS(hdus[0].header)
-				pixelFootprint = numpy.asarray(
-					numpy.round(skyWCS.wcs_sky2pix([
-						(ra-sra/2., dec-sdec/2.),
-						(ra+sra/2., dec+sdec/2.)], 1)), numpy.int32)
-				res = fitstools.cutoutFITS(hdus[0], 
-					(skyWCS.longAxis, min(pixelFootprint[:,0]), max(pixelFootprint[:,0])),
-					(skyWCS.latAxis, min(pixelFootprint[:,1]), max(pixelFootprint[:,1])))
+				res = fitstools.cutoutFITS(hdus[0], *self._getCuts(hdus[0].header))
 			finally:
 				hdus.close()
 
 		return res
 
 	def iterData(self):
+		cutout = self._getSeekCutout()
+		if cutout is not None:
+			for chunk in cutout.iterData():
+				yield chunk
+			return
+
 		res = self._getCutoutHDU()
 		bytes = StringIO()
 		res.writeto(bytes)
@@ -706,24 +1051,34 @@ class ScaledFITSProduct(ProductBase):
 	def _makeName(self):
 		self.name = "scaled-"+os.path.basename(self.pr["accref"])
 
+	def _iterScaled(self, f, oldHdr, scale):
+		newHdr = fitstools.shrinkWCSHeader(oldHdr, scale)
+		newHdr.update("FULLURL", str(makeProductLink(self.baseAccref)))
+		yield fitstools.serializeHeader(newHdr)
+
+		for row in fitstools.iterScaledRows(f, scale, hdr=oldHdr):
+			# Unfortunately, numpy's byte swapping for floats is broken in
+			# many wide-spread revisions.  So, we cannot do the fast
+			#	yield row.newbyteorder(">").tostring()
+			# but rather, for now, have to try the slow:
+			yield struct.pack("!%df"%len(row), *row)
+
 	def iterData(self):
 		scale = int(self.scale)
 		if scale<2:
 			scale = 2
 	
-		with utils.fitsLock():
-			with open(self.rAccref.localpath) as f:
-				oldHdr = fitstools.readPrimaryHeaderQuick(f)
-				newHdr = fitstools.shrinkWCSHeader(oldHdr, scale)
-				newHdr.update("FULLURL", str(makeProductLink(self.baseAccref)))
-				yield fitstools.serializeHeader(newHdr)
-
-				for row in fitstools.iterScaledRows(f, scale, hdr=oldHdr):
-					# Unfortunately, numpy's byte swapping for floats is broken in
-					# many wide-spread revisions.  So, we cannot do the fast
-					#	yield row.newbyteorder(">").tostring()
-					# but rather, for now, have to try the slow:
-					yield struct.pack("!%df"%len(row), *row)
+		with open(self.rAccref.localpath) as f:
+			oldHdr = fitstools.readPrimaryHeaderQuick(f)
+			if fitstools.canSeekCutout(oldHdr):
+				# plain images are read by our own (thread-safe) row iterator
+				for chunk in self._iterScaled(f, oldHdr, scale):
+					yield chunk
+
+			else:
+				with utils.fitsLock("scale"):
+					for chunk in self._iterScaled(f, oldHdr, scale):
+						yield chunk
 			
 	def _writeStuffTo(self, destF):
 		for chunk in self.iterData():
@@ -15,6 +15,7 @@ import urllib
 import numpy
 
 from gavo import base
+from gavo import rsc
 from gavo import svcs
 from gavo import utils
 from gavo.base import coords
@@ -259,7 +260,7 @@ class SIAPCutoutCore(svcs.DBCore):
 			else:
 				sra = 360
 
-		for record in res:
+		def fixRecord(record):
 			try:
 				self._fixRecord(record, 
 					sqlPars.get("_ra", record["centerAlpha"]), 
@@ -269,6 +270,13 @@ class SIAPCutoutCore(svcs.DBCore):
 				# Anwyway, deliver slightly botched records rather
 				# than none at all, but warn the operators:
 				base.ui.notifyWarning("Botched WCS in the record %s"%record)
+			return record
+
+		if isinstance(res, rsc.StreamingQueryTable):
+			res.addRowFilter(fixRecord)
+		else:
+			for record in res:
+				fixRecord(record)
 		return res
 
 
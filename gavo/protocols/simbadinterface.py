@@ -20,8 +20,15 @@ from gavo.utils import ElementTree
 
 
 class ObjectCache(object):
+	"""a persistent cache of resolver results.
+
+	This keeps at most [web]sesameCacheSize items, dropping the least
+	recently used ones when more come in.
+	"""
 	def __init__(self, id):
 		self.id = id
+		self.cache = base.caches.BoundedCache(
+			maxEntries=base.getConfig("web", "sesameCacheSize"))
 		self._loadCache()
 
 	def _getCacheName(self):
@@ -29,15 +36,18 @@ class ObjectCache(object):
 
 	def _loadCache(self):
 		try:
-			self.cache = cPickle.load(open(self._getCacheName()))
+			for key, record in cPickle.load(
+					open(self._getCacheName())).iteritems():
+				self.cache[key] = record
 		except IOError:
-			self.cache = {}
+			pass
 	
 	def _saveCache(self, silent=False):
 		try:
 			handle, name = tempfile.mkstemp(dir=base.getConfig("cacheDir"))
 			f = os.fdopen(handle, "w")
-			cPickle.dump(self.cache, f)
+			cPickle.dump(dict((key, self.cache.peek(key)) 
+				for key in self.cache.keys()), f)
 			utils.safeclose(f)
 			os.rename(name, self._getCacheName())
 		except (IOError, os.error):
@@ -15,6 +15,7 @@ the RD but not generic enough to go do base.coords.
 #c This program is free software, covered by the GNU GPL.  See the
 #c COPYING file in the source distribution.
 
+import os
 
 from gavo import base
 from gavo import rscdef
@@ -222,6 +223,27 @@ def addPolygonSlices(descriptor, poly, srcPar="Unknown"):
 		descriptor.slices.append((axisInd, lower, upper))
 
 
+def cutoutData(descriptor, slices):
+	"""replaces the primary HDU in descriptor.data with a cutout along
+	slices (as for fitstools.cutoutFITS).
+
+	As long as descriptor.dataIsPristine, the primary HDU is just what
+	is in the file, and so we can read only the pixels actually required
+	(see fitstools.SeekCutout) rather than pulling in the whole image;
+	otherwise, cutoutFITS works on whatever is in descriptor.data[0].
+	"""
+	srcPath = os.path.join(base.getConfig("inputsDir"), descriptor.accessPath)
+	if descriptor.dataIsPristine and not srcPath.endswith(".gz"):
+		cutout = fitstools.SeekCutout(srcPath)
+		if cutout.isSupported():
+			descriptor.data[0] = cutout.cutout(*slices).getHDU()
+			descriptor.dataIsPristine = False
+			return
+
+	descriptor.data[0] = fitstools.cutoutFITS(descriptor.data[0], *slices)
+	descriptor.dataIsPristine = False
+
+
 def doAxisCutout(descriptor, args):
 	"""updates descriptor.data on a FITS descriptor, interpreting the
 	parameters defined by iter*AxisKeys, passed in in args.
@@ -275,7 +297,4 @@ def doAxisCutout(descriptor, args):
 		for axis, lower, upper in slices:
 			if lower==upper:  # Sentinel for emtpy data
 				raise EmptyData()
-		descriptor.data[0] = fitstools.cutoutFITS(
-			descriptor.data[0],
-			*slices)
-		descriptor.dataIsPristine = False
+		cutoutData(descriptor, slices)
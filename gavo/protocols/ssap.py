@@ -107,6 +107,11 @@ class SSAPCore(svcs.DBCore):
 		# we only return XML, and we have a custom way of doing limits.
 		return False
 
+	def wantsStreaming(self, queryMeta):
+		# SSAP 1.04 wants QUERY_STATUS before the table, and the datalink
+		# declaration needs all rows; so, we need the complete result.
+		return False
+
 	# The following is evaluated by the form renderer to suppress the
 	# format selection widget.  We should really furnish cores with
 	# some way to declare what they're actually returning.
@@ -231,6 +231,45 @@ def getQTableFromJob(parameters, jobId, queryProfile, timeout):
 		tdsForUploads, maxrec)
 
 
+def _getFormatFromParameters(parameters):
+	"""returns the normalized result format requested in parameters.
+	"""
+	defaultFormat = "votable"
+	if base.getConfig("ivoa", "votDefaultEncoding")=="td":
+		defaultFormat = "votable/td"
+	return normalizeTAPFormat(parameters.get("format", defaultFormat))
+
+
+def prepareSyncQuery(parameters, timeout, queryProfile="untrustedquery"):
+	"""returns a pair of (format, data) for a synchronous TAP query
+	without uploads.
+
+	parameters is a dictionary as in UWS job parameters (but the
+	values can also come directly from a request).  The query is
+	translated, checked, and started here, so errors in the query and
+	in running it (e.g., timeouts) are raised by this function.  The
+	remaining rows are fetched as the data's primary table is iterated
+	over, which is intended to happen while streaming it out using 
+	writeResultTo.  The query table closes its connection when exhausted; 
+	if you abandon it before, call its cleanup method.
+	"""
+	format = _getFormatFromParameters(parameters)
+	query, maxrec = _parseTAPParameters(None, parameters)
+	connectionForQuery = base.getDBConnection(queryProfile)
+	try:
+		base.ui.notifyInfo("taprunner streaming %s"%query)
+		data = _makeDataFor(runTAPQuery(query, timeout, 
+			connectionForQuery, [], maxrec))
+		try:
+			data.getPrimaryTable().start()
+		except Exception:
+			svcs.mapDBErrors(*sys.exc_info())
+		return format, data
+	except:
+		connectionForQuery.close()
+		raise
+
+
 def runTAPJobNoState(parameters, jobId, queryProfile, timeout):
 	"""executes a TAP job defined by parameters and writes the
 	result to the job's working directory.
@@ -241,11 +280,7 @@ def runTAPJobNoState(parameters, jobId, queryProfile, timeout):
 	# The following makes us bail out if a bad format was passed -- no
 	# sense spending the CPU on executing the query then, so we get the
 	# format here.
-	defaultFormat = "votable"
-	if base.getConfig("ivoa", "votDefaultEncoding")=="td":
-		defaultFormat = "votable/td"
-
-	format = normalizeTAPFormat(parameters.get("format", defaultFormat))
+	format = _getFormatFromParameters(parameters)
 
 	res = _makeDataFor(getQTableFromJob(
 		parameters, jobId, queryProfile, timeout))
@@ -289,6 +324,9 @@ def setINTHandler(jobId):
 	"""installs a signal handler that pushes our job to aborted on SIGINT.
 	"""
 	import signal
+	global EXIT_PLEASE
+	# we may be running in a pooled worker that has seen jobs before
+	EXIT_PLEASE = False
 
 	def handler(signo, frame):
 		global EXIT_PLEASE
@@ -13,6 +13,7 @@ from __future__ import with_statement
 import cPickle as pickle
 import contextlib
 import datetime
+import json
 import os
 import shutil
 import signal
@@ -20,6 +21,7 @@ import tempfile
 import threading
 import weakref
 
+from twisted.internet import error
 from twisted.internet import protocol
 from twisted.internet import reactor
 
@@ -1376,6 +1378,23 @@ def _replaceFDs(inFName, outFName):
   os.dup(outF.fileno())
 
 
+def _ensureJobEnded(workerSystem, jobId):
+	"""pushes the job jobId to ERROR if it is not in an end state.
+
+	This is called when a worker is done with a job; when that is so,
+	the job should have managed its state itself.
+	"""
+	try:
+		job = workerSystem.getJob(jobId)
+		if job.phase==QUEUED or job.phase==EXECUTING:
+			try:
+				raise UWSError("Job hung in %s"%job.phase, job.jobId)
+			except UWSError, ex:
+				workerSystem.changeToPhase(jobId, ERROR, ex)
+	except JobNotFound: # job already deleted
+		pass
+
+
 class _UWSBackendProtocol(protocol.ProcessProtocol):
 	"""The protocol used for taprunners when spawning them under a twisted
 	reactor.
@@ -1395,16 +1414,164 @@ class _UWSBackendProtocol(protocol.ProcessProtocol):
 	def processEnded(self, statusObject):
 		"""tries to ensure the job is in an admitted end state.
 		"""
+		_ensureJobEnded(self.workerSystem, self.jobId)
+
+
+class _PoolWorkerProtocol(protocol.ProcessProtocol):
+	"""The protocol for talking to a process of a UWSWorkerPool.
+
+	The worker (see protocols.uwsworker) reads job command lines as
+	JSON, one per line, from its stdin and replies on its file descriptor 3
+	with READY once it has started up, and with DONE or RETIRING when it
+	has finished a job.  After RETIRING, the worker exits.
+
+	While a job runs, current is a pair of jobId and the UWS it belongs to.
+	"""
+	def __init__(self, pool):
+		self.pool = pool
+		self.pid = None
+		self.current = None
+		self.retireAfterJob = False
+		self.inputBuffer = ""
+
+	def connectionMade(self):
+		self.pid = self.transport.pid
+
+	def childDataReceived(self, childFD, data):
+		if childFD!=3:
+			base.ui.notifyInfo("UWS pool worker %s produced output: %s"%(
+				self.pid, data))
+			return
+
+		self.inputBuffer += data
+		while "\n" in self.inputBuffer:
+			line, self.inputBuffer = self.inputBuffer.split("\n", 1)
+			self.lineReceived(line.strip())
+
+	def lineReceived(self, line):
+		if line=="READY":
+			self.pool.workerIdle(self)
+
+		elif line in ("DONE", "RETIRING"):
+			self._jobFinished()
+			if line=="DONE" and not self.retireAfterJob:
+				self.pool.workerIdle(self)
+			elif line=="DONE":
+				self.terminate()
+
+		else:
+			base.ui.notifyWarning("UWS pool worker %s sent junk: %s"%(
+				self.pid, repr(line)))
+
+	def _jobFinished(self):
+		if self.current is not None:
+			jobId, workerSystem = self.current
+			self.current = None
+			_ensureJobEnded(workerSystem, jobId)
+
+	def runJob(self, jobId, workerSystem, args):
+		"""makes the worker execute the job described by the command line args.
+
+		The command line is what getCommandLine of ProcessBasedUWSTransitions
+		returns, except for the program name.
+		"""
+		self.current = (jobId, workerSystem)
+		self.transport.writeToChild(0, json.dumps(args)+"\n")
+
+	def terminate(self):
 		try:
-			job = self.workerSystem.getJob(self.jobId)
-			if job.phase==QUEUED or job.phase==EXECUTING:
-				try:
-					raise UWSError("Job hung in %s"%job.phase, job.jobId)
-				except UWSError, ex:
-					self.workerSystem.changeToPhase(self.jobId, ERROR, ex)
-		except JobNotFound: # job already deleted
+			self.transport.signalProcess("TERM")
+		except error.ProcessExitedAlready:
 			pass
 
+	def processEnded(self, statusObject):
+		self._jobFinished()
+		self.pool.workerGone(self)
+
+
+class UWSWorkerPool(object):
+	"""A pool of long-running processes executing UWS jobs.
+
+	Starting a fresh gavo process for every job means paying for
+	interpreter startup, imports, and RD parsing every time.  The workers
+	here do that once and then run one job after the other; they are
+	replaced after [async]poolWorkerMaxJobs jobs or when they have grown
+	by more than [async]poolWorkerMaxGrowth megabytes.
+
+	Since jobs run in the worker processes themselves, killing and
+	aborting works as for one-shot processes; ProcessBasedUWSTransitions
+	makes sure workers that were sent a signal are replaced rather than
+	re-used.
+
+	The pool only does anything after start() has been called (which
+	gavo serve does); until then, or when all workers are busy, takeWorker
+	returns None and jobs are run in fresh processes.
+	"""
+	def __init__(self):
+		self.idle, self.all = [], set()
+		self.running = False
+
+	def start(self):
+		"""spawns the configured number of workers.
+		"""
+		if self.running:
+			return
+		self.running = True
+		for i in range(base.getConfig("async", "poolWorkers")):
+			self._spawnWorker()
+		reactor.addSystemEventTrigger("before", "shutdown", self.close)
+
+	def _spawnWorker(self):
+		if not self.running:
+			return
+		worker = _PoolWorkerProtocol(self)
+		reactor.spawnProcess(worker, "gavo", ["gavo", "uwsworker"],
+			env=os.environ, childFDs={0: "w", 1: "r", 2: "r", 3: "r"})
+		self.all.add(worker)
+
+	def takeWorker(self):
+		"""returns an idle worker or None if there is none.
+		"""
+		if self.idle:
+			return self.idle.pop()
+		return None
+
+	def getWorkerForPid(self, pid):
+		"""returns the worker with the process id pid, or None if no
+		worker of ours has that pid.
+		"""
+		for worker in self.all:
+			if worker.pid==pid:
+				return worker
+		return None
+
+	def workerIdle(self, worker):
+		if worker not in self.idle:
+			self.idle.append(worker)
+
+	def workerGone(self, worker):
+		if worker in self.idle:
+			self.idle.remove(worker)
+		self.all.discard(worker)
+		# delay the respawn a bit so a worker that cannot start up
+		# does not keep us busy
+		reactor.callLater(1, self._spawnWorker)
+
+	def close(self):
+		"""terminates all workers.
+		"""
+		self.running = False
+		for worker in list(self.all):
+			worker.terminate()
+
+
+_workerPool = UWSWorkerPool()
+
+def getWorkerPool():
+	"""returns the UWS worker pool of this process.
+	"""
+	return _workerPool
+
 
 class ProcessBasedUWSTransitions(SimpleUWSTransitions):
 	"""A SimpleUWSTransistions that processes its stuff in a child process.
@@ -1422,11 +1589,17 @@ class ProcessBasedUWSTransitions(SimpleUWSTransitions):
 			" to get a command line"%self.__class__.__name__)
 
 	def _startJobTwisted(self, wjob):
-		"""starts a job by forking a new process when we're running 
-		within a twisted reactor.
+		"""starts a job in a worker from the pool or, if none is available,
+		by forking a new process when we're running within a twisted reactor.
 		"""
 		assert wjob.phase==QUEUED
 		cmd, args = self.getCommandLine(wjob)
+		worker = getWorkerPool().takeWorker()
+		if worker is not None:
+			worker.runJob(wjob.jobId, wjob.uws, args[1:])
+			wjob.change(pid=worker.pid, phase=EXECUTING)
+			return
+
 		pt = reactor.spawnProcess(_UWSBackendProtocol(wjob.jobId, wjob.uws),
 			cmd, args=args,
 				env=os.environ)
@@ -1469,11 +1642,17 @@ class ProcessBasedUWSTransitions(SimpleUWSTransitions):
 		a kill -INT may to many things, and most of them we don't want.
 		So, in this case we kill -TERM the child, do state management ourselves
 		and hope for the best.
+
+		If the job runs in a pool worker, the worker is not re-used
+		after the job.
 		"""
 		try:
 			pid = wjob.pid
 			if pid is None:
 				raise UWSError("Job is not running")
+			worker = getWorkerPool().getWorkerForPid(pid)
+			if worker is not None:
+				worker.retireAfterJob = True
 			if wjob.startTime is None:
 				# the child job is not up yet, kill it brutally and manage
 				# state ourselves
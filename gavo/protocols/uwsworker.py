@@ -0,0 +1,145 @@
+"""
+A long-running process executing UWS jobs.
+
+This is what the processes in uws.UWSWorkerPool run (as gavo uwsworker).
+A worker first imports the job runners, the ADQL grammar, and the RDs
+needed by typical jobs; it then reads command lines (as produced by
+the getCommandLine methods of the ProcessBasedUWSTransitions, JSON-encoded,
+one per line) from stdin and executes them as gavo would.
+
+It reports back on file descriptor 3: READY after startup, then DONE
+or RETIRING after each job.  After RETIRING, the worker exits; it does
+so after [async]poolWorkerMaxJobs jobs or when its peak memory usage has
+grown by more than [async]poolWorkerMaxGrowth megabytes since startup.
+
+Jobs are aborted by sending signals to the worker as with one-shot
+processes.  Workers exit on SIGTERM and on SIGINTs not handled by
+the job runners; the pool then replaces them.
+"""
+
+#c Copyright 2008-2017, the GAVO project
+#c
+#c This program is free software, covered by the GNU GPL.  See the
+#c COPYING file in the source distribution.
+
+
+import json
+import os
+import resource
+import signal
+import sys
+
+from gavo import base
+from gavo import utils
+from gavo.user import cli
+from gavo.user import common
+
+
+CONTROL_FD = 3
+
+# modules that have job runners and are imported at startup
+_RUNNER_MODULES = [
+	"protocols.taprunner",
+	"protocols.useruws",
+	"protocols.dlasync",
+]
+
+
+def _getPeakMemory():
+	"""returns the peak memory usage of this process in megabytes.
+	"""
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024.
+
+
+def _warmUp():
+	"""imports and loads everything typical jobs will need.
+
+	Failures are logged but do not keep the worker from starting.
+	"""
+	for modName in _RUNNER_MODULES:
+		try:
+			utils.loadInternalObject(modName, "main")
+		except Exception:
+			base.ui.notifyError("UWS worker cannot import %s."%modName)
+
+	try:
+		from gavo import adql
+		adql.getGrammar()
+	except Exception:
+		base.ui.notifyError("UWS worker cannot build the ADQL grammar.")
+
+	for rdId in ["//tap", "//uws"]+base.getConfig("web", "preloadRDs"):
+		try:
+			base.caches.getRD(rdId)
+		except Exception:
+			base.ui.notifyError("Error while preloading %s."%rdId)
+
+
+def _getRunner(args):
+	"""returns the function to call for the gavo command line args
+	(without the program name).
+
+	As a side effect, sys.argv is set up as the runner would see it
+	when called from the gavo command line.
+	"""
+	args = list(args)
+	# the only global option job command lines use is --debug.
+	while args and args[0].startswith("-"):
+		if args.pop(0)=="--debug":
+			base.DEBUG = True
+	if not args:
+		raise base.ReportableError("UWS worker got an empty command line.")
+
+	from optparse import OptionParser
+	module, funcName = common.getMatchingFunction(
+		args[0], cli.functions, OptionParser())
+	sys.argv = ["gavo "+args[0]]+args[1:]
+	return utils.loadInternalObject(module, funcName)
+
+
+def runJob(args):
+	"""executes the job with the gavo command line args.
+
+	Errors are logged and otherwise ignored, as the job runners are
+	supposed to manage the job states themselves.
+	"""
+	origDebug = base.DEBUG
+	try:
+		_getRunner(args)()
+	except Exception:
+		base.ui.notifyError("UWS worker failed to run %s"%" ".join(args))
+	finally:
+		base.DEBUG = origDebug
+		# job runners may install handlers of their own
+		signal.signal(signal.SIGINT, signal.default_int_handler)
+
+
+def serve(inF, controlF):
+	"""runs jobs from the command lines coming in from inF until there
+	are no more or it is time to retire.
+	"""
+	maxJobs = base.getConfig("async", "poolWorkerMaxJobs")
+	maxGrowth = base.getConfig("async", "poolWorkerMaxGrowth")
+	initialMemory = _getPeakMemory()
+	jobsRun = 0
+
+	controlF.write("READY\n")
+	for line in iter(inF.readline, ""):
+		runJob(json.loads(line))
+		jobsRun += 1
+
+		if (jobsRun>=maxJobs
+				or _getPeakMemory()-initialMemory>maxGrowth):
+			controlF.write("RETIRING\n")
+			return
+		controlF.write("DONE\n")
+
+
+def main():
+	"""runs a UWS worker as a child of a server process.
+	"""
+	_warmUp()
+	try:
+		serve(sys.stdin, os.fdopen(CONTROL_FD, "w", 0))
+	except (KeyboardInterrupt, SystemExit):
+		pass
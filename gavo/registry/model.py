@@ -95,6 +95,17 @@ class OAI(object):
 
 	class record(OAIElement): pass
 
+	class storedRecord(OAIElement):
+		"""a record pre-rendered by gavo pub.
+
+		The content of this element is the serialized OAI record; it is written
+		as-is rather than escaped.
+		"""
+		name_ = "record"
+
+		def write(self, outputFile):
+			outputFile.write(self.text_.encode("utf-8"))
+
 	class identifier(OAIElement): pass
 	
 	class datestamp(OAIElement): pass
@@ -84,15 +84,20 @@ def runPMH(pars, builders):
 
 ########################### parsing and generating resumption tokens
 # In our implementation, the resumptionToken is a hex-encoded
-# zlibbed query string made from the parameters, plus information
-# on the offset and the time the resumption token was issued.
+# zlibbed query string made from the parameters, plus the key
+# of the last record delivered and the time the resumption token was issued.
+# Records are delivered ordered by (recTimestamp, sourceRD, resId), so
+# resuming is just a matter of selecting records with larger keys.
 
-def makeResumptionToken(pars, nextOffset):
+def makeResumptionToken(pars, lastRow):
 	"""return a resumptionToken element for resuming the query in
-	pars at nextOffset.
+	pars after the resources table row lastRow.
 	"""
 	toEncode = pars.copy()
-	toEncode["nextOffset"] = str(nextOffset)
+	toEncode.pop("resumptionToken", None)
+	toEncode["afterTimestamp"] = lastRow["recTimestamp"].isoformat()
+	toEncode["afterRD"] = lastRow["sourceRD"]
+	toEncode["afterId"] = lastRow["resId"]
 	toEncode["queryDate"] = time.time()
 	return urllib.urlencode(toEncode).encode("zlib").encode("hex"
 		).replace("\n", "")
@@ -107,14 +112,15 @@ def parseResumptionToken(pars):
 	based on gavo pub reloading the //services RD after publication.
 	Not perfect, but probably adequate.
 
-	Note that newPars will contain resumptionToken again, but as an
-	offset to the query executed.
+	Note that newPars will contain resumptionToken again, but as
+	a (recTimestamp, sourceRD, resId) tuple of the last record delivered.
 	"""
 	try:
 		newPars = dict(urlparse.parse_qsl(
 			pars["resumptionToken"].decode("hex").decode("zlib")))
 		queryDate = float(newPars.pop("queryDate"))
-		offset = int(newPars.pop("nextOffset"))
+		resumeAfter = (newPars.pop("afterTimestamp"),
+			newPars.pop("afterRD"), newPars.pop("afterId"))
 	except KeyError, msg:
 		raise base.ui.logOldExc(
 			common.BadResumptionToken("Incomplete resumption token"))
@@ -133,7 +139,7 @@ def parseResumptionToken(pars):
 	if int(queryDate)<int(base.caches.getRD("//services").loadedAt):
 		raise common.BadResumptionToken("Service table has changed")
 
-	newPars["resumptionToken"] = offset
+	newPars["resumptionToken"] = resumeAfter
 	return newPars
 
 ########################### Helpers for OAI handlers
@@ -281,7 +287,8 @@ def getMatchingRows(pars, rscTableDef, getSetFilter):
 		- from
 		- until -- these give a range for which changed records are being returned
 		- set -- maps to a sequence of set names to be matched.
-		- resumptionToken -- some magic value (see OAI.resumptionToken)
+		- resumptionToken -- the key of the last row delivered in the previous
+		  page (see parseResumptionToken)
 		- maxRecords -- an integer literal that specifies the maximum number
 		  of records returned, defaulting to [ivoa]oaipmhPageSize
 	
@@ -289,7 +296,8 @@ def getMatchingRows(pars, rscTableDef, getSetFilter):
 	turn paging on when we think it's a good idea, and for testing.
 
 	rscTableDef has to be a table with a column recTimestamp giving the
-	resource record's updated time.
+	resource record's updated time; together with sourceRD and resId,
+	this is used to order the rows for paging.
 
 	getSetFilter(pars, fillers) is a function receiving the PMH parameters
 	dictionary and a dictionary of query fillers and returning, as appropriate,
@@ -297,22 +305,27 @@ def getMatchingRows(pars, rscTableDef, getSetFilter):
 	"""
 	maxRecords = int(pars.get("maxRecords", 
 		base.getConfig("ivoa", "oaipmhPagesize")))
-	offset = pars.get("resumptionToken", 0)
 	frag, fillers = _parseOAIPars(pars)
+	resumeFrag = None
+	if "resumptionToken" in pars:
+		resumeFrag = "(recTimestamp, sourceRD, resId) > (%s)"%", ".join(
+			"%%(%s)s"%base.getSQLKey("after", val, fillers)
+			for val in pars["resumptionToken"])
 	frag = " AND ".join(
-		f for f in [getSetFilter(pars, fillers), frag] if f)
+		f for f in [getSetFilter(pars, fillers), frag, resumeFrag] if f)
 
 	try:
 		with base.getTableConn() as conn:
 			srvTable = rsc.TableForDef(rscTableDef, connection=conn) 
 			res = list(srvTable.iterQuery(rscTableDef, frag, fillers,
 				limits=(
-					"LIMIT %(maxRecords)s OFFSET %(offset)s", locals())))
+					"ORDER BY recTimestamp, sourceRD, resId"
+					" LIMIT %(maxRecords)s", locals())))
 		
 		if len(res)==maxRecords:
 			# there's probably more data, request a resumption token
 			res.append(OAI.resumptionToken[
-				makeResumptionToken(pars, offset+len(res))])
+				makeResumptionToken(pars, res[-1])])
 			res[-1].addChild = lambda:0
 
 	except base.DBError:
@@ -335,15 +348,51 @@ def getMatchingRestups(pars):
 	return getMatchingRows(pars, td, _getSetCondition)
 
 
+def _getStoredRecords(restups, pars):
+	"""returns a dictionary mapping (sourceRD, resId) to the records
+	pre-rendered for restups by gavo pub.
+
+	Records rendered for a previous version of a resources row
+	(i.e., with a different recTimestamp) are not returned.
+	"""
+	keys = tuple((r["sourceRD"], r["resId"]) 
+		for r in restups if not isinstance(r, OAI.OAIElement))
+	if not keys or pars.get("metadataPrefix") not in ("ivo_vor", "oai_dc"):
+		return {}
+
+	recTimestamps = dict(((r["sourceRD"], r["resId"]), r["recTimestamp"])
+		for r in restups if not isinstance(r, OAI.OAIElement))
+	with base.getTableConn() as conn:
+		return dict(((sourceRD, resId), record)
+			for sourceRD, resId, recTimestamp, record in conn.query(
+				"SELECT sourceRD, resId, recTimestamp, record"
+				" FROM dc.oairecords"
+				" WHERE metadataPrefix=%(prefix)s AND setName=%(setName)s"
+				" AND (sourceRD, resId) IN %(keys)s", {
+					"prefix": pars["metadataPrefix"],
+					"setName": pars.get("set", "ivo_managed"),
+					"keys": keys})
+			if recTimestamps[sourceRD, resId]==recTimestamp)
+
+
 def getMatchingResobs(pars):
 	"""returns a list of res objects matching the OAI-PMH pars.
 
+	Where gavo pub has stored a rendered record for a resource, what
+	is returned is an OAI.storedRecord rather than a res object, 
+	which saves loading the RD and rebuilding the record.
+
 	See getMatchingRestups for details.
 	"""
 	res = []
-	for restup in getMatchingRestups(pars):
+	restups = getMatchingRestups(pars)
+	storedRecords = _getStoredRecords(restups, pars)
+	for restup in restups:
 		if isinstance(restup, OAI.OAIElement):
 			res.append(restup)
+		elif (restup["sourceRD"], restup["resId"]) in storedRecords:
+			res.append(OAI.storedRecord[
+				storedRecords[restup["sourceRD"], restup["resId"]]])
 		else:
 			try:
 				res.append(identifiers.getResobFromRestup(restup))
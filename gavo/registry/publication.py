@@ -32,6 +32,8 @@ from gavo import utils
 
 from gavo.registry import builders
 from gavo.registry import common
+from gavo.registry import identifiers
+from gavo.registry.model import OAI
 
 
 def makeBaseRecord(res, keepTimestamp=False):
@@ -240,11 +242,68 @@ class RDRscRecGrammar(grammars.Grammar):
 _rdRscRecGrammar = base.makeStruct(RDRscRecGrammar)
 
 
+_RECORD_MAKERS = [
+	("ivo_vor", builders.getVORMetadataElement),
+	("oai_dc", builders.getDCMetadataElement)]
+
+
+def updateOAIRecords(rd, connection):
+	"""renders OAI-PMH records for all resources from rd and stores them
+	in dc.oairecords.
+
+	This needs to run after the resource records from rd have been
+	committed, since the record headers are built from what's in the
+	database.  Records that cannot be rendered are skipped; the OAI-PMH
+	interface will then build them on the fly.
+	"""
+	svcRD = common.getServicesRD()
+	rscTD = svcRD.getById("resources")
+	recTable = rsc.TableForDef(svcRD.getById("oairecords"),
+		connection=connection)
+	recTable.deleteMatching("sourceRD=%(rdId)s", {"rdId": rd.sourceId})
+
+	setsForResource = {}
+	for resId, setName in connection.query("SELECT resId, setName"
+			" FROM dc.sets WHERE sourceRD=%(rdId)s", {"rdId": rd.sourceId}):
+		setsForResource.setdefault(resId, set()).add(setName)
+
+	for restup in rsc.TableForDef(rscTD, connection=connection).iterQuery(
+			rscTD, "sourceRD=%(rdId)s", {"rdId": rd.sourceId}):
+		if restup["deleted"]:
+			resob = identifiers.getResobFromRestup(restup)
+		else:
+			resob = rd.getById(restup["resId"])
+		header = builders.getOAIHeaderElementForRestup(restup)
+
+		for setName in setsForResource.get(restup["resId"], ()):
+			for prefix, makeMetadata in _RECORD_MAKERS:
+				try:
+					record = OAI.record[
+						header,
+						OAI.metadata[makeMetadata(resob, set([setName]))]].render()
+				except Exception, ex:
+					base.ui.notifyWarning("Not storing %s record for %s#%s: %s"%(
+						prefix, rd.sourceId, restup["resId"], ex))
+					continue
+
+				recTable.addRow({
+					"sourceRD": rd.sourceId,
+					"resId": restup["resId"],
+					"setName": setName,
+					"metadataPrefix": prefix,
+					"recTimestamp": restup["recTimestamp"],
+					"record": record.decode("utf-8")})
+
+
 def updateServiceList(rds, metaToo=False, connection=None, onlyWarn=True,
 		keepTimestamp=False):
 	"""updates the services defined in rds in the services table in the database.
+
+	After that, the OAI-PMH records for the resources from rds are
+	re-rendered (see updateOAIRecords).
 	"""
 	recordsWritten = 0
+	publishedRDs = []
 	parseOptions = rsc.getParseOptions(validateRows=True, batchSize=20)
 	if connection is None:
 		connection = base.getDBConnection("admin")
@@ -274,6 +333,7 @@ def updateServiceList(rds, metaToo=False, connection=None, onlyWarn=True,
 				tap.publishToTAP(rd, connection)
 
 			deletedUpdater()
+			publishedRDs.append(rd)
 
 		except base.MetaValidationError, ex:
 			msg = ("Aborting publication of rd '%s' since meta structure of"
@@ -296,6 +356,10 @@ def updateServiceList(rds, metaToo=False, connection=None, onlyWarn=True,
 		msg = None
 
 	connection.commit()
+
+	for rd in publishedRDs:
+		updateOAIRecords(rd, connection)
+	connection.commit()
 	return recordsWritten
 
 
@@ -310,7 +374,7 @@ def _purgeFromServiceTables(rdId, conn):
 	cursor = conn.cursor()
 	for tableName in [
 			"resources", "interfaces", "sets", "subjects", "res_dependencies",
-			"authors"]:
+			"authors", "oairecords"]:
 		cursor.execute("delete from dc.%s where sourceRD=%%(rdId)s"%tableName,
 			{"rdId": rdId})
 	cursor.close()
@@ -12,7 +12,7 @@ Instantiated resources (tables, etc), plus data mangling.
 
 from gavo.rsc.common import DBTableError, FLUSH
 from gavo.rsc.dbtable import DBTable
-from gavo.rsc.qtable import QueryTable
+from gavo.rsc.qtable import QueryTable, StreamingQueryTable
 from gavo.rsc.table import BaseTable
 from gavo.rsc.tables import TableForDef, makeTableForQuery, makeTableFromRows
 from gavo.rsc.data import (Data, makeData, wrapTable, makeDependentsFor,
@@ -127,7 +127,9 @@ class ParseOptions(object):
 def getParseOptions(validateRows=True, updateMode=False, doTableUpdates=False,
 		batchSize=1024, maxRows=None, keepGoing=False, dropIndices=False,
 		dumpRows=False, metaOnly=False, buildDependencies=True,
-		systemImport=False, commitAfterMeta=False, dumpIngestees=False):
+		systemImport=False, commitAfterMeta=False, dumpIngestees=False,
+		copyMode=None, nParallel=1, incremental=False, hashSources=False,
+		rowmakerBatch=0):
 	"""returns an object with some attributes set.
 
 	This object is used in the parsing code in dddef.  It's a standin
@@ -140,6 +142,13 @@ def getParseOptions(validateRows=True, updateMode=False, doTableUpdates=False,
 
 	See commandline.py for the meaning of the attributes.
 
+	copyMode, if non-None, overrides the copyMode attributes of the makes
+	processed; it can be insert, text, or binary.  nParallel>1 makes 
+	makeData process sources in that many worker processes.  incremental
+	makes makeData only process new or changed sources; with hashSources,
+	source content is compared in addition to size and date.  
+	rowmakerBatch>0 makes rowmakers process that many rows per call.
+
 	The exception is buildDependencies.  This is true for most internal
 	builds of data (and thus here), but false when we need to manually
 	control when dependencies are built, as in user.importing and
@@ -159,6 +168,11 @@ def getParseOptions(validateRows=True, updateMode=False, doTableUpdates=False,
 	po.buildDependencies = buildDependencies
 	po.commitAfterMeta = commitAfterMeta
 	po.dumpIngestees = dumpIngestees
+	po.copyMode = copyMode
+	po.nParallel = nParallel
+	po.incremental = incremental
+	po.hashSources = hashSources
+	po.rowmakerBatch = rowmakerBatch
 	return po
 
 
@@ -8,6 +8,7 @@ Making data out of descriptors and sources.
 #c COPYING file in the source distribution.
 
 
+import copy
 import itertools
 import operator
 import sys
@@ -17,6 +18,7 @@ from gavo import rscdef
 from gavo import utils
 from gavo.base import sqlsupport
 from gavo.rsc import common
+from gavo.rsc import incremental
 from gavo.rsc import table
 from gavo.rsc import tables
 
@@ -24,6 +26,36 @@ from gavo.rsc import tables
 MS = base.makeStruct
 
 
+class _BatchingAdder(object):
+	"""An adder for raw rows collecting them until batchSize rows are
+	there and then running them through a rowmaker's processBatch.
+
+	Call flush to process the rows collected so far.
+	"""
+	def __init__(self, feeder, makeRows, table, batchSize, dumpIngestees=False):
+		self.feeder, self.makeRows, self.table = feeder, makeRows, table
+		self.batchSize, self.dumpIngestees = batchSize, dumpIngestees
+		self.pending = []
+	
+	def add(self, srcRow):
+		self.pending.append(srcRow)
+		if len(self.pending)>=self.batchSize:
+			self.flush()
+	
+	def flush(self):
+		if not self.pending:
+			return
+		rows, self.pending = self.pending, []
+		procRows = list(self.makeRows(rows, self.table))
+		if self.dumpIngestees:
+			for procRow in procRows:
+				print "PROCESSED ROW:", procRow
+		self.feeder.addBatch(procRows)
+
+	def reset(self):
+		self.pending = []
+
+
 class _DataFeeder(table._Feeder):
 	"""is a feeder for data (i.e., table collections).
 
@@ -37,10 +69,22 @@ class _DataFeeder(table._Feeder):
 
 	If you pass in a connection, the data feeder will manage it (i.e.
 	commit if all went well, rollback otherwise).
+
+	copyMode, if non-None, overrides the copyMode attributes of the
+	makes (cf. dbtable._CopyFeeder).
+
+	With rowmakerBatch>0, raw rows are collected and passed to the rowmakers 
+	in lists of that many rows (see rmkdef.Rowmaker.processBatch).  Call 
+	flushRows to have the rows collected so far processed; this happens
+	automatically on flush and on successful exit.
 	"""
 	def __init__(self, data, batchSize=1024, dispatched=False,
-			runCommit=True, connection=None, dumpIngestees=False):
+			runCommit=True, connection=None, dumpIngestees=False,
+			copyMode=None, rowmakerBatch=0):
 		self.data, self.batchSize = data, batchSize
+		self.copyMode = copyMode
+		self.rowmakerBatch = rowmakerBatch
+		self.batchingAdders = []
 		self.runCommit = runCommit
 		self.nAffected = 0
 		self.connection = connection
@@ -65,17 +109,28 @@ class _DataFeeder(table._Feeder):
 		adders, parAdders, feeders = {}, {}, []
 		for make in self.data.dd.makes:
 			table = self.data.tables[make.table.id]
-			feeder = table.getFeeder(batchSize=self.batchSize)
+			feederArgs = {"batchSize": self.batchSize}
+			copyMode = self.copyMode or make.copyMode
+			if table.tableDef.onDisk and copyMode!="insert":
+				feederArgs["copyMode"] = copyMode
+			feeder = table.getFeeder(**feederArgs)
 			makeRow = make.rowmaker.compileForTableDef(table.tableDef)
 
-			def addRow(srcRow, feeder=feeder, makeRow=makeRow):
-				try:
-					procRow = makeRow(srcRow, table)
-					if self.dumpIngestees:
-						print "PROCESSED ROW:", procRow
-					feeder.add(procRow)
-				except rscdef.IgnoreThisRow:
-					pass
+			if self.rowmakerBatch and make.rowSource!="parameters":
+				adder = _BatchingAdder(feeder, makeRow.processBatch, table,
+					self.rowmakerBatch, self.dumpIngestees)
+				self.batchingAdders.append(adder)
+				addRow = adder.add
+
+			else:
+				def addRow(srcRow, feeder=feeder, makeRow=makeRow):
+					try:
+						procRow = makeRow(srcRow, table)
+						if self.dumpIngestees:
+							print "PROCESSED ROW:", procRow
+						feeder.add(procRow)
+					except rscdef.IgnoreThisRow:
+						pass
 
 			if make.rowSource=="parameters":
 				parAdders.setdefault(make.role, []).append(addRow)
@@ -123,11 +178,20 @@ class _DataFeeder(table._Feeder):
 
 		return add, addParameters
 
+	def flushRows(self):
+		"""runs the rowmakers on raw rows collected in batched mode.
+		"""
+		for adder in self.batchingAdders:
+			adder.flush()
+
 	def flush(self):
+		self.flushRows()
 		for feeder in self.feeders:
 			feeder.flush()
 	
 	def reset(self):
+		for adder in self.batchingAdders:
+			adder.reset()
 		for feeder in self.feeders:
 			feeder.reset()
 
@@ -138,6 +202,7 @@ class _DataFeeder(table._Feeder):
 
 	def _breakCycles(self):
 		del self.feeders
+		del self.batchingAdders
 		del self.add
 		del self.addParameters
 
@@ -172,6 +237,12 @@ class _DataFeeder(table._Feeder):
 		clients explicitely forbid it).
 		"""
 		affected = []
+		try:
+			self.flushRows()
+		except:
+			self._exitFailing(*sys.exc_info())
+			raise
+
 		for feeder in self.feeders:
 			try:
 				feeder.__exit__(None, None, None)
@@ -284,12 +355,17 @@ class Data(base.MetaMixin, common.ParamMixin):
 						t.dropIndices()
 			return
 
+		recreated = False
 		for t in self:
 			if t.tableDef.system and not self.parseOptions.systemImport:
 				continue
 			if t.tableDef.onDisk:
 				t.runScripts("preImport")
 				t.recreate()
+				recreated = True
+
+		if recreated:
+			incremental.forgetFingerprints(self.dd, connection)
 
 	def commitAll(self):
 		"""commits all dependent tables.
@@ -354,27 +430,66 @@ class _EnoughRows(base.ExecutiveAction):
 	"""
 
 
+def _reserveSharedRow(rowCount, maxRows):
+	"""returns the number of the next row within a parallel import, or
+	None if maxRows rows have already been reserved.
+
+	rowCount is a multiprocessing.Value shared between the workers.
+	"""
+	with rowCount.get_lock():
+		if rowCount.value>=maxRows:
+			return None
+		rowCount.value += 1
+		return rowCount.value
+
+
 def _pipeRows(srcIter, feeder, opts):
 	pars = srcIter.getParameters()
 	if opts.dumpIngestees:
 		print "PROCESSED PARAMS:", pars
 	feeder.addParameters(pars)
 
-	for srcRow in srcIter:
+	# the row iterator notifies incoming rows in chunks, so base.ui.totalRead
+	# lags behind; hence, we count ourselves for maxRows.  In the workers
+	# of parallel imports, the count is shared between all workers.
+	readBefore, rowsPiped = base.ui.totalRead, 0
+	sharedRowCount = getattr(opts, "sharedRowCount", None)
+	srcRows = iter(srcIter)
+
+	def stopPiping():
+		feeder.flushRows()
+		# close the row iterator now so it reports its rows and
+		# finishes its source before anyone looks at the counts.
+		if hasattr(srcRows, "close"):
+			srcRows.close()
+		raise _EnoughRows
+
+	for srcRow in srcRows:
 
 		if srcRow is common.FLUSH:
 			feeder.flush()
 			continue
 
-		if srcIter.notify:
-			base.ui.notifyIncomingRow(srcRow)
 		if opts.dumpRows:
 			print srcRow
 
+		rowNumber = None
+		if opts.maxRows and srcIter.notify:
+			if sharedRowCount is None:
+				rowsPiped += 1
+				rowNumber = readBefore+rowsPiped
+			else:
+				rowNumber = _reserveSharedRow(sharedRowCount, opts.maxRows)
+				if rowNumber is None:
+					# other workers have already filled the quota
+					stopPiping()
+
 		feeder.add(srcRow)
-		if opts.maxRows:
-			if base.ui.totalRead>=opts.maxRows:
-				raise _EnoughRows
+		if rowNumber is not None and rowNumber>=opts.maxRows:
+			stopPiping()
+
+	# make sure all rows of this source are made before it is done
+	feeder.flushRows()
 
 
 def _processSourceReal(data, source, feeder, opts):
@@ -407,6 +522,9 @@ def processSource(data, source, feeder, opts, connection=None):
 	and make the system continue importing even if a particular source 
 	has caused an error.  In that case, everything contributed by
 	the bad source is rolled back.
+
+	The function returns True if the source has been ingested, False
+	if it has been rolled back.
 	"""
 	if not opts.keepGoing:
 		# simple shortcut if we don't want to recover from bad sources
@@ -426,6 +544,171 @@ def processSource(data, source, feeder, opts, connection=None):
 				base.ui.notifyError("Error while importing source; changes from"
 					" this source will be rolled back, processing will continue."
 					" (%s)"%utils.safe_str(ex))
+			return False
+	return True
+
+
+def _iterQueuedSources(sourceQueue, abortEvent):
+	"""iterates over the sources in sourceQueue up to the next None.
+
+	Once abortEvent is set, the remaining sources are consumed but not
+	returned.
+	"""
+	while True:
+		source = sourceQueue.get()
+		if source is None:
+			return
+		if not abortEvent.is_set():
+			yield source
+
+
+def _runImportWorker(dd, parseOptions, feederOpts, 
+		sourceQueue, resultQueue, abortEvent, verdictConn, rowCount):
+	"""processes sources from sourceQueue within a worker process of a
+	parallel import.
+
+	Each worker uses its own database connection and keeps its transaction
+	open until the parent process sends a verdict through verdictConn
+	(True for commit, False for rollback).  Before waiting for the verdict,
+	the worker puts a pair of (errorMessage, nAffected) into resultQueue,
+	where errorMessage is None if all went well.
+
+	rowCount is a multiprocessing.Value counting the rows all workers
+	have imported so far if parseOptions.maxRows is set, None otherwise.
+	"""
+	if rowCount is not None:
+		# parseOptions may come from optparse and hence lack change()
+		parseOptions = copy.copy(parseOptions)
+		parseOptions.sharedRowCount = rowCount
+	connection = base.getDBConnection("admin")
+	sources = _iterQueuedSources(sourceQueue, abortEvent)
+	try:
+		data = Data.create(dd, parseOptions, connection=connection)
+		with data.getFeeder(connection=connection, runCommit=False, 
+				**feederOpts) as feeder:
+			for source in sources:
+				try:
+					processSource(data, source, feeder, parseOptions, connection)
+				except _EnoughRows:
+					base.ui.notifyWarning("Source hit import limit, worker stops.")
+					# no sense handing out further sources
+					abortEvent.set()
+					break
+				except base.SkipThis:
+					continue
+		resultQueue.put((None, feeder.getAffected()))
+
+	except Exception, ex:
+		abortEvent.set()
+		resultQueue.put(("%s (%s)"%(utils.safe_str(ex), ex.__class__.__name__),
+			0))
+		if not connection.closed:
+			connection.rollback()
+
+	# consume the rest of our share of the queue so the parent doesn't block
+	for _ in sources:
+		pass
+
+	if verdictConn.recv() and not connection.closed:
+		connection.commit()
+	elif not connection.closed:
+		connection.rollback()
+	connection.close()
+
+
+def _putSource(sourceQueue, source, workers):
+	"""puts source into sourceQueue, waiting while the queue is full.
+
+	This returns False (and does not put anything) if no worker is
+	left to take the source, True otherwise.
+	"""
+	import Queue
+
+	while True:
+		try:
+			sourceQueue.put(source, timeout=1)
+			return True
+		except Queue.Full:
+			if not [w for w, _ in workers if w.is_alive()]:
+				return False
+
+
+def _processSourcesParallel(dd, parseOptions, feederOpts, connection):
+	"""imports the sources of dd using parseOptions.nParallel worker
+	processes and returns the number of rows they affected.
+
+	The tables must have been created and committed by connection.
+	Each worker process runs grammar and rowmakers for the sources it
+	pulls from a common queue and feeds the results to the database
+	through its own connection.  The workers only commit when all of them
+	have succeeded; if one fails, all roll back and a ReportableError
+	is raised.
+
+	keepGoing works as usual, i.e., failing sources are rolled back
+	within the worker that processed them.  maxRows limits the rows
+	imported by all workers together.  Sources must be picklable,
+	which is true for file names and the usual string items.
+	"""
+	import multiprocessing
+	import Queue
+
+	nParallel = parseOptions.nParallel
+	sourceQueue = multiprocessing.Queue(nParallel*4)
+	resultQueue = multiprocessing.Queue()
+	abortEvent = multiprocessing.Event()
+	rowCount = None
+	if parseOptions.maxRows:
+		rowCount = multiprocessing.Value("l", 0)
+	workers = []
+	for i in range(nParallel):
+		parentEnd, childEnd = multiprocessing.Pipe()
+		proc = multiprocessing.Process(target=_runImportWorker,
+			args=(dd, parseOptions, feederOpts, 
+				sourceQueue, resultQueue, abortEvent, childEnd, rowCount))
+		proc.start()
+		workers.append((proc, parentEnd))
+
+	# if all workers have died, we stop feeding them; the loop collecting
+	# the results below notices what happened.
+	try:
+		for source in dd.iterSources(connection):
+			if abortEvent.is_set():
+				break
+			if not _putSource(sourceQueue, source, workers):
+				break
+	finally:
+		for i in range(nParallel):
+			if not _putSource(sourceQueue, None, workers):
+				break
+
+	errors, nAffected, nReported = [], 0, 0
+	while nReported<nParallel:
+		try:
+			errMsg, affected = resultQueue.get(timeout=1)
+		except Queue.Empty:
+			# workers only exit after our verdict, so dead ones have crashed
+			if [w for w, _ in workers if not w.is_alive()]:
+				errors.append("Worker process died unexpectedly")
+				break
+			continue
+		nReported += 1
+		if errMsg is not None:
+			errors.append(errMsg)
+		nAffected += affected
+
+	for proc, verdictConn in workers:
+		if proc.is_alive():
+			verdictConn.send(not errors)
+	for proc, verdictConn in workers:
+		proc.join()
+
+	if errors:
+		raise base.ReportableError("Parallel import of %s failed: %s"%(
+			dd.id, "; ".join(errors)),
+			hint="Changes from all workers have been rolled back; the tables"
+			" have been created, though.  Re-run without --parallel to see"
+			" more details.")
+	return nAffected
 
 
 class _TableCornucopeia(object):
@@ -449,6 +732,16 @@ def makeData(dd, parseOptions=common.parseNonValidating,
 
 	You can pass in a data instance created by yourself in data.  This
 	makes sense if you want to, e.g., add some meta information up front.
+
+	If parseOptions.incremental is true, only new or changed sources are
+	processed, and rows from changed or vanished sources are removed
+	(see incremental.SourceTracker).  Tables are not dropped in that case.
+
+	If parseOptions.nParallel is larger than one, sources will be 
+	processed by that many worker processes (see _processSourcesParallel).
+	This requires committing connection after the tables have been
+	(re-) created, so the import is no longer done within a single
+	transaction.
 	"""
 	# Some proc setup does expensive things like actually building data.
 	# We don't want that when validating and return some empty data thing.
@@ -458,35 +751,73 @@ def makeData(dd, parseOptions=common.parseNonValidating,
 	if connection is None:
 		connection = base.getDBConnection("admin")
 
+	tracker = None
+	if parseOptions.incremental and forceSource is None:
+		if parseOptions.nParallel>1:
+			raise base.ReportableError("Incremental imports cannot run"
+				" in parallel.")
+		# parseOptions may come from optparse and hence lack change()
+		parseOptions = copy.copy(parseOptions)
+		parseOptions.updateMode = True
+
 	if data is None:
 		res = Data.create(dd, parseOptions, connection=connection)
 	else:
 		res = data
 	res.recreateTables(connection)
+	if parseOptions.incremental and forceSource is None:
+		tracker = incremental.SourceTracker(res, connection, 
+			parseOptions.hashSources)
 	
 	feederOpts = {"batchSize": parseOptions.batchSize, "runCommit": runCommit,
-		"dumpIngestees": parseOptions.dumpIngestees}
+		"dumpIngestees": parseOptions.dumpIngestees, 
+		"copyMode": parseOptions.copyMode,
+		"rowmakerBatch": parseOptions.rowmakerBatch}
 	if dd.grammar and dd.grammar.isDispatching:
 		feederOpts["dispatched"] = True
 
+	nParallel = parseOptions.nParallel
+	if nParallel>1 and forceSource is None:
+		# the workers must see the tables
+		connection.commit()
+		workerOpts = feederOpts.copy()
+		del workerOpts["runCommit"]
+
 	with res.getFeeder(connection=connection, **feederOpts) as feeder:
-		if forceSource is None:
-			for source in dd.iterSources(connection):
+		if nParallel>1 and forceSource is None:
+			parallelAffected = _processSourcesParallel(
+				dd, parseOptions, workerOpts, connection)
+		elif forceSource is None:
+			sources = dd.iterSources(connection)
+			if tracker:
+				sources = tracker.iterChangedSources(sources)
+			for source in sources:
 				try:
-					processSource(res, source, feeder, parseOptions, connection)
+					if (processSource(res, source, feeder, parseOptions, connection)
+							and tracker):
+						tracker.sourceProcessed(source)
 				except _EnoughRows:
 					base.ui.notifyWarning("Source hit import limit, import aborted.")
 					break
 				except base.SkipThis:
 					continue
+			else:
+				if tracker:
+					tracker.removeVanished()
 		else:
-			processSource(res, forceSource, feeder, parseOptions, connection)
+			try:
+				processSource(res, forceSource, feeder, parseOptions, connection)
+			except _EnoughRows:
+				base.ui.notifyWarning("Source hit import limit, import aborted.")
 
 	res.validateParams()
 
 	if runCommit:
 		res.commitAll()
-	res.nAffected = feeder.getAffected()
+	if nParallel>1 and forceSource is None:
+		res.nAffected = parallelAffected
+	else:
+		res.nAffected = feeder.getAffected()
 
 	if parseOptions.buildDependencies:
 		makeDependentsFor([dd], parseOptions, connection)
@@ -516,6 +847,10 @@ def makeDependentsFor(dds, parseOptions, connection):
 
 	if parseOptions.buildDependencies:
 		parseOptions = parseOptions.change(buildDependencies=False)
+	if parseOptions.incremental:
+		# dependents are always rebuilt completely
+		parseOptions = copy.copy(parseOptions)
+		parseOptions.incremental = False
 	
 	try:
 		buildSequence = utils.topoSort(edges)
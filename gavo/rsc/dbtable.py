@@ -16,6 +16,7 @@ from gavo import base
 from gavo import rscdef
 from gavo import utils
 from gavo.base import sqlsupport
+from gavo.utils import pgcopy
 from gavo.rsc import common
 from gavo.rsc import table
 
@@ -74,6 +75,20 @@ class _Feeder(table._Feeder):
 		if len(self.batchCache)>=self.batchSize:
 			self.shipout()
 
+	def addBatch(self, rows):
+		self._assertActive()
+		if self.table.validateRows:
+			try:
+				self.table.tableDef.validateBatch(rows)
+			except rscdef.IgnoreThisRow:
+				# let add sort out which rows to drop
+				for row in rows:
+					self.add(row)
+				return
+		self.batchCache.extend(rows)
+		if len(self.batchCache)>=self.batchSize:
+			self.shipout()
+
 	def flush(self):
 		self._assertActive()
 		self.shipout()
@@ -110,6 +125,55 @@ class _Feeder(table._Feeder):
 		return self.nAffected
 
 
+class _CopyFeeder(_Feeder):
+	"""A feeder shipping out its batches as postgres COPY streams.
+
+	This is much faster than the executemany-based INSERTs of the plain
+	feeder.  Pass binary=True to use postgres' binary COPY format; this
+	only works for tables with columns of simple types (see 
+	utils.pgcopy.getBinaryEncoder).
+
+	When postgres rejects a COPY batch with an integrity or data error,
+	the batch is rolled back and re-sent through the INSERT path of the
+	plain feeder, which will then complain about the offending row(s)
+	in its usual way.
+	"""
+	def __init__(self, parent, insertCommand, binary=False, **kwargs):
+		_Feeder.__init__(self, parent, insertCommand, **kwargs)
+		columns = parent.tableDef.columns
+		self.copyCommand = "COPY %s (%s) FROM STDIN%s"%(
+			parent.tableName,
+			", ".join(str(c.name) for c in columns),
+			" WITH BINARY" if binary else "")
+		self.keys = [c.key for c in columns]
+		if binary:
+			self.makeStream = pgcopy.makeBinaryStreamMaker(
+				[c.type for c in columns])
+		else:
+			self.makeStream = pgcopy.makeTextCopyStream
+
+	def _copyBatch(self):
+		keys = self.keys
+		stream = self.makeStream(
+			[tuple(row[key] for key in keys) for row in self.batchCache])
+		with self.table.connection.savepoint():
+			self.cursor.copy_expert(self.copyCommand, stream)
+
+	def shipout(self):
+		if self.batchCache:
+			try:
+				self._copyBatch()
+			except (sqlsupport.IntegrityError, sqlsupport.DataError), ex:
+				base.ui.notifyWarning("COPY failed (%s); retrying batch with"
+					" INSERTs to locate the offending row"%utils.safe_str(ex))
+				return _Feeder.shipout(self)
+
+			self.nAffected += len(self.batchCache)
+			if self.notify:
+				base.ui.notifyShipout(len(self.batchCache))
+			self.batchCache = []
+
+
 class _RaisingFeeder(_Feeder):
 	"""is a feeder that will bomb on any attempt to feed data to it.
 
@@ -118,6 +182,8 @@ class _RaisingFeeder(_Feeder):
 	def add(self, data):
 		raise base.DataError("Attempt to feed to a read-only table")
 
+	addBatch = add
+
 
 class MetaTableMixin(object):
 	"""is a mixin providing methods updating the dc_tables.
@@ -395,9 +461,35 @@ class DBTable(DBMethodsMixin, table.BaseTable, MetaTableMixin):
 		else:
 			return self.tableExists(self.tableName)
 
+	def _canCopy(self):
+		"""returns True if rows for this table can be shipped out using COPY.
+
+		COPY cannot do updates, and it does not run rules (which is what
+		most dupePolicies are implemented with).
+		"""
+		if self.tableUpdates:
+			return False
+		if self.tableDef.forceUnique and self.tableDef.dupePolicy!="dropOld":
+			return False
+		return True
+
 	def getFeeder(self, **kwargs):
+		"""returns a feeder for this table.
+
+		Pass copyMode="text" or copyMode="binary" to have the feeder 
+		use COPY rather than INSERT statements (see _CopyFeeder).  The
+		COPY request is ignored for updating imports and tables with
+		rule-based dupePolicies.
+		"""
 		if "notify" not in kwargs:
 			kwargs["notify"] = not self.tableDef.system or not self.tableDef.onDisk
+		copyMode = kwargs.pop("copyMode", None)
+		if copyMode in ("text", "binary"):
+			if self._canCopy():
+				return _CopyFeeder(self, self.addCommand, 
+					binary=copyMode=="binary", **kwargs)
+			base.ui.notifyDebug("Not using COPY for %s (updates or dupePolicy)"%
+				self.tableName)
 		return _Feeder(self, self.addCommand, **kwargs)
 
 	def importFinished(self):
@@ -406,6 +498,9 @@ class DBTable(DBMethodsMixin, table.BaseTable, MetaTableMixin):
 			self.makeIndices()
 			self.runScripts("postCreation")
 		else:
+			# postCreation scripts don't run for updating imports, but
+			# obscore may need the new rows
+			self._updateObscoreSources()
 			base.ui.notifyDBTableModified(self.tableName)
 
 		self.query("ANALYZE %s"%self.tableName)
@@ -539,14 +634,12 @@ class DBTable(DBMethodsMixin, table.BaseTable, MetaTableMixin):
 		self.newlyCreated = True
 		return self.configureTable()
 
-	def updateMeta(self):
-		if self.tableDef.temporary:
-			return
-		self.setTablePrivileges(self.tableDef)
-		self.setSchemaPrivileges(self.tableDef.rd)
-
-		# Hack to support adding obscore using meta updates:
-		# execute a script to add us to the obscore sources table.
+	def _updateObscoreSources(self):
+		"""adds the table to the obscore sources (and its rows to a materialised
+		obscore) if it is published to obscore.
+		"""
+		# Hack to support adding obscore using meta updates and updating
+		# imports: execute a script to add us to the obscore sources table.
 		# XXX TODO: probably replace this with a script type metaUpdate
 		# once we have table scripts again.
 		if self.tableDef.hasProperty("obscoreClause"):
@@ -554,6 +647,14 @@ class DBTable(DBMethodsMixin, table.BaseTable, MetaTableMixin):
 			script = base.caches.getRD("//obscore").getById(
 				"addTableToObscoreSources")
 			scripting.PythonScriptRunner(script).run(self)
+
+	def updateMeta(self):
+		if self.tableDef.temporary:
+			return
+		self.setTablePrivileges(self.tableDef)
+		self.setSchemaPrivileges(self.tableDef.rd)
+
+		self._updateObscoreSources()
 		if not self.nometa:
 			self.addToMeta()
 			if self.commitAfterMeta:
@@ -0,0 +1,187 @@
+"""
+Support for incremental imports.
+
+An incremental import only processes sources that are new or have
+changed since the last import; the fingerprints of the sources processed
+are kept in dc.sourcefingerprints.  Rows originating from changed or
+vanished sources are removed using the sourceColumn attributes of the
+makes.
+"""
+
+#c Copyright 2008-2017, the GAVO project
+#c
+#c This program is free software, covered by the GNU GPL.  See the
+#c COPYING file in the source distribution.
+
+
+import hashlib
+import os
+
+from gavo import base
+from gavo import utils
+
+
+def _hashFile(path):
+	"""returns the hex SHA1 of the content of the file at path.
+	"""
+	hash = hashlib.sha1()
+	with open(path, "rb") as f:
+		while True:
+			chunk = f.read(1000000)
+			if not chunk:
+				break
+			hash.update(chunk)
+	return hash.hexdigest()
+
+
+def forgetFingerprints(dd, connection):
+	"""removes all source fingerprints recorded for dd.
+
+	This is called when the tables of dd are recreated.  Failures (e.g.,
+	because dc.sourcefingerprints does not exist yet) are ignored.
+	"""
+	try:
+		with connection.savepoint():
+			connection.execute("DELETE FROM dc.sourcefingerprints"
+				" WHERE ddId=%(ddId)s", {"ddId": dd.getFullId()})
+	except base.DBError:
+		pass
+
+
+class SourceTracker(object):
+	"""A manager for the fingerprints of a DD's sources.
+
+	It is constructed with a Data instance, the connection the import runs
+	in, and a flag whether to compare source content hashes in addition
+	to size and mtime.
+
+	Source keys are inputs-relative paths for files below inputsDir, the
+	full path for other files, and the source itself for non-file sources
+	(i.e., sources items).  Non-file sources are not re-processed once
+	they have been recorded.
+
+	Incremental imports need to know which rows came from which source.
+	Hence, all makes feeding on-disk tables need to have a sourceColumn
+	containing the source key (e.g., \inputRelativePath in the rowmaker,
+	or the accref for product tables); otherwise, a ReportableError is
+	raised on construction.
+	"""
+	def __init__(self, data, connection, useHash=False):
+		self.data, self.connection, self.useHash = data, connection, useHash
+		self.ddId = data.dd.getFullId()
+		self.inputsDir = base.getConfig("inputsDir")
+		self._checkSourceColumns()
+
+		if [t for t in data if getattr(t, "newlyCreated", False)]:
+			# tables are fresh, old fingerprints are meaningless
+			forgetFingerprints(data.dd, connection)
+
+		self.stored = dict((row[0], tuple(row[1:]))
+			for row in self.connection.query(
+				"SELECT source, srcSize, srcMtime, srcHash"
+				" FROM dc.sourcefingerprints WHERE ddId=%(ddId)s",
+				{"ddId": self.ddId}))
+		self.seen = set()
+
+	def _checkSourceColumns(self):
+		self.sourceColumns = []
+		for make in self.data.dd.makes:
+			if not make.table.onDisk or make.table.viewStatement:
+				continue
+			if make.sourceColumn is None:
+				raise base.ReportableError("Cannot import %s incrementally:"
+					" make for %s has no sourceColumn."%(
+						self.ddId, make.table.id),
+					hint="Incremental imports need to know which rows came from"
+					" which source.  Add a column containing, e.g., "
+					" \\inputRelativePath and name it in the make's"
+					" sourceColumn attribute.")
+			self.sourceColumns.append((
+				make.table.getQName(),
+				make.table.getColumnByName(make.sourceColumn).name))
+
+	def getKey(self, source):
+		"""returns the key source is recorded under.
+		"""
+		if isinstance(source, basestring) and os.path.isfile(source):
+			try:
+				return utils.getRelativePath(source, self.inputsDir,
+					liberalChars=True)
+			except ValueError: # not in inputs, use full path.
+				return source
+		return unicode(source)
+
+	def getFingerprint(self, source):
+		"""returns a triple of (size, mtime, hash) for source.
+
+		For non-file sources, all three are None; hash is only computed
+		when the tracker uses hashes.
+		"""
+		if isinstance(source, basestring) and os.path.isfile(source):
+			stat = os.stat(source)
+			return (stat.st_size, stat.st_mtime,
+				_hashFile(source) if self.useHash else None)
+		return (None, None, None)
+
+	def isUnchanged(self, key, fingerprint):
+		if key not in self.stored:
+			return False
+		size, mtime, hash = self.stored[key]
+		if size is None:  # non-file source
+			return True
+		if (size, mtime)!=fingerprint[:2]:
+			return False
+		if self.useHash and hash is not None:
+			return hash==fingerprint[2]
+		return True
+
+	def _deleteRowsFor(self, key):
+		for tableName, colName in self.sourceColumns:
+			self.connection.execute("DELETE FROM %s WHERE %s=%%(key)s"%(
+				tableName, colName), {"key": key})
+
+	def iterChangedSources(self, sources):
+		"""iterates over those items of sources that need to be processed.
+
+		For changed sources, the rows from the previous import are removed
+		before they are returned.
+		"""
+		for source in sources:
+			key = self.getKey(source)
+			self.seen.add(key)
+			if self.isUnchanged(key, self.getFingerprint(source)):
+				base.ui.notifyDebug("Skipping unchanged source %s"%key)
+				continue
+
+			if key in self.stored:
+				self._deleteRowsFor(key)
+			yield source
+
+	def sourceProcessed(self, source):
+		"""records the fingerprint of source as ingested.
+		"""
+		key = self.getKey(source)
+		size, mtime, hash = self.getFingerprint(source)
+		self.connection.execute("DELETE FROM dc.sourcefingerprints"
+			" WHERE ddId=%(ddId)s AND source=%(source)s",
+			{"ddId": self.ddId, "source": key})
+		self.connection.execute("INSERT INTO dc.sourcefingerprints"
+			" (ddId, source, srcSize, srcMtime, srcHash)"
+			" VALUES (%(ddId)s, %(source)s, %(size)s, %(mtime)s, %(hash)s)",
+			{"ddId": self.ddId, "source": key, "size": size, "mtime": mtime,
+				"hash": hash})
+		self.stored[key] = (size, mtime, hash)
+
+	def removeVanished(self):
+		"""removes rows and fingerprints of all sources recorded but not
+		seen in iterChangedSources.
+
+		Only call this when all sources have been iterated over.
+		"""
+		for key in set(self.stored)-self.seen:
+			base.ui.notifyInfo("Removing rows from vanished source %s"%key)
+			self._deleteRowsFor(key)
+			self.connection.execute("DELETE FROM dc.sourcefingerprints"
+				" WHERE ddId=%(ddId)s AND source=%(source)s",
+				{"ddId": self.ddId, "source": key})
+			del self.stored[key]
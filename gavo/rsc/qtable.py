@@ -12,6 +12,8 @@ the rows.  The metadata is usable as with any other table.
 #c COPYING file in the source distribution.
 
 
+import sys
+
 from gavo import base
 from gavo import rscdef
 from gavo.rsc import dbtable
@@ -19,6 +21,10 @@ from gavo.rsc import table
 from gavo.utils import pgexplain
 
 
+# number of rows StreamingQueryTable fetches per round trip
+FETCH_SIZE = 1000
+
+
 class QueryTable(table.BaseTable, dbtable.DBMethodsMixin):
 	"""QueryTables are constructed with a table definition and a DB query
 	feeding this table definition.
@@ -34,6 +40,7 @@ class QueryTable(table.BaseTable, dbtable.DBMethodsMixin):
 	the result table (fromColumns).
 	"""
 	connection = None
+	_cursor = _pending = None
 
 	def __init__(self, tableDef, query, connection, **kwargs):
 		self.connection = connection
@@ -64,8 +71,34 @@ class QueryTable(table.BaseTable, dbtable.DBMethodsMixin):
 		return cls(base.makeStruct(rscdef.TableDef, columns=columns),
 			query, connection=connection, **kwargs)
 
+	def start(self):
+		"""runs the query and fetches the first batch of rows.
+
+		Call this if you want errors in running the query (e.g., timeouts)
+		raised before you start writing the rows out; otherwise, this
+		happens when iteration starts.  If the query fails, the table
+		is cleaned up.
+		"""
+		if self._cursor is not None:
+			return
+		if self.connection is None:
+			raise base.ReportableError("QueryTable already exhausted.")
+
+		try:
+			self._cursor = self.connection.cursor("cursor"+hex(id(self)))
+			self._cursor.execute(self.query)
+			self._pending = self._cursor.fetchmany(1000)
+		except:
+			self._cursor = None
+			self.cleanup()
+			raise
+
 	def __iter__(self):
-		"""actually runs the query and returns rows (dictionaries).
+		"""actually runs the query (unless start has already done that)
+		and returns rows.
+
+		The rows are utils.CompactRows unless the table definition has
+		fixups, in which case they are dictionaries.
 
 		You can only iterate once.  At exhaustion, the connection will
 		be closed.
@@ -73,22 +106,24 @@ class QueryTable(table.BaseTable, dbtable.DBMethodsMixin):
 		if self.connection is None:
 			raise base.ReportableError("QueryTable already exhausted.")
 
+		makeRow = (self.tableDef.getCompactRowClass() 
+			or self.tableDef.makeRowFromTuple)
 		nRows = 0
-		cursor = self.connection.cursor("cursor"+hex(id(self)))
-		cursor.execute(self.query)
-		while True:
-			nextRows = cursor.fetchmany(1000)
-			if not nextRows:
-				break
+		self.start()
+		cursor, nextRows = self._cursor, self._pending
+		self._pending = None
+		while nextRows:
 			for row in nextRows:
 				nRows += 1
-				yield self.tableDef.makeRowFromTuple(row)
+				yield makeRow(row)
+			nextRows = cursor.fetchmany(1000)
 		cursor.close()
+		self._cursor = None
 
 		if self.matchLimit and self.matchLimit==nRows:
 			self.setMeta("_queryStatus", "OVERFLOW")
 		else:
-			self.setMeta("_queryStatus", "OVERFLOW")
+			self.setMeta("_queryStatus", "OK")
 		self.cleanup()
 
 	def __len__(self):
@@ -118,3 +153,215 @@ class QueryTable(table.BaseTable, dbtable.DBMethodsMixin):
 
 	def __del__(self):
 		self.cleanup()
+
+
+class StreamingQueryTable(table.BaseTable):
+	"""A table representing a query that only holds a database connection
+	from when the query is run until its rows are exhausted.
+
+	These are constructed with a table definition matching the query's
+	select list, the query, its parameters, and a connection factory
+	(one of the context managers from base.sqlsupport).  Since the rows
+	are pulled through a named cursor, the connections the factory
+	returns must not be autocommitted (e.g., base.getWritableTableConn).
+
+	If you pass matchLimit, the query should return at most matchLimit+1 rows
+	(queryMeta.asSQL arranges for that).  The table then yields at most
+	matchLimit rows, and after exhaustion, overflowed is True if there
+	were more.  You can pass timeout (in seconds) to set a statement
+	timeout while the query runs.
+
+	Consumers can add functions mapping rows (dictionaries) to rows
+	using addRowFilter; they are applied in the order they were added.
+	Without row filters, the rows are utils.CompactRows where the
+	table definition allows that (see QueryTable).
+	When the rows are exhausted, the table's _queryStatus meta is set,
+	and, if given, onExhausted(table) is called.
+
+	The query is run and the first batch of rows is fetched when you call
+	start (or, if you don't, when you start iterating), so that errors
+	in running the query (e.g., timeouts) can be handled before any output
+	is written.  Database errors in later fetches are raised from the
+	iterator unless errorsInBand is True, in which case the iteration
+	just stops, the exception is stored in the error attribute, and
+	_queryStatus is ERROR.  Pass an errorMapper function (that raises
+	a nicer exception when passed sys.exc_info()) to have that stored 
+	instead of the raw database exception.
+
+	As with QueryTables, you can only iterate once.  If you started the
+	table but do not iterate it, call close to return the connection.
+	"""
+	def __init__(self, tableDef, query, pars=None, **kwargs):
+		self.connFactory = kwargs.pop("connFactory", base.getWritableTableConn)
+		self.matchLimit = kwargs.pop("matchLimit", None)
+		self.timeout = kwargs.pop("timeout", None)
+		self.onExhausted = kwargs.pop("onExhausted", None)
+		self.errorMapper = kwargs.pop("errorMapper", None)
+		if "rows" in kwargs:
+			raise base.ReportableError("StreamingQueryTables cannot be"
+				" constructed with rows.")
+		self.query, self.pars = query, pars or {}
+		table.BaseTable.__init__(self, tableDef, **kwargs)
+
+		# rows are always made for the query's select list, even when
+		# consumers later change tableDef.
+		self._makeRow = tableDef.makeRowFromTuple
+		self._compactRowClass = tableDef.getCompactRowClass()
+		self.rowFilters = []
+		self.started = self.exhausted = self.overflowed = False
+		self.errorsInBand, self.error = False, None
+		self.rowsDelivered = 0
+
+		self.connection = self._cursor = self._pending = None
+		self._managers = []
+
+	def addRowFilter(self, rowFilter):
+		"""arranges for rowFilter(row) -> row to be applied to the rows
+		as they are iterated.
+
+		rowFilter must not hold a reference to the table (use a weakref if
+		you need it); since the table has a __del__, python would never
+		collect the reference cycle, and the connection would never be
+		given back.
+		"""
+		self.rowFilters.append(rowFilter)
+
+	def _enter(self, manager):
+		"""enters the context manager manager, arranging for it to be
+		exited by close.
+		"""
+		res = manager.__enter__()
+		self._managers.append(manager)
+		return res
+
+	def open(self):
+		"""returns the connection the query is run on, obtaining it from
+		connFactory if necessary.
+
+		Use this if you need a connection to build the query; the connection
+		is given back on close.
+		"""
+		if self.connection is None:
+			try:
+				self.connection = self._enter(self.connFactory())
+				self._enter(base.connectionConfiguration(
+					self.connection, timeout=self.timeout))
+			except:
+				self.close(*sys.exc_info())
+				raise
+		return self.connection
+
+	def start(self):
+		"""runs the query and fetches the first batch of rows.
+
+		Database errors occurring while doing that are raised from here
+		(and the connection is given back).
+		"""
+		if self.started:
+			return
+		self.started = True
+
+		conn = self.open()
+		try:
+			self._cursor = conn.cursor("cursor"+hex(id(self)))
+			self._cursor.execute(self.query, self.pars)
+			self._pending = self._cursor.fetchmany(FETCH_SIZE)
+		except:
+			self.close(*sys.exc_info())
+			raise
+
+	def close(self, excType=None, excVal=None, excTb=None):
+		"""closes the cursor and returns the connection to its pool.
+
+		Pass exception info if closing because of an exception; the
+		connection will then be rolled back.
+		"""
+		if self._cursor is not None:
+			try:
+				self._cursor.close()
+			except base.DBError:
+				# the transaction is broken anyway, and the managers will
+				# roll it back.
+				pass
+			self._cursor = None
+
+		managers, self._managers = self._managers, []
+		self.connection = self._pending = None
+		while managers:
+			managers.pop().__exit__(excType, excVal, excTb)
+
+	def _iterFetched(self):
+		"""iterates over the row tuples the query returns.
+
+		This implements the errorsInBand logic.
+		"""
+		while self._pending:
+			rows, self._pending = self._pending, None
+			for row in rows:
+				yield row
+
+			try:
+				self._pending = self._cursor.fetchmany(FETCH_SIZE)
+			except base.DBError:
+				if not self.errorsInBand:
+					raise
+				self.error = sys.exc_info()[1]
+				if self.errorMapper is not None:
+					try:
+						self.errorMapper(*sys.exc_info())
+					except Exception, ex:
+						self.error = ex
+				base.ui.notifyError("Streamed query failed: %s"%self.error)
+
+	def __iter__(self):
+		"""runs the query if that hasn't happened yet and returns the rows.
+
+		The connection is returned to its pool when the rows are exhausted
+		or the consumer closes the iterator.
+		"""
+		if self.exhausted:
+			raise base.ReportableError("StreamingQueryTable already exhausted.")
+		self.exhausted = True
+		self.start()
+
+		makeRow = self._makeRow
+		if not self.rowFilters and self._compactRowClass:
+			makeRow = self._compactRowClass
+
+		try:
+			for tupRow in self._iterFetched():
+				if self.rowsDelivered==self.matchLimit:
+					self.overflowed = True
+					break
+
+				row = makeRow(tupRow)
+				for rowFilter in self.rowFilters:
+					row = rowFilter(row)
+				self.rowsDelivered += 1
+
+				try:
+					yield row
+				except GeneratorExit:
+					# the consumer has given up; close normally so the connection
+					# is properly returned to the pool.
+					break
+		except:
+			self.close(*sys.exc_info())
+			raise
+		self.close()
+
+		if self.error is not None:
+			self.setMeta("_queryStatus", "ERROR")
+		elif self.overflowed:
+			self.setMeta("_queryStatus", "OVERFLOW")
+		else:
+			self.setMeta("_queryStatus", "OK")
+		if self.onExhausted is not None:
+			self.onExhausted(self)
+
+	def __del__(self):
+		self.close()
+
+	def __len__(self):
+		# Avoid unnecessary failures when doing list(StreamingQueryTable())
+		raise AttributeError()
@@ -38,6 +38,8 @@ class _Feeder(object):
 
 		- add(row) -> None -- add row to table.  This may raise all kinds
 			of crazy exceptions.
+		- addBatch(rows) -> None -- add all rows in the list rows; feeders
+		  may validate and ship these in one go.
 		- flush() -> None -- flush out all data that may be cached to the table
 		  (this is done automatically on a successful exit)
 		- reset() -> None -- discard any data that may still wait to be 
@@ -74,6 +76,10 @@ class _Feeder(object):
 		self.table.addRow(row)
 		self.nAffected += 1
 
+	def addBatch(self, rows):
+		for row in rows:
+			self.add(row)
+
 	def flush(self):
 		self._assertActive()
 		# no-op for ram feeder
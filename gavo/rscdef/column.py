@@ -278,6 +278,8 @@ class Values(base.Structure):
 	def _evaluateFromDB(self, ctx):
 		if not getattr(ctx, "doQueries", True):
 			return
+		# the result depends on the database; don't persist it (see rscdesc)
+		ctx.queriedDB = True
 		try:
 			with base.getTableConn() as conn:
 				for row in conn.query(self.parent.parent.expand(
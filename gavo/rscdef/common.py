@@ -145,6 +145,9 @@ class IVOMetaMixin(object):
 	that stuff is defined.  But it can't be there, since it's needed for
 	the definition of tabledefs.
 	"""
+	# don't persist what we got from the services table
+	_volatileAttributes = frozenset(["_IVOMetaMixin__dbRecord"])
+
 	def _meta_referenceURL(self):
 		return base.META_CLASSES_FOR_KEYS["referenceURL"](
 			self.getURL("info"),
@@ -263,6 +266,17 @@ class Registration(base.Structure):
 		for srv in self.services:
 			srv.declareServes(self.parent)
 
+	def restoreForeignDeclarations(self):
+		"""re-declares our data to services from other RDs.
+
+		This is for RDs restored from pickles (see rscdesc), which already
+		contain everything register did on their own elements, whereas
+		the services from other RDs have never seen our data.
+		"""
+		for srv in self.services:
+			if srv.rd.sourceId!=self.parent.rd.sourceId:
+				srv.declareServesForeign(self.parent)
+
 
 class ColumnList(list):
 	"""A list of column.Columns (or derived classes) that takes
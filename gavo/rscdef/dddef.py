@@ -227,6 +227,27 @@ class Make(base.Structure, scripting.ScriptingMixin):
 		copyable=True,
 		strip=True)
 
+	_copyMode = base.EnumeratedUnicodeAttribute("copyMode",
+		default="insert",
+		validValues=["insert", "text", "binary"],
+		description="How to ship rows to on-disk tables: with INSERT"
+		" statements (insert), or in postgres COPY streams in text or"
+		" binary format.  COPY is much faster for large imports; binary"
+		" only works for tables with simple column types (numbers, strings,"
+		" dates).  Updating imports and most dupePolicies always use INSERT."
+		"  dachs imp --copy overrides this.",
+		copyable=True)
+
+	_sourceColumn = base.UnicodeAttribute("sourceColumn",
+		default=None,
+		description="Name of a column in the table containing the key"
+		" of the source a row was made from (the inputs-relative path for"
+		" files, as returned by \\inputRelativePath; for product tables,"
+		" this is usually accref).  Incremental imports (dachs imp"
+		" --incremental) use this to remove rows from changed or vanished"
+		" sources.",
+		copyable=True)
+
 	def __repr__(self):
 		return "Make(table=%r, rowmaker=%r)"%(
 			self.table and self.table.id, self.rowmaker and self.rowmaker.id)
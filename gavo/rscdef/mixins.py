@@ -142,6 +142,12 @@ class MixinDef(activetags.ReplayBase):
 		copyable=True)
 	_original = base.OriginalAttribute()
 
+	_volatileAttributes = frozenset(["applicationLock"])
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self.applicationLock = threading.Lock()
+
 	def completeElement(self, ctx):
 		# we want to double-expand macros in mixins.  Thus, reset all
 		# value/expanded events to plain values
@@ -532,6 +532,28 @@ class ParmakerDef(RowmakerDef):
 identityRowmaker = base.makeStruct(RowmakerDef, idmaps="*")
 
 
+# The template for the functions processing lists of rows; the mapper
+# source goes where the pass is.  BATCH_LINE_OFFSET is the number of lines
+# before the mapper source.
+_BATCH_TEMPLATE = """def rowmakerBatch_(rows_, targetTable, _self):
+  results_ = []
+  for vars in rows_:
+    for defKey_ in defaultKeys_:
+      if defKey_ not in vars:
+        vars[defKey_] = defaults_[defKey_]
+    result = {}
+    try:
+      pass
+%s
+    except IgnoreThisRow:
+      continue
+    _self.rowsMade += 1
+    results_.append(result)
+  return results_
+"""
+BATCH_LINE_OFFSET = 9
+
+
 class Rowmaker(object):
 	"""A callable that arranges for the mapping of key/value pairs to 
 	other key/value pairs.
@@ -546,6 +568,10 @@ class Rowmaker(object):
 
 	It is called with a dictionary of locals for the functions (i.e.,
 	usually the result of a grammar iterRows).
+
+	To save the per-row overhead of exec, you can also pass lists of
+	rows to processBatch.  This uses a function with a loop over the rows
+	compiled around the mapping code.
 	"""
 	def __init__(self, source, name, globals, defaults, lineMap):
 		try:
@@ -559,18 +585,39 @@ class Rowmaker(object):
 		self.keySet = set(self.defaults)
 		self.lineMap = sorted(lineMap.items())
 		self.rowsMade = 0
+		self.batchFunction = self._compileBatchFunction()
+
+	def _compileBatchFunction(self):
+		"""returns a function processing lists of rows, or None if the mapper
+		source cannot be put into a function.
+
+		The latter happens for sources containing multi-line strings, which
+		we would mangle when indenting the source.
+		"""
+		if '"""' in self.source or "'''" in self.source:
+			return None
+		batchSource = _BATCH_TEMPLATE%re.sub("(?m)^", "      ", self.source)
+		batchGlobals = self.globals.copy()
+		batchGlobals["defaults_"] = self.defaults
+		batchGlobals["defaultKeys_"] = list(self.keySet)
+		try:
+			exec compile(batchSource, "generated batch mapper code", "exec"
+				) in batchGlobals
+		except SyntaxError:
+			return None
+		return batchGlobals["rowmakerBatch_"]
 
-	def _guessExSourceName(self, tb):
+	def _guessExSourceName(self, tb, lineOffset=0):
 		"""returns an educated guess as to which mapping should have
 		caused that traceback in tb.
 
 		This is done by inspecting the second-topmost stackframe.  It
 		must hold the generated line that, possibly indirectly, caused
 		the exception.  This line should be in the lineMap generated by
-		RowmakerDef._getSource.
+		RowmakerDef._getSource (shifted by lineOffset for batch functions).
 		"""
 		if tb.tb_next:
-			excLine = tb.tb_next.tb_lineno
+			excLine = tb.tb_next.tb_lineno-lineOffset
 			base.ui.notifyDebug(
 				"Here's the traceback:\n%s"%"".join(traceback.format_tb(tb)))
 		else: # toplevel failure, internal
@@ -583,12 +630,12 @@ class Rowmaker(object):
 			destInd -= 1
 		return self.lineMap[destInd][1]
 
-	def _guessError(self, ex, rowdict, tb):
+	def _guessError(self, ex, rowdict, tb, lineOffset=0):
 		"""tries to shoehorn a ValidationError out of ex.
 		"""
 		base.ui.notifyDebug("Rowmaker failed.  Exception below.  Failing source"
 			" is:\n%s"%self.source)
-		destName = self._guessExSourceName(tb)
+		destName = self._guessExSourceName(tb, lineOffset)
 		if isinstance(ex, KeyError):
 			msg = "Key %s not found in a mapping."%unicode(ex)
 			hint = ("This probably means that your grammar did not yield the"
@@ -626,3 +673,30 @@ class Rowmaker(object):
 			raise
 		except Exception, ex:
 			self._guessError(ex, locals["vars"], sys.exc_info()[2])
+
+	def processBatch(self, rows, table):
+		"""returns a list of the rows made from the raw rows in the list rows.
+
+		Rows for which IgnoreThisRow is raised are left out.  Errors are
+		reported as in row-by-row processing; in particular, the rowdict
+		of the ValidationError is the failing row.
+		"""
+		if self.batchFunction is None:
+			res = []
+			for row in rows:
+				try:
+					res.append(self(row, table))
+				except rmkfuncs.IgnoreThisRow:
+					pass
+			return res
+
+		try:
+			return self.batchFunction(rows, table, self)
+		except base.ValidationError:   # hopefully downstream knows better than we
+			raise
+		except Exception, ex:
+			tb = sys.exc_info()[2]
+			failingRow = None
+			if tb.tb_next:
+				failingRow = tb.tb_next.tb_frame.f_locals.get("vars")
+			self._guessError(ex, failingRow, tb, BATCH_LINE_OFFSET)
@@ -454,6 +454,11 @@ class TableDef(base.Structure, base.ComputedMetaMixin, common.PrivilegesMixin,
 
 	fixupFunction = None
 
+	# compiled validators, see validateRow and validateBatch
+	_cacheRowValidator = _cacheBatchValidator = None
+	# see getCompactRowClass
+	_cacheCompactRowClass = None
+
 	metaModel = ("title(1), creationDate(1), description(1),"
 		"subject, referenceURL(1)")
 
@@ -604,12 +609,11 @@ class TableDef(base.Structure, base.ComputedMetaMixin, common.PrivilegesMixin,
 					" have no qualified names")
 			return "%s.%s"%(self.rd.schema, self.id)
 
-	def validateRow(self, row):
-		"""checks that row is complete and complies with all known constraints on
-		the columns
+	def _validateRowGenerically(self, row):
+		"""checks row against the constraints of all columns one by one.
 
-		The function raises a ValidationError with an appropriate message
-		and the relevant field if not.
+		This is what the compiled validators fall back to when a row fails
+		their checks in order to produce the proper error message.
 		"""
 		for col in self:
 			if col.key not in row:
@@ -624,6 +628,99 @@ class TableDef(base.Structure, base.ComputedMetaMixin, common.PrivilegesMixin,
 				ex.row = row
 				raise
 
+	def _getValidatorSource(self, globals):
+		"""returns an expression that is true when the value "row" violates 
+		constraints of our columns.
+
+		This mirrors what column.ColumnBase.validateValue does.  Objects the
+		expression needs are entered into globals.  If a column has a 
+		custom validateValue, None is returned.
+		"""
+		def literal(ob, prefix):
+			if type(ob) in (str, unicode):
+				return repr(ob)
+			name = "%s%d"%(prefix, len(globals))
+			globals[name] = ob
+			return name
+
+		conditions = []
+		for col in self:
+			if col.__class__.validateValue.im_func is not (
+					column.ColumnBase.validateValue.im_func):
+				return None
+			conditions.append("%s not in row"%literal(col.key, "key"))
+			value = "row[%s]"%literal(col.name, "name")
+			if col.required:
+				conditions.append("%s is None"%value)
+
+			vals = col.values
+			if isinstance(col, column.Column) or not vals:
+				continue
+			if vals.options:
+				conditions.append("(%s and not %s(%s))"%(value, 
+					literal(vals.validateOptions, "validateOptions"), value))
+			else:
+				if vals.min:
+					conditions.append("(%s is not None and %s<%s)"%(
+						value, value, literal(vals.min, "min")))
+				if vals.max:
+					conditions.append("(%s is not None and %s>%s)"%(
+						value, value, literal(vals.max, "max")))
+
+		return "\n      or ".join(conditions) or "False"
+
+	def _compileValidator(self, forBatch):
+		"""returns a function checking a row (or, with forBatch, a list of rows)
+		with straight-line code.
+
+		If a row fails the checks, it is passed to _validateRowGenerically
+		to raise the appropriate error.
+		"""
+		globals = {}
+		condition = self._getValidatorSource(globals)
+		if condition is None:
+			if forBatch:
+				def validateBatch(rows):
+					for row in rows:
+						self._validateRowGenerically(row)
+				return validateBatch
+			return self._validateRowGenerically
+
+		globals["checkSlowly"] = self._validateRowGenerically
+		if forBatch:
+			source = [
+				"def validate(rows):",
+				"  for row in rows:",
+				"    if (%s):"%condition,
+				"      checkSlowly(row)"]
+		else:
+			source = [
+				"def validate(row):",
+				"    if (%s):"%condition,
+				"      checkSlowly(row)"]
+		return utils.compileFunction("\n".join(source), "validate", globals)
+
+	def validateRow(self, row):
+		"""checks that row is complete and complies with all known constraints on
+		the columns
+
+		The function raises a ValidationError with an appropriate message
+		and the relevant field if not.
+		"""
+		if self._cacheRowValidator is None:
+			self._cacheRowValidator = self._compileValidator(False)
+		self._cacheRowValidator(row)
+
+	def validateBatch(self, rows):
+		"""runs validateRow on all rows in the list rows.
+
+		This saves the per-row function call overhead over calling
+		validateRow in a loop.
+		"""
+		if self._cacheBatchValidator is None:
+			self._cacheBatchValidator = self._compileValidator(True)
+		self._cacheBatchValidator(rows)
+
 	def getFieldIndex(self, fieldName):
 		"""returns the index of the field named fieldName.
 		"""
@@ -708,6 +805,20 @@ class TableDef(base.Structure, base.ComputedMetaMixin, common.PrivilegesMixin,
 			return self.fixupFunction(preRes)
 		return preRes
 
+	def getCompactRowClass(self):
+		"""returns a utils.CompactRow class that turns rows as returned from 
+		the database into rows for this table.
+
+		This returns None if the table has fixups, since these need 
+		dictionaries; use makeRowFromTuple then.
+		"""
+		if self.fixupFunction:
+			return None
+		if (self._cacheCompactRowClass is None
+				or self._cacheCompactRowClass.fieldNames!=tuple(self.dictKeys)):
+			self._cacheCompactRowClass = utils.getCompactRowClass(self.dictKeys)
+		return self._cacheCompactRowClass
+
 	def getDefaults(self):
 		"""returns a mapping from column names to defaults to be used when
 		making a row for this table.
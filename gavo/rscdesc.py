@@ -16,6 +16,8 @@ the database.
 #c COPYING file in the source distribution.
 
 
+import contextlib
+import cPickle
 import datetime
 import grp
 import os
@@ -482,6 +484,284 @@ def setRDDateTime(rd, inputFile):
 		rd.timestampUpdated)
 
 
+############### persistent RD cache
+# With [general]pickleRDs, getRD keeps pickles of the RDs it parses for
+# the RD cache in cacheDir/rds.  Each pickle comes with the modification
+# dates of the RD's source and the sources of all RDs it requested while
+# being parsed (which is what the RD may have copied stuff from); the pickle
+# is only used while all these are unchanged.
+
+# Change this when pickled RDs from earlier versions must not be used any
+# more for reasons other than a DaCHS version change.
+RD_PICKLE_FORMAT = 1
+
+_PROXY_TYPES = (weakref.ProxyType, weakref.CallableProxyType)
+
+
+class _Unpicklable(base.Error):
+	"""is raised when an RD refers to something we cannot persist.
+	"""
+
+
+# _parseDependencies.stack contains sets of the RD ids requested from the
+# RD cache, one per RD currently parsed in the thread.
+_parseDependencies = threading.local()
+
+
+@contextlib.contextmanager
+def _collectingDependencies():
+	"""a context manager collecting the ids of the RDs requested from the
+	RD cache within the controlled block into the set returned.
+	"""
+	stack = _parseDependencies.__dict__.setdefault("stack", [])
+	stack.append(set())
+	try:
+		yield stack[-1]
+	finally:
+		stack.pop()
+
+
+def _noteDependency(srcId):
+	"""records that the RD currently being parsed (if any) requested srcId.
+	"""
+	stack = getattr(_parseDependencies, "stack", None)
+	if stack:
+		stack[-1].add(srcId)
+
+
+def _getSourceStamp(srcPath):
+	"""returns the modification date of the RD source srcPath, or None
+	if it cannot be determined.
+	"""
+	try:
+		if isinstance(srcPath, PkgResourcePath):
+			srcPath = pkg_resources.resource_filename('gavo', srcPath)
+		return os.path.getmtime(srcPath)
+	except (os.error, IOError, NotImplementedError):
+		return None
+
+
+def _getPicklePath(srcId):
+	return os.path.join(base.getConfig("cacheDir"), "rds",
+		srcId.replace("/", "%")+".pickle")
+
+
+def _getPickleVersion():
+	return (RD_PICKLE_FORMAT, base.getVersion())
+
+
+def _getReferent(proxy):
+	"""returns the object a weakref.proxy refers to.
+	"""
+	# the proxy forwards attribute access, and so this is a method
+	# bound to the referent.
+	return proxy.__getattribute__.__self__
+
+
+def _getOwningRD(ob):
+	"""returns the RD the structure ob belongs to, or None for orphans.
+	"""
+	while ob is not None and not isinstance(ob, RD):
+		ob = getattr(ob, "parent", None)
+	return ob
+
+
+def _getChildLocation(parent, child):
+	"""returns a pair of attribute name and list index (or None) for where
+	child is in parent.
+	"""
+	for att in parent.attrSeq:
+		value = getattr(parent, att.name_, None)
+		if value is child:
+			return att.name_, None
+		if isinstance(value, list):
+			for index, item in enumerate(value):
+				if item is child:
+					return att.name_, index
+	raise _Unpicklable("Cannot locate %s in %s"%(child.name_, parent.name_))
+
+
+def _getElementReference(ob, owner):
+	"""returns a pair of an id in owner and a path to ob from the element 
+	with that id.
+
+	The id is None if the path starts at owner itself.  The path is
+	a list of pairs as returned by _getChildLocation.
+	"""
+	path = []
+	while ob is not owner:
+		elId = getattr(ob, "id", None)
+		if elId is not None and owner.idmap.get(elId) is ob:
+			break
+		path.append(_getChildLocation(ob.parent, ob))
+		ob = ob.parent
+	else:
+		elId = None
+	path.reverse()
+	return elId, path
+
+
+def _resolveElementReference(rdId, elId, path):
+	"""returns the element referenced by the results of _getElementReference.
+	"""
+	ob = base.caches.getRD(rdId)
+	if elId is not None:
+		ob = ob.idmap[elId]
+	for attName, index in path:
+		ob = getattr(ob, attName)
+		if index is not None:
+			ob = ob[index]
+	return ob
+
+
+def _makePersistentId(rd):
+	"""returns a persistent_id function for pickling rd.
+
+	This keeps other RDs and their elements out of the pickle (they
+	are retrieved from the RD cache when unpickling, elements by id and
+	attribute path) and turns weak proxies into something that can be 
+	pickled.
+	"""
+	def persistentId(ob):
+		if ob is rd:
+			return "self"
+		elif type(ob) in _PROXY_TYPES:
+			return ("proxy", _getReferent(ob))
+		elif isinstance(ob, RD):
+			return ("rd", ob.sourceId)
+
+		elif isinstance(ob, base.Structure):
+			owner = _getOwningRD(ob)
+			if owner is None or owner is rd:
+				return None
+			return ("element", owner.sourceId)+_getElementReference(ob, owner)
+
+		return None
+
+	return persistentId
+
+
+def _makePersistentLoad(rd):
+	"""returns a persistent_load function for unpickling what 
+	_makePersistentId(rd) produced.
+	"""
+	def persistentLoad(pid):
+		if pid=="self":
+			return rd
+		elif pid[0]=="proxy":
+			return weakref.proxy(pid[1])
+		elif pid[0]=="rd":
+			return base.caches.getRD(pid[1])
+		elif pid[0]=="element":
+			return _resolveElementReference(*pid[1:])
+		raise cPickle.UnpicklingError("Unknown persistent id %s"%repr(pid))
+
+	return persistentLoad
+
+
+def _iterConfigSources():
+	"""iterates over the paths of configuration files that may be
+	expanded into an RD while parsing it.
+
+	These are gavo.rc and the user's .gavorc, defaultmeta.txt and the 
+	userconfig RD.
+	"""
+	yield os.environ.get("GAVOSETTINGS", "/etc/gavo.rc")
+	yield os.environ.get("GAVOCUSTOM", 
+		os.path.join(os.environ.get("HOME", "/no_home"), ".gavorc"))
+	yield os.path.join(base.getConfig("configDir"), "defaultmeta.txt")
+	for srcPath in _getFilenamesForId(USERCONFIG_RD_PATH):
+		yield srcPath
+
+
+def _computeSourceStamps(rd, ownStamp, dependencies):
+	"""returns a dictionary mapping source paths to modification dates
+	for rd, the RDs it depends on, and the configuration files.
+
+	For dependencies that could not be loaded, all paths an RD would be
+	searched for are entered, mapped to None for non-existing files.
+	This raises an _Unpicklable if the sources of a dependency are
+	unknown.
+	"""
+	stamps = dict((srcPath, _getSourceStamp(srcPath))
+		for srcPath in _iterConfigSources())
+	stamps[rd.srcPath] = ownStamp
+	rdCache = base.caches.getRD.cacheCopy
+	for depId in dependencies:
+		if depId==rd.sourceId or depId=="%":
+			continue
+
+		dep = rdCache.get(depId)
+		if isinstance(dep, RD):
+			if getattr(dep, "sourceStamps", None) is None:
+				raise _Unpicklable("Sources of %s unknown"%depId)
+			stamps.update(dep.sourceStamps)
+		else:
+			for srcPath in _getFilenamesForId(depId):
+				stamps[srcPath] = _getSourceStamp(srcPath)
+
+	return stamps
+
+
+def _pickleRD(rd, ownStamp, dependencies):
+	"""writes a pickle of rd to the RD pickle directory.
+
+	Any problems are only reported as debug messages; rd will then
+	just be parsed again next time.
+	"""
+	try:
+		rd.sourceStamps = _computeSourceStamps(rd, ownStamp, dependencies)
+		destDir = os.path.dirname(_getPicklePath(rd.sourceId))
+		utils.ensureDir(destDir)
+		with utils.safeReplaced(_getPicklePath(rd.sourceId)) as f:
+			pickler = cPickle.Pickler(f, cPickle.HIGHEST_PROTOCOL)
+			pickler.persistent_id = _makePersistentId(rd)
+			pickler.dump(_getPickleVersion())
+			pickler.dump(rd.sourceStamps)
+			pickler.dump(rd.__getstate__())
+	except Exception, ex:
+		base.ui.notifyDebug("Not pickling %s: %s"%(rd.sourceId, ex))
+
+
+def _restoreRD(rd):
+	"""fills rd from its pickle if there is one that is still valid.
+
+	This returns True if rd has been restored, False if it needs to be
+	parsed.
+	"""
+	try:
+		f = open(_getPicklePath(rd.sourceId))
+	except IOError:
+		return False
+
+	try:
+		try:
+			unpickler = cPickle.Unpickler(f)
+			unpickler.persistent_load = _makePersistentLoad(rd)
+			if unpickler.load()!=_getPickleVersion():
+				return False
+			for srcPath, stamp in unpickler.load().iteritems():
+				if _getSourceStamp(srcPath)!=stamp:
+					return False
+			state = unpickler.load()
+		finally:
+			f.close()
+	except Exception, ex:
+		base.ui.notifyDebug("Ignoring bad pickle for %s: %s"%(rd.sourceId, ex))
+		return False
+
+	rd.__dict__.update(state)
+	rd.loadedAt = time.time()
+	if rd.require:
+		# parsing would have imported this as a side effect
+		rd.importModule(None)
+
+	for child in rd.dds+rd.tables:
+		if child.registration:
+			child.registration.restoreForeignDeclarations()
+	return True
+
+
 USERCONFIG_RD_PATH = os.path.join(base.getConfig("configDir"), "userconfig")
 
 
@@ -561,13 +841,27 @@ def getRD(srcId, doQueries=True, restricted=False, useRD=None):
 	rd.srcPath = getRD_context.srcPath = srcPath
 	rd.idmap = getRD_context.idmap
 
+	# only RDs parsed for the RD cache are persisted.
+	usePickle = (useRD is not None
+		and base.getConfig("pickleRDs")
+		and getRD_context.doQueries
+		and not getRD_context.restricted)
+	if usePickle and _restoreRD(rd):
+		setRDDateTime(rd, inputFile)
+		return rd
+
+	ownStamp = _getSourceStamp(srcPath)
 	try:
-		rd = base.parseFromStream(rd, inputFile, context=getRD_context)
+		with _collectingDependencies() as dependencies:
+			rd = base.parseFromStream(rd, inputFile, context=getRD_context)
 	except Exception, ex:
 		ex.srcPath = srcPath
 		ex.cacheable = getRD_context.failuresAreCacheable
 		raise
 	setRDDateTime(rd, inputFile)
+
+	if usePickle and not getattr(getRD_context, "queriedDB", False):
+		_pickleRD(rd, ownStamp, dependencies)
 	return rd
 
 
@@ -617,6 +911,15 @@ def _loadRDIntoCache(canonicalRDId, cacheDict):
 	threads can load RDs.
 	"""
 	with _currentlyParsingLock:
+		if canonicalRDId in cacheDict:
+			# another thread has finished loading the RD after our caller
+			# found it missing (this happens a lot after reloads); don't
+			# parse it again.
+			cachedOb = cacheDict[canonicalRDId]
+			if isinstance(cachedOb, CachedException):
+				cachedOb.raiseAgain()
+			return cachedOb
+
 		if canonicalRDId in _currentlyParsing:
 			lock, rd = _currentlyParsing[canonicalRDId]
 			justWait = True
@@ -673,6 +976,7 @@ def _makeRDCache():
 	rdCache = {}
 
 	def getRDCached(srcId, **kwargs):
+		_noteDependency(canonicalizeRDId(srcId))
 		if kwargs:
 			return getRD(srcId, **kwargs)
 
@@ -14,8 +14,12 @@ from gavo import base
 from gavo import rscdef 
 from gavo import utils 
 
+def _getNoFullId():
+	return None
+
 _EMPTY_TABLE = base.makeStruct(rscdef.TableDef, id="<builtin empty table>")
-_EMPTY_TABLE.getFullId = lambda: None
+# (not a lambda so output tables can be pickled)
+_EMPTY_TABLE.getFullId = _getNoFullId
 
 
 class OutputField(rscdef.Column):
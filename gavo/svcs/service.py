@@ -15,6 +15,7 @@ optionally tinkers with that data set.
 
 import os
 import urllib
+import weakref
 
 from nevow import inevow
 from nevow import rend
@@ -56,6 +57,9 @@ def adaptTable(origTable, newColumns):
 
 	(4) Finally, stick the whole thing into a data container.
 
+	rsc.StreamingQueryTables are not copied; they receive the new columns,
+	and conversions are done as their rows are iterated.
+
 	This stinks.  I'm plotting to do away with it.
 	"""
 	if hasattr(origTable, "noPostprocess"):
@@ -68,7 +72,13 @@ def adaptTable(origTable, newColumns):
 		newTd = origTable.tableDef.copy(origTable.tableDef.parent)
 		newTd.columns = newColumns
 
-	if not colDiffs:
+	isStreaming = isinstance(origTable, rsc.StreamingQueryTable)
+
+	if not colDiffs and isStreaming:
+		origTable.tableDef = newTd
+		newTable = origTable
+
+	elif not colDiffs:
 		newTable = table.InMemoryTable(newTd, rows=origTable.rows)
 		newTable.meta_ = origTable.meta_
 		newTable._params = origTable._params
@@ -83,11 +93,19 @@ def adaptTable(origTable, newColumns):
 			rmk.feedObject("map", rmkdef.MapRule(rmk, dest=col.name,
 				content_="%svars[%s]"%(exprStart, repr(col.name))
 				).finishElement(None))
-		newTable = table.InMemoryTable(newTd, validate=False)
 		mapper = rmk.finishElement(None).compileForTableDef(newTd)
-		for r in origTable:
-			newTable.addRow(mapper(r, newTable))
-		newTable._params = origTable._params
+		if isStreaming:
+			origTable.tableDef = newTd
+			# don't let the filter keep the table alive (it has a __del__,
+			# so a reference cycle would never be collected)
+			tableRef = weakref.proxy(origTable)
+			origTable.addRowFilter(lambda r: mapper(r, tableRef))
+			newTable = origTable
+		else:
+			newTable = table.InMemoryTable(newTd, validate=False)
+			for r in origTable:
+				newTable.addRow(mapper(r, newTable))
+			newTable._params = origTable._params
 
 	return rsc.wrapTable(newTable, rdSource=origTable.tableDef)
 
@@ -735,9 +753,7 @@ class Service(base.Structure, base.ComputedMetaMixin,
 		This is used by table/@adql and the publish element on data.
 		"""
 		if data.registration:
-			self.addMeta("serviceFor", 
-				base.getMetaText(data, "title", default="Anonymous"),
-				ivoId=base.getMetaText(data, "identifier"))
+			self.declareServesForeign(data)
 			data.addMeta("servedBy", 
 				base.getMetaText(self, "title"),
 				ivoId=base.getMetaText(self, "identifier"))
@@ -747,6 +763,15 @@ class Service(base.Structure, base.ComputedMetaMixin,
 			# and to be removed when the data is removed.
 			data.rd.addDependency(self.rd, data.rd)
 
+	def declareServesForeign(self, data):
+		"""adds meta to self indicating that data is served by service.
+
+		This is the part of declareServes that only changes self.
+		"""
+		self.addMeta("serviceFor", 
+			base.getMetaText(data, "title", default="Anonymous"),
+			ivoId=base.getMetaText(data, "identifier"))
+
 
 	########################## Output field selection (ouch!)
 
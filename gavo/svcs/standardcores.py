@@ -379,6 +379,21 @@ class TableBasedCore(core.Core):
 			[cd.asSQL(inputPars, sqlPars, queryMeta)
 				for cd in self.condDescs]), sqlPars
 
+	def _annotateResult(self, res, numMatched, isOverflowed, queryMeta):
+		"""updates queryMeta and the meta of the result table res for
+		a query that returned numMatched rows and possibly overflowed.
+		"""
+		queryMeta["Matched"] = numMatched
+		if isOverflowed:
+			queryMeta["Overflow"] = True
+			res.addMeta("_warning", "The query limit was reached.  Increase it"
+				" to retrieve more matches.  Note that unsorted truncated queries"
+				" are not reproducible (i.e., might return a different result set"
+				" at a later time).")
+			res.setMeta("_queryStatus", "Overflowed")
+		else:
+			res.setMeta("_queryStatus", "Ok")
+
 	def _makeTable(self, rowIter, resultTableDef, queryMeta):
 		"""returns a table from the row iterator rowIter, updating queryMeta
 		as necessary.
@@ -387,17 +402,8 @@ class TableBasedCore(core.Core):
 		isOverflowed =  len(rows)>queryMeta.get("dbLimit", 1e10)
 		if isOverflowed:
 			del rows[-1]
-		queryMeta["Matched"] = len(rows)
 		res = rsc.TableForDef(resultTableDef, rows=rows)
-		if isOverflowed:
-			queryMeta["Overflow"] = True
-			res.addMeta("_warning", "The query limit was reached.  Increase it"
-				" to retrieve more matches.  Note that unsorted truncated queries"
-				" are not reproducible (i.e., might return a different result set"
-				" at a later time).")
-			res.addMeta("_queryStatus", "Overflowed")
-		else:
-			res.addMeta("_queryStatus", "Ok")
+		self._annotateResult(res, len(rows), isOverflowed, queryMeta)
 		return res
 	
 	def adaptForRenderer(self, renderer):
@@ -484,21 +490,70 @@ class DBCore(TableBasedCore):
 		"""
 		return service.getCurOutputFields(queryMeta)
 
+	def wantsStreaming(self, queryMeta):
+		"""returns True if run should return an rsc.StreamingQueryTable
+		rather than an in-memory table.
+
+		This is the case when the renderer has declared that it consumes
+		the result incrementally by setting queryMeta["streamResult"].
+		Derived cores needing random access to all result rows must
+		override this.
+		"""
+		return queryMeta.get("streamResult", False)
+
+	def _makeStreamingTable(self, resultTableDef, fragment, pars, iqArgs,
+			queryMeta):
+		"""returns a started rsc.StreamingQueryTable for what 
+		queriedTable.iterQuery would return.
+
+		The query is already running when this returns, so errors in
+		starting it can be mapped by the caller.  The remaining rows are
+		fetched while the renderer writes its response; hence, queryMeta's
+		Matched and Overflow items are only available when the rows are
+		exhausted.  Errors later on are left to the table's consumer
+		(see rsc.StreamingQueryTable's errorsInBand).
+		"""
+		res = rsc.StreamingQueryTable(resultTableDef, None,
+			connFactory=base.getWritableTableConn,
+			matchLimit=queryMeta.get("dbLimit") or None,
+			timeout=queryMeta["timeout"],
+			errorMapper=mapDBErrors,
+			onExhausted=lambda res: self._annotateResult(
+				res, res.rowsDelivered, res.overflowed, queryMeta))
+		try:
+			queriedTable = rsc.TableForDef(self.queriedTable, nometa=True,
+				create=False, connection=res.open())
+			# getQuery returns resultTableDef unchanged since it is a TableDef
+			_, res.query, res.pars = queriedTable.getQuery(
+				resultTableDef, fragment, pars, **iqArgs)
+			res.start()
+		except:
+			res.close(*sys.exc_info())
+			raise
+		return res
+
 	def _runQuery(self, resultTableDef, fragment, pars, queryMeta,
 			**kwargs):
+		if fragment and pars:
+			resultTableDef.addMeta("info", repr(pars),
+				infoName="queryPars", infoValue=fragment)
+
+		iqArgs = {"limits": queryMeta.asSQL(), "distinct": self.distinct,
+			"groupBy": self.groupBy}
+		iqArgs.update(kwargs)
+
+		if self.wantsStreaming(queryMeta):
+			try:
+				return self._makeStreamingTable(resultTableDef,
+					fragment, pars, iqArgs, queryMeta)
+			except:
+				mapDBErrors(*sys.exc_info())
+
 		with base.getTableConn()  as conn:
 			queriedTable = rsc.TableForDef(self.queriedTable, nometa=True,
 				create=False, connection=conn)
 			queriedTable.setTimeout(queryMeta["timeout"])
 
-			if fragment and pars:
-				resultTableDef.addMeta("info", repr(pars),
-					infoName="queryPars", infoValue=fragment)
-
-			iqArgs = {"limits": queryMeta.asSQL(), "distinct": self.distinct,
-				"groupBy": self.groupBy}
-			iqArgs.update(kwargs)
-
 			try:
 				try:
 					return self._makeTable(
@@ -519,7 +574,7 @@ class DBCore(TableBasedCore):
 
 	def run(self, service, inputTable, queryMeta):
 		"""does the DB query and returns an InMemoryTable containing
-		the result.
+		the result (or a StreamingQueryTable if wantsStreaming says so).
 		"""
 		resultTableDef = self._makeResultTableDef(
 			service, inputTable, queryMeta)
@@ -8,7 +8,6 @@ DC administration interface.
 #c COPYING file in the source distribution.
 
 
-import os
 import sys
 
 from gavo import base
@@ -190,42 +189,19 @@ def declaredel(querier, args):
 @exposedFunction([Arg(help="rd#table-id of the table containing the"
 	" products that should get cached previews", dest="tableId"),
 	Arg("-w", type=str,
-		help="width to compute the preview for", dest="width", default="200"),],
+		help="ignored; previews are always computed at the built-in size",
+		dest="width", default="200"),],
 	help="Precompute previews for the product interface columns in a table.")
 def cacheprev(querier, args):
 	from gavo import api
-	from gavo.web.productrender import PreviewCacheManager
-	from twisted.internet import reactor
+	from gavo.protocols.products import PreviewCacheManager
 
-	basePath = base.getConfig("inputsDir")
 	td = base.resolveId(None, args.tableId)
 	table = api.TableForDef(td, connection=querier.connection)
-	select = [td.getColumnByName("accref"), td.getColumnByName("mime")]
-	rows = table.iterQuery(select , "")
-
-	def runNext(token):
-		try:
-			row = rows.next()
-			res = PreviewCacheManager.getPreviewFor(row["mime"],
-				[str(os.path.join(basePath, row["accref"])), str(args.width)]
-			)
-
-			if getattr(res, "result", None): # don't add a callback on a 
-					# fired deferred or you'll exhaust the stack
-				reactor.callLater(0.1, runNext, "continue")
-			else:
-				res.addCallback(runNext)
-			return res
-		except StopIteration:
-			pass
-		except:
-			import traceback
-			traceback.print_exc()
-		reactor.stop()
-		return ""
-
-	reactor.callLater(0, runNext, "startup")
-	reactor.run()
+	accrefs = [row["accref"] 
+		for row in table.iterQuery([td.getColumnByName("accref")], "")]
+	computed, failed = PreviewCacheManager.prewarm(accrefs)
+	print "%d previews computed, %d failed."%(computed, failed)
 
 
 @exposedFunction([Arg(help="rd#table-id of the table to look at",
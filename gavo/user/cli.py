@@ -49,6 +49,7 @@ functions = [
 	("validate", ("user.validation", "main")),
 	("upgrade", ("user.upgrade", "main")),
 	("uwsrun", ("protocols.useruws", "main")),
+	("uwsworker", ("protocols.uwsworker", "main")),
 # init is special cased, but we want it in here for help generation
 	("init", ("initdachs.info", "main")),
 ]
@@ -157,6 +158,7 @@ def main():
 		"stingy": plainui.StingyPlainUI,
 		"semistingy": plainui.SemiStingyPlainUI,
 		"plain": plainui.PlainUI,
+		"json": plainui.JSONProgressUI,
 	}
 
 	if not (opts.suppressLog or os.environ.get("GAVO_LOG")=="no"):
@@ -167,6 +169,7 @@ def main():
 		opts.uiName = {"registry.publication": "semistingy",
 			"user.dropping": "stingy",
 			"user.serve": "null",
+			"protocols.uwsworker": "stingy",
 			}.get(module, "plain")
 	if opts.uiName not in interfaces:
 		raise base.ReportableError("UI %s does not exist.  Choose one of"
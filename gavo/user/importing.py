@@ -157,6 +157,31 @@ def main():
 		parser.add_option("-b", "--batch-size", help="deliver N rows at a time"
 			" to the database.", dest="batchSize", action="store", type="int",
 			default=5000, metavar="N")
+		parser.add_option("--rowmaker-batch", help="run rowmakers on N"
+			" rows at a time, which saves per-row overhead.  Don't use this"
+			" with rowmakers that look at the grammar's state (e.g., using"
+			" \\rowsProcessed).", dest="rowmakerBatch", action="store",
+			type="int", default=0, metavar="N")
+		parser.add_option("--copy", help="ship rows to the database using"
+			" MODE, which is one of insert, text (COPY in text format), or"
+			" binary (COPY in binary format).  This overrides the copyMode"
+			" attributes of the makes.", dest="copyMode", action="store",
+			type="choice", choices=["insert", "text", "binary"], default=None,
+			metavar="MODE")
+		parser.add_option("-j", "--parallel", help="parse sources in N"
+			" worker processes, each feeding the database through its own"
+			" connection.  This commits table creation before the import proper"
+			" starts.", dest="nParallel", action="store", type="int", default=1,
+			metavar="N")
+		parser.add_option("--incremental", help="only process sources that"
+			" are new or have changed since the last incremental import, and"
+			" remove rows from changed or vanished sources.  This needs"
+			" sourceColumn attributes on the makes.", dest="incremental",
+			action="store_true", default=False)
+		parser.add_option("--hash-sources", help="with --incremental, also"
+			" compare checksums of the source files rather than just their"
+			" sizes and dates.", dest="hashSources", action="store_true",
+			default=False)
 		parser.add_option("-c", "--continue-bad", help="do not bail out after"
 			" an error, just skip the current source and continue with the"
 			" next one.", dest="keepGoing", action="store_true", default=False)
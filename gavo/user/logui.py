@@ -48,6 +48,16 @@ class LoggingUI(ObserverBase):
 			self.infoLogger.info("Swallowed the exception below, re-raising %s"%
 				str(newExc), exc_info=excInfo)
 	
+	@listensTo("Progress")
+	def logProgress(self, progress):
+		if progress.sourceDone:
+			self.infoLogger.info("Source %s: %d rows in %.1f s (%.0f rows/s)"%(
+				progress.sourceName, progress.sourceRead, progress.sourceSeconds,
+				progress.rowsPerSecond))
+		else:
+			self.infoLogger.debug("Source %s: %d rows read (%.0f rows/s)"%(
+				progress.sourceName, progress.sourceRead, progress.rowsPerSecond))
+
 	@listensTo("Info")
 	def logInfo(self, message):
 		self.infoLogger.info(message)
@@ -7,6 +7,9 @@ Observers for running interactive programs in the terminal.
 #c This program is free software, covered by the GNU GPL.  See the
 #c COPYING file in the source distribution.
 
+import json
+import sys
+import time
 
 from gavo import base
 
@@ -52,10 +55,25 @@ class PlainUI(SemiStingyPlainUI):
 		self.showMsg("Starting %s"%srcString)
 		self.pushIndent()
 	
+	@base.listensTo("Progress")
+	def announceProgress(self, progress):
+		if progress.sourceDone:
+			self.lastSourceProgress = progress
+		else:
+			self.showMsg("%d rows read (%.0f rows/s)"%(
+				progress.sourceRead, progress.rowsPerSecond))
+
 	@base.listensTo("SourceFinished")
 	def announceSourceFinished(self, srcString):
 		self.popIndent()
-		self.showMsg("Done %s, read %d"%(srcString, self.dispatcher.totalRead))
+		progress = getattr(self, "lastSourceProgress", None)
+		if progress is None:
+			self.showMsg("Done %s, read %d"%(srcString, self.dispatcher.totalRead))
+		else:
+			self.showMsg("Done %s, read %d (%d rows in %.1f s, %.0f rows/s)"%(
+				srcString, self.dispatcher.totalRead, progress.sourceRead,
+				progress.sourceSeconds, progress.rowsPerSecond))
+			self.lastSourceProgress = None
 	
  	@base.listensTo("SourceError")
  	def announceSourceError(self, srcString):
@@ -79,3 +97,53 @@ class PlainUI(SemiStingyPlainUI):
 	@base.listensTo("Info")
 	def printInfo(self, message):
 		self.showMsg(message)
+
+
+class JSONProgressUI(base.ObserverBase):
+	"""An Observer writing import progress as JSON objects, one per line,
+	to stdout.
+
+	This is intended for programs driving imports.  Each object has
+	an event key (progress, newSource, sourceFinished, sourceError,
+	shipout, error, warning) and a timestamp (unix time).  Progress
+	lines have the attributes of base.events.ImportProgress.
+	"""
+	def __init__(self, eh, destF=sys.stdout):
+		self.destF = destF
+		base.ObserverBase.__init__(self, eh)
+
+	def emit(self, event, **kwargs):
+		kwargs["event"] = event
+		kwargs["timestamp"] = time.time()
+		self.destF.write(json.dumps(kwargs)+"\n")
+		self.destF.flush()
+
+	@base.listensTo("Progress")
+	def emitProgress(self, progress):
+		self.emit("progress", **progress.asDict())
+
+	@base.listensTo("NewSource")
+	def emitNewSource(self, srcString):
+		self.emit("newSource", sourceName=srcString)
+
+	@base.listensTo("SourceFinished")
+	def emitSourceFinished(self, srcString):
+		self.emit("sourceFinished", sourceName=srcString,
+			totalRead=self.dispatcher.totalRead)
+
+	@base.listensTo("SourceError")
+	def emitSourceError(self, srcString):
+		self.emit("sourceError", sourceName=srcString)
+
+	@base.listensTo("Shipout")
+	def emitShipout(self, noShipped):
+		self.emit("shipout", shipped=noShipped,
+			totalShippedOut=self.dispatcher.totalShippedOut)
+
+	@base.listensTo("Error")
+	def emitError(self, errMsg):
+		self.emit("error", message=errMsg)
+
+	@base.listensTo("Warning")
+	def emitWarning(self, message):
+		self.emit("warning", message=message)
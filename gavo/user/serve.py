@@ -32,6 +32,8 @@ from gavo import rscdesc #noflake: for cache registration
 from gavo import utils
 from gavo.base import config
 from gavo.base import cron
+from gavo.protocols import products
+from gavo.protocols import uws
 from gavo.user import plainui
 from gavo.user.common import exposedFunction, makeParser, Arg
 from gavo.web import root
@@ -253,6 +255,9 @@ def _startServer():
 		signal.signal(signal.SIGHUP, lambda sig, stack: 
 			reactor.callLater(0, _reloadConfig))
 		_preloadRDs()
+		products.PreviewCacheManager.getPool().start()
+		uws.getWorkerPool().start()
+		utils.fitsLock.maxWaiting = base.getConfig("web", "fitsQueueSize")
 		reactor.run()
 	finally:
 		PIDManager.clearPID()
@@ -32,7 +32,7 @@ class _COMMIT(object):
 	"""
 
 
-CURRENT_SCHEMAVERSION = 14
+CURRENT_SCHEMAVERSION = 16
 
 
 class AnnotatedString(str):
@@ -401,6 +401,28 @@ class To14Upgrader(Upgrader):
 			rsc.makeData(dd, forceSource=rd, connection=connection)
 
 
+class To15Upgrader(Upgrader):
+	version = 14
+
+	@classmethod
+	def u_010_addSourceFingerprints(cls, connection):
+		"""adding dc.sourcefingerprints for incremental imports"""
+		rsc.TableForDef(
+			base.caches.getRD("//dc_tables").getById("sourcefingerprints"),
+			connection=connection, create=True)
+
+
+class To16Upgrader(Upgrader):
+	version = 15
+
+	@classmethod
+	def u_010_addOAIRecords(cls, connection):
+		"""adding dc.oairecords for pre-rendered OAI-PMH records"""
+		rsc.TableForDef(
+			base.caches.getRD("//services").getById("oairecords"),
+			connection=connection, create=True)
+
+
 def iterStatements(startVersion, endVersion=CURRENT_SCHEMAVERSION, 
 		upgraders=None):
 	"""yields all upgraders from startVersion to endVersion in sequence.
@@ -43,7 +43,7 @@ from gavo.utils.excs import *
 
 from gavo.utils.fitstools import (readPrimaryHeaderQuick, pyfits,
 	parseESODescriptors, shrinkWCSHeader, cutoutFITS, iterScaledRows,
-	fitsLock)
+	fitsLock, FITSBusy)
 
 from gavo.utils.mathtricks import *
 
@@ -52,7 +52,7 @@ from gavo.utils.misctricks import (Undefined, QuotedName, getfirst,
 	rstxToHTML, rstxToHTMLWithWarning, 
 	couldBeABibcode,
 	pyparseString, pyparseTransform, parseKVLine, makeKVLine,
-	StreamBuffer, CaseSemisensitiveDict,
+	StreamBuffer, CaseSemisensitiveDict, CompactRow, getCompactRowClass,
 	NotInstalledModuleStub, grouped)
 
 from gavo.utils.ostricks import (safeclose, urlopenRemote, 
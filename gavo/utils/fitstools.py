@@ -3,7 +3,9 @@ Some utility functions to deal with FITS files.
 
 Note: pyfits is not thread-safe at least up to version 3.0.8.  We therefore
 provide the fitsLock context manager here that you should use to protect
-places where you use pyfits in a core (or a similar spot).
+places where you use pyfits in a core (or a similar spot).  DaCHS' own
+readers here (readPrimaryHeaderQuick, iterFITSRows, SeekCutout) do not
+need the lock.
 """
 
 #c Copyright 2008-2017, the GAVO project
@@ -26,6 +28,7 @@ import os
 import re
 import tempfile
 import threading
+import time
 import warnings
 from contextlib import contextmanager
 
@@ -104,15 +107,107 @@ if not hasattr(pyfits.Header, "append"):
 	pyfits.Header.append = _append
 	del _append
 
-_FITS_TABLE_LOCK = threading.RLock()
+if not hasattr(pyfits.Card, "ascardimage"):
+	def _ascardimage(self, option="silentfix"):
+		self.verify(option)
+		return self.image
+	pyfits.Card.ascardimage = _ascardimage
+	del _ascardimage
 
-@contextmanager
-def fitsLock():
-	_FITS_TABLE_LOCK.acquire()
-	try:
-		yield
-	finally:
-		_FITS_TABLE_LOCK.release()
+class FITSBusy(excs.ReportableError):
+	"""is raised by fitsLock when too many threads are already waiting
+	for it.
+	"""
+
+
+class _FITSLock(object):
+	"""The lock serialising operations using pyfits.
+
+	Call the (single) instance, fitsLock, to obtain a context manager
+	holding the lock.  Pass an operation name to have the times spent
+	waiting for and holding the lock accounted to that operation; 
+	getStats returns these figures.
+
+	If maxWaiting is not None, the lock is held by another thread, and 
+	maxWaiting threads are already queued behind that, a FITSBusy exception
+	is raised rather than letting the queue grow further.  Hence, with
+	maxWaiting=0, the lock is only granted when it is free.  A thread 
+	already holding the lock can always re-acquire it; this is not 
+	accounted for.
+	"""
+	maxWaiting = None
+
+	def __init__(self):
+		self.lock = threading.RLock()
+		self.owner = None
+		self.waiting = 0
+		self.stats = {}
+		self.statsLock = threading.Lock()
+
+	def _getStatsFor(self, opName):
+		# call with statsLock held
+		if opName not in self.stats:
+			self.stats[opName] = {"count": 0, "rejected": 0,
+				"waitSeconds": 0., "maxWaitSeconds": 0.,
+				"holdSeconds": 0., "maxHoldSeconds": 0.}
+		return self.stats[opName]
+
+	@contextmanager
+	def __call__(self, opName="other"):
+		me = threading.current_thread()
+		if self.owner is me:
+			yield
+			return
+
+		startWait = time.time()
+		with self.statsLock:
+			gotLock = self.lock.acquire(False)
+			if not gotLock:
+				if self.maxWaiting is not None and self.waiting>=self.maxWaiting:
+					self._getStatsFor(opName)["rejected"] += 1
+					raise FITSBusy("Too many FITS operations are pending.",
+						hint="Please try again later.")
+				self.waiting += 1
+
+		if not gotLock:
+			try:
+				self.lock.acquire()
+			finally:
+				with self.statsLock:
+					self.waiting -= 1
+		self.owner = me
+		startHold = time.time()
+
+		try:
+			yield
+		finally:
+			endHold = time.time()
+			self.owner = None
+			self.lock.release()
+
+			with self.statsLock:
+				stats = self._getStatsFor(opName)
+				stats["count"] += 1
+				stats["waitSeconds"] += startHold-startWait
+				stats["maxWaitSeconds"] = max(
+					stats["maxWaitSeconds"], startHold-startWait)
+				stats["holdSeconds"] += endHold-startHold
+				stats["maxHoldSeconds"] = max(
+					stats["maxHoldSeconds"], endHold-startHold)
+
+	def getStats(self):
+		"""returns a dictionary mapping operation names to dictionaries of
+		their statistics.
+
+		These are count, rejected, waitSeconds, maxWaitSeconds, holdSeconds,
+		and maxHoldSeconds.
+		"""
+		with self.statsLock:
+			return dict((opName, stats.copy()) 
+				for opName, stats in self.stats.iteritems())
+
+
+fitsLock = _FITSLock()
 
 
 CARD_SIZE = 80
@@ -554,6 +649,43 @@ def getAxisLengths(hdr):
 	return [hdr["NAXIS%d"%i] for i in range(1, hdr["NAXIS"]+1)]
 
 
+def _computeCutout(hdr, cuts):
+	"""returns a pair of a new header and pixel ranges for cutting out cuts
+	from the image described by hdr.
+
+	cuts is as for cutoutFITS.  The ranges are (start, stop) pairs of 
+	0-based pixel indices, one per axis in FITS order, where stop is
+	exclusive (i.e., as for python slices).
+	"""
+	cutDict = dict((c[0], c[1:]) for c in cuts)
+	ranges = []
+	newHeader = hdr.copy()
+
+	for index, length in enumerate(getAxisLengths(hdr)):
+		firstPix, lastPix = cutDict.get(index+1, (None, None))
+
+		if firstPix is None:
+			firstPix = 1
+		if lastPix is None:
+			lastPix = length
+		firstPix = min(max(1, firstPix), length)
+		lastPix = min(length, max(1, lastPix))
+
+		if (firstPix, lastPix)==(1, length):
+			ranges.append((0, length))
+		else:
+			firstPix, lastPix = int(firstPix-1), int(lastPix)
+			if lastPix<=firstPix:
+				lastPix = firstPix+1
+			ranges.append((firstPix, lastPix))
+
+			newHeader["NAXIS%d"%(index+1)] = lastPix-firstPix
+			refpixKey = "CRPIX%d"%(index+1)
+			newHeader[refpixKey] = newHeader[refpixKey]-firstPix
+
+	return newHeader, ranges
+
+
 def cutoutFITS(hdu, *cuts):
 	"""returns a cutout of hdu restricted to cuts.
 
@@ -577,39 +709,154 @@ def cutoutFITS(hdu, *cuts):
 
 	Note that this will lose all extensions the orginal FITS file might have
 	had.
+
+	This needs hdu's data in memory (or mapped); for plain FITS files on
+	disk, SeekCutout is much cheaper.
 	"""
-	cutDict = dict((c[0], c[1:]) for c in cuts)
-	slices = []
-	newHeader = hdu.header.copy()
+	newHeader, ranges = _computeCutout(hdu.header, cuts)
+	slices = [slice(start, stop, 1) for start, stop in reversed(ranges)]
+	newHDU = pyfits.PrimaryHDU(data=hdu.data[tuple(slices)].copy(order='C'),
+		header=newHeader)
+	return newHDU
 
-	for index, length in enumerate(getAxisLengths(hdu.header)):
-		firstPix, lastPix = cutDict.get(index+1, (None, None))
 
-		if firstPix is None:
-			firstPix = 1
-		if lastPix is None:
-			lastPix = length
-		firstPix = min(max(1, firstPix), length)
-		lastPix = min(length, max(1, lastPix))
+def canSeekCutout(hdr):
+	"""returns True if the image described by the primary header hdr
+	can be cut out by SeekCutout.
 
-		if (firstPix, lastPix)==(1, length):
-			slices.append(slice(None, None, None))
-		else:
-			firstPix -= 1
-			newAxisLength = lastPix-firstPix
-			if newAxisLength==0:
-				newAxisLength = 1
-				lastPix = firstPix+1
-			slices.append(slice(int(firstPix), int(lastPix), 1))
+	This is false for, e.g., compressed images, random groups, or empty
+	primary HDUs.
+	"""
+	return (hdr.get("NAXIS", 0)>0
+		and hdr.get("BITPIX") in NUM_CODE
+		and not hdr.get("GROUPS", False)
+		and 0 not in getAxisLengths(hdr))
+
+
+class SeekCutout(object):
+	"""A cutout from the primary image of a plain (uncompressed, ungzipped)
+	FITS file that only reads the pixels actually needed.
+
+	The byte ranges making up the cutout are computed from the header 
+	(BITPIX and NAXISn), and they are read using seeks; hence, cutouts
+	from large images are about as fast as the cutout is small, and
+	no pyfits data access (hence, no fitsLock) is required.
+
+	Construct with the path of the file; check with isSupported whether
+	this kind of cutout is possible.  Then call cutout with cut specs as
+	for cutoutFITS, possibly repeatedly; cuts always refer to the pixels
+	of the current cutout.  header contains the header for the current
+	cutout.
+
+	Use iterData to stream out the FITS file for the cutout, or getHDU
+	to obtain an in-memory pyfits HDU for it.  Like for cutoutFITS,
+	extensions are lost, and BSCALE/BZERO are left alone.
+	"""
+	def __init__(self, fName):
+		self.fName = fName
+		with open(self.fName, "rb") as f:
+			self.origHeader = readPrimaryHeaderQuick(f)
+			self.dataStart = f.tell()
+		self.header = self.origHeader
+		if self.isSupported():
+			self.ranges = [(0, length) 
+				for length in getAxisLengths(self.origHeader)]
+
+	def isSupported(self):
+		return canSeekCutout(self.origHeader)
+
+	def cutout(self, *cuts):
+		"""restricts the current cutout by cuts (as for cutoutFITS).
+
+		This returns the instance itself for convenience.
+		"""
+		if not self.isSupported():
+			raise FITSError("%s cannot be cut out by seeking"%self.fName)
+		self.header, ranges = _computeCutout(self.header, cuts)
+		self.ranges = [(curStart+start, curStart+stop)
+			for (curStart, _), (start, stop) in zip(self.ranges, ranges)]
+		return self
+
+	def getDataSize(self):
+		"""returns the number of bytes in the cutout's data (without padding).
+		"""
+		return abs(self.header["BITPIX"])//8*reduce(lambda a, b: a*b,
+			[stop-start for start, stop in self.ranges])
 
-			newHeader["NAXIS%d"%(index+1)] = newAxisLength
-			refpixKey = "CRPIX%d"%(index+1)
-			newHeader.update(refpixKey, newHeader[refpixKey]-firstPix)
+	def _iterRuns(self):
+		"""iterates over (offset, length) pairs of the byte ranges in
+		the source data making up the cutout, in the sequence they
+		appear in the result.
 
-	slices.reverse()
-	newHDU = pyfits.PrimaryHDU(data=hdu.data[tuple(slices)].copy(order='C'),
-		header=newHeader)
-	return newHDU
+		Runs along the fastest-varying axes are merged where they are 
+		contiguous in the source.
+		"""
+		lengths = getAxisLengths(self.origHeader)
+		strides, stride = [], abs(self.origHeader["BITPIX"])//8
+		for length in lengths:
+			strides.append(stride)
+			stride *= length
+
+		runAxis = 0
+		while (runAxis<len(lengths)-1 
+				and self.ranges[runAxis]==(0, lengths[runAxis])):
+			runAxis += 1
+		start, stop = self.ranges[runAxis]
+		runOffset = start*strides[runAxis]
+		runLength = (stop-start)*strides[runAxis]
+
+		# the first axis after the run varies fastest, so we need to
+		# iterate over the reversed outer axes.
+		outerStrides = list(reversed(strides[runAxis+1:]))
+		for indices in itertools.product(*[xrange(*r) 
+				for r in reversed(self.ranges[runAxis+1:])]):
+			yield runOffset+sum(
+				index*stride for index, stride in zip(indices, outerStrides)
+				), runLength
+
+	def iterDataBytes(self, chunkSize=1000000):
+		"""iterates over strings of about chunkSize bytes containing the
+		(unpadded) pixel data of the cutout.
+		"""
+		parts, curSize = [], 0
+		with open(self.fName, "rb") as f:
+			for offset, length in self._iterRuns():
+				f.seek(self.dataStart+offset)
+				while length:
+					toRead = min(length, chunkSize)
+					data = f.read(toRead)
+					if len(data)!=toRead:
+						raise FITSError("Premature end of data in %s"%self.fName)
+					parts.append(data)
+					curSize += toRead
+					length -= toRead
+
+					if curSize>=chunkSize:
+						yield "".join(parts)
+						parts, curSize = [], 0
+		if parts:
+			yield "".join(parts)
+
+	def iterData(self, chunkSize=1000000):
+		"""iterates over strings making up a FITS file containing the
+		cutout.
+		"""
+		yield serializeHeader(self.header)
+		for chunk in self.iterDataBytes(chunkSize):
+			yield chunk
+		dataSize = self.getDataSize()
+		if dataSize%FITS_BLOCK_SIZE:
+			yield "\0"*(FITS_BLOCK_SIZE-dataSize%FITS_BLOCK_SIZE)
+
+	def getHDU(self):
+		"""returns a pyfits primary HDU for the cutout.
+		"""
+		data = numpy.fromstring("".join(self.iterDataBytes()),
+			dtype=NUM_CODE[self.header["BITPIX"]])
+		return pyfits.PrimaryHDU(
+			data=data.reshape(
+				[stop-start for start, stop in reversed(self.ranges)]),
+			header=self.header)
 
 
 def shrinkWCSHeader(oldHeader, factor):
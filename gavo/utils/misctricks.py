@@ -614,6 +614,79 @@ class CaseSemisensitiveDict(dict):
 		return self._normCasedCache
 
 
+class CompactRow(tuple):
+	"""A tuple that also gives read-only, dict-like access to its items by
+	field name.
+
+	These are used as table rows where dicts would be too expensive,
+	in particular for rows fresh from the database that are just 
+	serialised.  Don't instanciate this class itself; get a class for
+	a sequence of field names from getCompactRowClass and call that with
+	the values.
+
+	Iteration and len are those of the tuple; use asDict if you need 
+	to change the row or hand it to code expecting real dictionaries.
+
+	>>> row = getCompactRowClass(["a", "b"])((1, "x"))
+	>>> row["b"], row[0], row.get("c", 3), "a" in row, "x" in row
+	('x', 1, 3, True, False)
+	>>> sorted(row.asDict().items()), tuple(row)
+	([('a', 1), ('b', 'x')], (1, 'x'))
+	>>> row["c"]
+	Traceback (most recent call last):
+	KeyError: 'c'
+	"""
+	__slots__ = ()
+	fieldNames = ()
+	fieldIndex = {}
+
+	def __getitem__(self, key):
+		try:
+			key = self.fieldIndex[key]
+		except (KeyError, TypeError):
+			if isinstance(key, basestring):
+				raise KeyError(key)
+		return tuple.__getitem__(self, key)
+
+	def __contains__(self, key):
+		return key in self.fieldIndex
+
+	def get(self, key, default=None):
+		if key in self.fieldIndex:
+			return tuple.__getitem__(self, self.fieldIndex[key])
+		return default
+
+	def keys(self):
+		return list(self.fieldNames)
+
+	def iteritems(self):
+		return itertools.izip(self.fieldNames, tuple.__iter__(self))
+
+	def asDict(self):
+		"""returns a new dictionary with the content of this row.
+		"""
+		return dict(self.iteritems())
+
+	copy = asDict
+
+
+def getCompactRowClass(fieldNames):
+	"""returns a CompactRow subclass for rows with fieldNames (a sequence
+	of strings).
+
+	Each call creates a new class; since field names can come from
+	user queries, keep the classes with whatever they describe
+	(as rscdef.TableDef.getCompactRowClass does) rather than in some
+	global registry.
+	"""
+	fieldNames = tuple(fieldNames)
+	return type("CompactRow", (CompactRow,), {
+		"__slots__": (),
+		"fieldNames": fieldNames,
+		"fieldIndex": dict((name, index) 
+			for index, name in enumerate(fieldNames))})
+
+
 ####################### Pyparsing hacks
 # This may not be the best place to put this, but I don't really have a
 # better one at this point.  We need some configuration of pyparsing, and
@@ -0,0 +1,271 @@
+"""
+Serialisation of rows into postgres COPY streams.
+
+This is used by the COPY-based feeders in rsc.dbtable; the point is that
+shipping a batch of rows as one COPY stream is much faster than having
+psycopg2 run an INSERT per row via executemany.
+
+There are two formats: text (which works for basically anything that
+has a postgres literal, including pgsphere values and arrays) and binary
+(which is faster still but only supports a couple of simple types).
+
+All functions here work on sequences of row tuples; the columns are
+described by their SQL types as in DaCHS column definitions.
+"""
+
+#c Copyright 2008-2017, the GAVO project
+#c
+#c This program is free software, covered by the GNU GPL.  See the
+#c COPYING file in the source distribution.
+
+
+import datetime
+import re
+import struct
+from cStringIO import StringIO
+
+from gavo.utils import excs
+
+
+############### text format
+
+_COPY_ESCAPES = {
+	"\\": "\\\\",
+	"\n": "\\n",
+	"\r": "\\r",
+	"\t": "\\t",
+}
+_COPY_SPECIALS = re.compile(r"[\\\n\r\t]")
+_ARRAY_SPECIALS = re.compile(r'[\\"]')
+_PGSPHERE_LITERAL = re.compile(r"^\w+\s+'(.*)'$")
+
+
+def escapeCopyText(s):
+	r"""returns s with the characters special in COPY text format escaped.
+
+	>>> escapeCopyText("a\tb\\c\nd")
+	'a\\tb\\\\c\\nd'
+	"""
+	return _COPY_SPECIALS.sub(lambda mat: _COPY_ESCAPES[mat.group()], s)
+
+
+def _formatFloat(val):
+	if val!=val:
+		return "NaN"
+	elif val==float("Inf"):
+		return "Infinity"
+	elif val==float("-Inf"):
+		return "-Infinity"
+	return repr(float(val))
+
+
+def _formatString(val):
+	if isinstance(val, unicode):
+		val = val.encode("utf-8")
+	return val
+
+
+def _formatArray(val):
+	"""returns a postgres array literal for the sequence val.
+	"""
+	parts = []
+	for item in val:
+		if item is None:
+			parts.append("NULL")
+		elif isinstance(item, basestring):
+			parts.append('"%s"'%_ARRAY_SPECIALS.sub(
+				lambda mat: "\\"+mat.group(), _formatString(item)))
+		else:
+			parts.append(formatCopyValue(item))
+	return "{%s}"%",".join(parts)
+
+
+def formatCopyValue(val):
+	r"""returns a postgres literal for the python value val.
+
+	The literal is not escaped for COPY yet, and None is not handled;
+	formatCopyRow takes care of both.
+
+	>>> formatCopyValue(True), formatCopyValue(3), formatCopyValue(2.5)
+	('t', '3', '2.5')
+	>>> formatCopyValue(float("NaN")), formatCopyValue(u"\xe4")
+	('NaN', '\xc3\xa4')
+	>>> formatCopyValue((1, None, 3.5)), formatCopyValue(["a", 'b"c'])
+	('{1,NULL,3.5}', '{"a","b\\"c"}')
+	>>> formatCopyValue(datetime.datetime(2016, 1, 3, 12, 30))
+	'2016-01-03T12:30:00'
+	>>> from gavo.utils import pgsphere
+	>>> formatCopyValue(pgsphere.SPoint(0.5, 0.25))
+	'(0.5000000000,0.2500000000)'
+	"""
+	if isinstance(val, bool):
+		return "t" if val else "f"
+	elif isinstance(val, (int, long)):
+		return str(val)
+	elif isinstance(val, float):
+		return _formatFloat(val)
+	elif isinstance(val, basestring):
+		return _formatString(val)
+	elif isinstance(val, (datetime.datetime, datetime.date, datetime.time)):
+		return val.isoformat()
+	elif hasattr(val, "asPgSphere"):
+		return _PGSPHERE_LITERAL.match(val.asPgSphere()).group(1)
+	elif isinstance(val, (list, tuple, set, frozenset)) or hasattr(
+			val, "tolist"):
+		if hasattr(val, "tolist"):
+			val = val.tolist()
+			if not isinstance(val, list):  # numpy scalar
+				return formatCopyValue(val)
+		return _formatArray(val)
+	elif hasattr(val, "__float__") and not hasattr(val, "__index__"):
+		return _formatFloat(float(val))
+	elif hasattr(val, "__index__"):
+		return str(val.__index__())
+	return str(val)
+
+
+def formatCopyRow(row):
+	r"""returns a line of a COPY text stream for the python tuple row.
+
+	>>> formatCopyRow((1, None, "x\ty", u"z"))
+	'1\t\\N\tx\\ty\tz\n'
+	"""
+	return "\t".join(
+		r"\N" if val is None else escapeCopyText(formatCopyValue(val))
+		for val in row)+"\n"
+
+
+def makeTextCopyStream(rows):
+	r"""returns a file-like object containing a COPY stream in text format
+	for the sequence of tuples rows.
+
+	>>> makeTextCopyStream([(1, 2.5), (None, 3.)]).read()
+	'1\t2.5\n\\N\t3.0\n'
+	"""
+	return StringIO("".join(formatCopyRow(row) for row in rows))
+
+
+############### binary format
+
+_BINARY_HEADER = "PGCOPY\n\377\r\n\0"+struct.pack("!ii", 0, 0)
+_BINARY_TRAILER = struct.pack("!h", -1)
+_NULL_FIELD = struct.pack("!i", -1)
+_PG_EPOCH = datetime.datetime(2000, 1, 1)
+_PG_EPOCH_DATE = _PG_EPOCH.date()
+
+
+def _makeStructEncoder(fmt, preprocess=None):
+	packer = struct.Struct("!i"+fmt)
+	size = packer.size-4
+	if preprocess is None:
+		return lambda val: packer.pack(size, val)
+	else:
+		return lambda val: packer.pack(size, preprocess(val))
+
+
+def _encodeText(val):
+	if isinstance(val, unicode):
+		val = val.encode("utf-8")
+	else:
+		val = str(val)
+	return struct.pack("!i", len(val))+val
+
+
+def _timestampToMicroseconds(val):
+	delta = val-_PG_EPOCH
+	return (delta.days*86400+delta.seconds)*1000000+delta.microseconds
+
+
+def _dateToDays(val):
+	if isinstance(val, datetime.datetime):
+		val = val.date()
+	return (val-_PG_EPOCH_DATE).days
+
+
+_BINARY_ENCODERS = {
+	"smallint": _makeStructEncoder("h", int),
+	"integer": _makeStructEncoder("i", int),
+	"bigint": _makeStructEncoder("q", long),
+	"real": _makeStructEncoder("f", float),
+	"double precision": _makeStructEncoder("d", float),
+	"boolean": _makeStructEncoder("B", bool),
+	"text": _encodeText,
+	"unicode": _encodeText,
+	"char": _encodeText,
+	"bytea": _encodeText,
+	"timestamp": _makeStructEncoder("q", _timestampToMicroseconds),
+	"date": _makeStructEncoder("i", _dateToDays),
+}
+
+
+def getBinaryEncoder(sqlType):
+	"""returns a function turning python values into binary COPY fields
+	for sqlType.
+
+	This raises a DataError for types we do not know how to write in
+	postgres' binary format (use text COPY for those).
+
+	>>> getBinaryEncoder("integer")(1)
+	'\\x00\\x00\\x00\\x04\\x00\\x00\\x00\\x01'
+	>>> getBinaryEncoder("char(4)")(u"ab")
+	'\\x00\\x00\\x00\\x02ab'
+	>>> getBinaryEncoder("spoint")
+	Traceback (most recent call last):
+	DataError: No binary COPY support for type spoint
+	"""
+	baseType = re.sub(r"\s*\(.*\)$", "", sqlType.strip().lower())
+	if baseType.startswith("character varying") or baseType=="varchar":
+		baseType = "text"
+	try:
+		return _BINARY_ENCODERS[baseType]
+	except KeyError:
+		raise excs.DataError("No binary COPY support for type %s"%sqlType,
+			hint="Use text COPY (or plain INSERTs) for tables with such columns.")
+
+
+def makeBinaryRowEncoder(sqlTypes):
+	"""returns a function turning a row tuple into a binary COPY tuple
+	for columns of sqlTypes.
+
+	>>> enc = makeBinaryRowEncoder(["smallint", "double precision"])
+	>>> enc((1, None))
+	'\\x00\\x02\\x00\\x00\\x00\\x02\\x00\\x01\\xff\\xff\\xff\\xff'
+	"""
+	encoders = [getBinaryEncoder(t) for t in sqlTypes]
+	fieldCount = struct.pack("!h", len(encoders))
+	indexedEncoders = list(enumerate(encoders))
+
+	def encodeRow(row):
+		parts = [fieldCount]
+		for index, encode in indexedEncoders:
+			val = row[index]
+			if val is None:
+				parts.append(_NULL_FIELD)
+			else:
+				parts.append(encode(val))
+		return "".join(parts)
+
+	return encodeRow
+
+
+def makeBinaryStreamMaker(sqlTypes):
+	"""returns a function turning a sequence of row tuples into a file-like
+	object containing a binary COPY stream.
+	"""
+	encodeRow = makeBinaryRowEncoder(sqlTypes)
+
+	def makeStream(rows):
+		return StringIO(_BINARY_HEADER
+			+"".join(encodeRow(row) for row in rows)
+			+_BINARY_TRAILER)
+
+	return makeStream
+
+
+def _test():
+	import doctest, pgcopy
+	doctest.testmod(pgcopy)
+
+
+if __name__=="__main__":
+	_test()
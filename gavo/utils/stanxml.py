@@ -576,11 +576,130 @@ def escapeAttrVal(val):
 	return '"%s"'%(escapePCDATA(val).replace('"', '&quot;').encode("utf-8"))
 
 
-def _makeVisitor(outputFile, prefixForEmpty):
-	"""returns a function writing nodes to outputFile.
+class _TagTemplate(object):
+	"""a pre-computed serialization recipe for elements of one class.
+
+	These are created and cached by _Serializer.
 	"""
-	
-	def visit(node, text, attrs, childIter):
+	def __init__(self, node, prefixForEmpty):
+		if not node._prefix or node._local or node._prefix==prefixForEmpty:
+			self.name = node.name_
+		else:
+			self.name = "%s:%s"%(node._prefix, node.name_)
+		self.openStart = "<"+self.name
+		self.close = "</%s>"%self.name
+
+		# addAttribute may add the same attribute to a class more than once,
+		# so we go through a dict (as _makeAttrDict does).  Since "=" cannot
+		# occur in names, sorting on " name=" yields the sequence of sorted
+		# "name=value" strings.
+		attrNames = dict(
+			(xmlName, name) for name, xmlName in node.iterAttNames())
+		self.attrs = sorted(
+			((name, " %s="%xmlName) for xmlName, name in attrNames.iteritems()),
+			key=lambda pair: pair[1])
+
+
+def _hasPlainApply(node, _cache={}):
+	"""returns true if node is an Element not overriding Element.apply.
+
+	Such elements can be serialized without going through apply.
+	"""
+	try:
+		return _cache[node.__class__]
+	except KeyError:
+		_cache[node.__class__] = (isinstance(node, Element)
+			and getattr(node.__class__.apply, "im_func", None
+				) is Element.apply.im_func)
+		return _cache[node.__class__]
+
+
+class _Serializer(object):
+	"""A writer for stanxml trees.
+
+	This produces the same output as a traversal through Element.apply,
+	except that elements not overriding apply are serialized using
+	_TagTemplates cached by class, element name, number of attributes
+	(addAttribute may add attributes to a class), and prefixForEmpty, and
+	that output is collected in a list and written to outputFile in chunks.
+
+	Elements overriding apply are serialized through apply with the visit
+	method as callback; elements with a write method get to write into
+	outputFile themselves.
+	"""
+	# number of string fragments buffered before writing
+	chunkLength = 4000
+
+	_templates = {}
+
+	def __init__(self, outputFile, prefixForEmpty):
+		self.outputFile, self.prefixForEmpty = outputFile, prefixForEmpty
+		self.buffer = []
+
+	def flush(self):
+		if self.buffer:
+			self.outputFile.write("".join(self.buffer))
+			del self.buffer[:]
+
+	def _getTemplate(self, node):
+		key = (node.__class__, node.name_, len(node._nodeAttrs), 
+			self.prefixForEmpty)
+		try:
+			return self._templates[key]
+		except KeyError:
+			self._templates[key] = _TagTemplate(node, self.prefixForEmpty)
+			return self._templates[key]
+
+	def collectPrefixes(self, root, prefixesUsed):
+		"""adds the namespace prefixes used in the tree below root to the
+		set prefixesUsed.
+		"""
+		toDo = [root]
+
+		def collect(node, text, attrs, childIter):
+			prefixesUsed.update(node._additionalPrefixes)
+			prefixesUsed.add(node._prefix)
+			toDo.extend(childIter)
+
+		while toDo:
+			node = toDo.pop()
+			if _hasPlainApply(node):
+				if not node.shouldBeSkipped():
+					collect(node, None, None, node._getChildIter())
+			else:
+				node.apply(collect)
+
+	def _writeChildren(self, childIter):
+		for c in childIter:
+			if hasattr(c, "write"):
+				self.flush()
+				c.write(self.outputFile)
+			elif _hasPlainApply(c):
+				self.writeNode(c)
+			else:
+				c.apply(self.visit)
+
+	def _writeContent(self, node, close, text, childIter):
+		try:
+			try:
+				if text:
+					self.buffer.append(escapePCDATA(text).encode("utf-8"))
+				self._writeChildren(childIter)
+			except Exception, ex:
+				if hasattr(node, "writeErrorElement"):
+					self.flush()
+					node.writeErrorElement(self.outputFile, ex)
+				raise
+		finally:
+			self.buffer.append(close)
+			if len(self.buffer)>self.chunkLength:
+				self.flush()
+
+	def visit(self, node, text, attrs, childIter):
+		"""writes node to the output.
+
+		This has the signature required by Element.apply.
+		"""
 		attrRepr = " ".join(sorted("%s=%s"%(k, escapeAttrVal(attrs[k]))
 			for k in attrs))
 		if attrRepr:
@@ -589,34 +708,67 @@ def _makeVisitor(outputFile, prefixForEmpty):
 		if getattr(node, "_fixedTagMaterial", None):
 			attrRepr = attrRepr+" "+node._fixedTagMaterial
 
-		if not node._prefix or node._local or node._prefix==prefixForEmpty:
+		if (not node._prefix or node._local 
+				or node._prefix==self.prefixForEmpty):
 			name = node.name_
 		else:
 			name = "%s:%s"%(node._prefix, node.name_)
 
 		if node.isEmpty():
 			if node._mayBeEmpty:
-				outputFile.write("<%s%s/>"%(name, attrRepr))
+				self.buffer.append("<%s%s/>"%(name, attrRepr))
 		else:
-			outputFile.write("<%s%s>"%(name, attrRepr))
-			try:
-				try:
-					if text:
-						outputFile.write(escapePCDATA(text).encode("utf-8"))
+			self.buffer.append("<%s%s>"%(name, attrRepr))
+			self._writeContent(node, "</%s>"%name, text, childIter)
 
-					for c in childIter:
-						if hasattr(c, "write"):
-							c.write(outputFile)
-						else:
-							c.apply(visit)
-				except Exception, ex:
-					if hasattr(node, "writeErrorElement"):
-						node.writeErrorElement(outputFile, ex)
-					raise
-			finally:
-				outputFile.write("</%s>"%name)
+	def writeNode(self, node):
+		"""writes node and its children to the output.
 
-	return visit
+		node must be an element with a plain apply method (which it would
+		be bypassing).
+		"""
+		try:
+			if node.shouldBeSkipped():
+				return
+
+			template = self._getTemplate(node)
+			append = self.buffer.append
+			append(template.openStart)
+			for name, attrStart in template.attrs:
+				val = getattr(node, name, None)
+				if val is not None:
+					append(attrStart)
+					append(escapeAttrVal(unicode(val)))
+			if getattr(node, "_fixedTagMaterial", None):
+				append(" "+node._fixedTagMaterial)
+
+			if node.isEmpty():
+				append("/>")
+			else:
+				append(">")
+				self._writeContent(node, template.close, node.text_, 
+					node._getChildIter())
+
+		except Error:
+			raise
+		except Exception:
+			misctricks.sendUIEvent("Info",
+				"Internal failure while building XML; context is"
+				" %s node with children %s"%(
+					node.name_, 
+					texttricks.makeEllipsis(repr(node._children), 60)))
+			raise
+
+	def writeTree(self, root):
+		"""writes root and its children to the output and flushes the buffer.
+		"""
+		try:
+			if _hasPlainApply(root):
+				self.writeNode(root)
+			else:
+				root.apply(self.visit)
+		finally:
+			self.flush()
 
 
 def write(root, outputFile, prefixForEmpty=None, nsRegistry=NSRegistry,
@@ -625,18 +777,11 @@ def write(root, outputFile, prefixForEmpty=None, nsRegistry=NSRegistry,
 
 	prefixForEmpty is a namespace URI that should have no prefix at all.
 	"""
+	serializer = _Serializer(outputFile, prefixForEmpty)
 	# since namespaces only enter here through prefixes, I just need to
 	# figure out which ones are used.
 	prefixesUsed = set()
-
-	def collectPrefixes(node, text, attrs, childIter, 
-			prefixesUsed=prefixesUsed):
-		prefixesUsed |= node._additionalPrefixes
-		prefixesUsed.add(node._prefix)
-		for child in childIter:
-			child.apply(collectPrefixes)
-
-	root.apply(collectPrefixes)
+	serializer.collectPrefixes(root, prefixesUsed)
 	# An incredibly nasty hack for VOTable generation; we need a better
 	# way to handle with the 1.1/1.2 namespaces: Root may declare it
 	# handles all NS declarations itself.  Die, die, die.
@@ -647,7 +792,7 @@ def write(root, outputFile, prefixForEmpty=None, nsRegistry=NSRegistry,
 	if xmlDecl:
 		outputFile.write("<?xml version='1.0' encoding='utf-8'?>\n")
 
-	root.apply(_makeVisitor(outputFile, prefixForEmpty))
+	serializer.writeTree(root)
 
 
 def xmlrender(tree, prolog=None, prefixForEmpty=None):
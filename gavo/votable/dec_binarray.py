@@ -0,0 +1,232 @@
+"""
+Vectorized decoding of BINARY and BINARY2 streams into numpy arrays.
+
+The row decoders in dec_binary and dec_binary2 unpack field by field and
+hence are slow for large tables.  For tables in which all fields have a
+fixed width, we can instead compute a numpy dtype for a record and let
+numpy.frombuffer decode large chunks of the stream in one go.
+
+NULL handling (NaNs in floats, VALUES/@null, BINARY2 null flags, "?"
+booleans) is done through the masks of numpy masked arrays.
+
+This needs numpy, which is an optional dependency of the VOTable library;
+hence, nothing in the library imports this module at load time.
+"""
+
+#c Copyright 2008-2017, the GAVO project
+#c
+#c This program is free software, covered by the GNU GPL.  See the
+#c COPYING file in the source distribution.
+
+
+import numpy
+
+from gavo.votable import coding
+from gavo.votable import common
+from gavo.votable.model import VOTable
+
+
+# map from VOTable datatypes to (big-endian) numpy type codes for the
+# numeric types.
+_numericTypes = {
+	"unsignedByte": ">u1",
+	"short": ">i2",
+	"int": ">i4",
+	"long": ">i8",
+	"float": ">f4",
+	"double": ">f8",
+	"floatComplex": ">c8",
+	"doubleComplex": ">c16",
+}
+
+_TRUE_LITERALS = ["T", "t", "1"]
+_FALSE_LITERALS = ["F", "f", "0"]
+
+NULLFLAGS_NAME = "__nullflags"
+
+
+def getFieldNames(tableDefinition):
+	"""returns unique, numpy-compatible names for the fields of
+	tableDefinition.
+
+	This uses the same rules as simple.makeDtype.
+	"""
+	names, seen = [], set()
+	for field in tableDefinition.iterChildrenOfType(VOTable.FIELD):
+		name = field.getDesignation()
+		while name in seen:
+			name = name+"_"
+		seen.add(name)
+		names.append(name)
+	return names
+
+
+def _getWireType(field):
+	"""returns a numpy type spec (without a name) for field as serialized
+	in BINARY.
+
+	This raises a VOTableError for fields that have no fixed width or that
+	cannot be decoded by numpy.
+	"""
+	if field.hasVarLength():
+		raise common.VOTableError("Field %s has a variable length"%
+			field.getDesignation())
+	length = field.getLength()
+
+	if field.datatype=="char":
+		return ("S%d"%length,)
+	elif field.datatype=="boolean":
+		typeCode = "S1"
+	elif field.datatype in _numericTypes:
+		typeCode = _numericTypes[field.datatype]
+	else:
+		raise common.VOTableError("No vectorized decoding for %s"%
+			field.datatype)
+
+	if field.isScalar():
+		return (typeCode,)
+	else:
+		return (typeCode, (length,))
+
+
+def getWireDtype(tableDefinition, withNullFlags=False):
+	"""returns a numpy dtype for a record of a BINARY stream for
+	tableDefinition.
+
+	With withNullFlags, a leading field for the BINARY2 null flags is
+	included (called NULLFLAGS_NAME).
+
+	This raises a VOTableError if the table cannot be decoded vectorized.
+	"""
+	fields = tableDefinition.getFields()
+	spec = []
+	if withNullFlags:
+		spec.append((NULLFLAGS_NAME, "u1", 
+			(common.NULLFlags(len(fields)).nBytes,)))
+	for name, field in zip(getFieldNames(tableDefinition), fields):
+		spec.append((name,)+_getWireType(field))
+	return numpy.dtype(spec)
+
+
+def canDecode(tableDefinition):
+	"""returns True if the rows of tableDefinition can be decoded into
+	arrays by this module.
+	"""
+	try:
+		getWireDtype(tableDefinition)
+	except common.VOTableError:
+		return False
+	return True
+
+
+def _getResultType(field, wireType):
+	"""returns the numpy type of field in decoded arrays.
+
+	That is, native byte order, and booleans as numpy booleans.
+	"""
+	baseType, shape = wireType.base, wireType.shape
+	if field.datatype=="boolean":
+		baseType = numpy.dtype(bool)
+	elif baseType.kind in "iufc":
+		baseType = baseType.newbyteorder("=")
+	return (baseType, shape)
+
+
+def _decodeBooleans(raw):
+	"""returns a pair of values and mask arrays for an array of boolean
+	literals.
+	"""
+	isTrue = numpy.zeros(raw.shape, dtype=bool)
+	for lit in _TRUE_LITERALS:
+		isTrue |= raw==lit
+	isFalse = numpy.zeros(raw.shape, dtype=bool)
+	for lit in _FALSE_LITERALS:
+		isFalse |= raw==lit
+	return isTrue, ~(isTrue|isFalse)
+
+
+def _getNullMask(field, values):
+	"""returns a boolean array of the shape of values that is true
+	where values is NULL according to field's VALUES or to NaN-ness.
+	"""
+	if values.dtype.kind in "fc":
+		return numpy.isnan(values)
+
+	nullvalue = coding.getNullvalue(field, str)
+	if nullvalue is None:
+		return numpy.zeros(values.shape, dtype=bool)
+	if values.dtype.kind=="S":
+		return values==nullvalue.encode("utf-8")
+	return values==int(nullvalue)
+
+
+def _expandRowMask(rowMask, shape):
+	"""returns rowMask (one boolean per record) broadcast to values
+	of shape.
+	"""
+	if not shape:
+		return rowMask
+	return numpy.repeat(rowMask, numpy.prod(shape)
+		).reshape((len(rowMask),)+shape)
+
+
+class ArrayDecoder(object):
+	"""A decoder for BINARY or BINARY2 data into numpy masked record arrays.
+
+	Construct it with a VOTable.TABLE instance and, for BINARY2, 
+	withNullFlags=True.  Use decodeChunk on strings containing complete
+	records.
+
+	This raises a VOTableError on construction if the table cannot be 
+	decoded vectorized.
+	"""
+	def __init__(self, tableDefinition, withNullFlags=False):
+		self.withNullFlags = withNullFlags
+		self.wireDtype = getWireDtype(tableDefinition, withNullFlags)
+		self.recordSize = self.wireDtype.itemsize
+		self.fields = zip(
+			getFieldNames(tableDefinition), tableDefinition.getFields())
+		self.dtype = numpy.dtype([(name,)+_getResultType(
+				field, self.wireDtype.fields[name][0])
+			for name, field in self.fields])
+		self.maskDtype = numpy.ma.make_mask_descr(self.dtype)
+
+	def decodeChunk(self, raw):
+		"""returns a numpy masked record array for the binary string raw.
+		"""
+		if len(raw)%self.recordSize:
+			raise common.BadVOTableLiteral("BINARY record", raw[-20:],
+				hint="The stream ended within a record.")
+		wire = numpy.frombuffer(raw, dtype=self.wireDtype)
+		values = numpy.empty(len(wire), dtype=self.dtype)
+		mask = numpy.zeros(len(wire), dtype=self.maskDtype)
+
+		if self.withNullFlags:
+			nullFlags = numpy.unpackbits(wire[NULLFLAGS_NAME], axis=1
+				).astype(bool)
+
+		for index, (name, field) in enumerate(self.fields):
+			if field.datatype=="boolean":
+				values[name], mask[name] = _decodeBooleans(wire[name])
+			else:
+				values[name] = wire[name]
+				mask[name] = _getNullMask(field, wire[name])
+
+			if self.withNullFlags:
+				mask[name] |= _expandRowMask(nullFlags[:,index],
+					self.dtype.fields[name][0].shape)
+
+		return numpy.ma.array(values, mask=mask)
+
+	def iterArrays(self, inF, chunkSize=10000):
+		"""iterates over masked record arrays of at most chunkSize rows
+		decoded from inF.
+
+		inF is a tableparser._StreamData instance.
+		"""
+		if self.recordSize==0:
+			return
+		while not inF.atEnd():
+			raw = inF.readUpTo(self.recordSize*chunkSize)
+			if raw:
+				yield self.decodeChunk(raw)
@@ -0,0 +1,161 @@
+"""
+Vectorized BINARY2 encoding of batches of rows.
+
+The row encoders generated from enc_binary2 pack values field by field,
+which makes serialisation the dominant cost for large results.  For
+tables consisting of numeric scalars, booleans, and fixed-length strings,
+we can instead transpose a batch of rows into columns, let numpy build a
+record array of the wire format (null flags and big-endian payload), and
+return its bytes in one go.
+
+This needs numpy, which is an optional dependency of the VOTable library;
+tablewriter only uses this module when numpy is available and canEncode
+returns true.
+"""
+
+#c Copyright 2008-2017, the GAVO project
+#c
+#c This program is free software, covered by the GNU GPL.  See the
+#c COPYING file in the source distribution.
+
+
+import numpy
+
+from gavo.votable import common
+
+
+# map from VOTable datatypes to (big-endian) numpy type codes and, for
+# integers, the range of admissible values.
+_numericTypes = {
+	"short": (">i2", (-2**15, 2**15-1)),
+	"int": (">i4", (-2**31, 2**31-1)),
+	"long": (">i8", None),
+	"float": (">f4", None),
+	"double": (">f8", None),
+	"floatComplex": (">c8", None),
+	"doubleComplex": (">c16", None),
+}
+
+
+class _CannotVectorize(Exception):
+	"""raised when a batch cannot be encoded vectorized (and hence should
+	be encoded row by row).
+	"""
+
+
+def _encodeNumbers(values, nulls, typeCode, valRange):
+	if typeCode[1] in "fc":
+		# numpy turns Nones into NaNs for us; we still overwrite them to
+		# get exactly the bytes the row encoders would produce.
+		res = numpy.array(values, dtype=typeCode)
+		res[nulls] = complex(common.NaN, common.NaN
+			) if typeCode[1]=="c" else common.NaN
+		return res
+
+	if nulls.any():
+		values = [0 if v is None else v for v in values]
+	res = numpy.array(values, dtype=numpy.int64)
+	if valRange is not None and len(res) and (
+			res.min()<valRange[0] or res.max()>valRange[1]):
+		raise _CannotVectorize()
+	return res.astype(typeCode)
+
+
+def _encodeBooleans(values, nulls):
+	res = numpy.where(
+		numpy.array([bool(v) for v in values], dtype=bool), "1", "0")
+	res[nulls] = "?"
+	return res
+
+
+def _encodeStrings(values, length):
+	return numpy.array([
+			"" if v is None
+			else v.encode("ascii", "replace") if isinstance(v, unicode)
+			else v
+		for v in values], dtype="S%d"%length)
+
+
+def _getColumnEncoder(field):
+	"""returns a pair of (numpy type, encoding function) for field.
+
+	The encoding functions take the values of a column and the
+	corresponding null mask and return a numpy array of the column.
+
+	For fields we cannot encode vectorized, None is returned.
+	"""
+	if field.datatype in _numericTypes and field.isScalar():
+		typeCode, valRange = _numericTypes[field.datatype]
+		return typeCode, lambda values, nulls: _encodeNumbers(
+			values, nulls, typeCode, valRange)
+
+	elif field.datatype=="boolean" and field.isScalar():
+		return "S1", _encodeBooleans
+
+	elif field.datatype=="char" and not field.hasVarLength(
+			) and not field.isMultiDim():
+		length = field.getLength()
+		return "S%d"%length, lambda values, nulls: _encodeStrings(
+			values, length)
+
+	return None
+
+
+def canEncode(tableDefinition):
+	"""returns True if all fields of tableDefinition can be encoded
+	vectorized.
+	"""
+	for field in tableDefinition.getFields():
+		if _getColumnEncoder(field) is None:
+			return False
+	return True
+
+
+class BatchEncoder(object):
+	"""An encoder for BINARY2 serializing lists of rows at a time.
+
+	Construct it with a VOTable.TABLE instance (for which canEncode must
+	be true) and the row encoder generated from enc_binary2; the latter is
+	used for batches numpy cannot deal with (e.g., because of values
+	out of the range of the VOTable type; the row encoder will then produce
+	a sensible error message).
+	"""
+	def __init__(self, tableDefinition, encodeRow):
+		self.encodeRow = encodeRow
+		fields = tableDefinition.getFields()
+		self.nFields = len(fields)
+		self.nullBytes = common.NULLFlags(self.nFields).nBytes
+		self.columnEncoders = []
+		spec = [("nullflags", "u1", (self.nullBytes,))]
+		for index, field in enumerate(fields):
+			typeCode, encoder = _getColumnEncoder(field)
+			spec.append(("f%d"%index, typeCode))
+			self.columnEncoders.append(encoder)
+		self.wireDtype = numpy.dtype(spec)
+
+	def _encodeVectorized(self, rows):
+		nRows = len(rows)
+		res = numpy.zeros(nRows, dtype=self.wireDtype)
+		nullMap = numpy.zeros((nRows, self.nFields), dtype=bool)
+
+		for index, (values, encoder) in enumerate(
+				zip(zip(*rows), self.columnEncoders)):
+			nulls = numpy.fromiter((v is None for v in values),
+				dtype=bool, count=nRows)
+			nullMap[:,index] = nulls
+			res["f%d"%index] = encoder(values, nulls)
+
+		res["nullflags"] = numpy.packbits(nullMap, axis=1)
+		return res.tostring()
+
+	def encodeBatch(self, rows):
+		"""returns the BINARY2 serialization of the sequence of
+		tuples rows.
+		"""
+		if not rows:
+			return ""
+		try:
+			return self._encodeVectorized(rows)
+		except (_CannotVectorize, TypeError, ValueError,
+				AttributeError, OverflowError):
+			return "".join(self.encodeRow(row) for row in rows)
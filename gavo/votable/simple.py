@@ -148,6 +148,40 @@ def load(source, raiseOnInvalid=True):
 	return rows, fields
 
 
+def loadArray(source, raiseOnInvalid=True, chunkSize=10000):
+	"""returns (data, metadata) from the first table of a VOTable, where
+	data is a numpy masked record array.
+
+	NULL values are masked.  This is much faster than load for large tables 
+	in BINARY or BINARY2 serialization, but it requires numpy and only
+	works for tables without variable-length fields.
+
+	source can be a string that is then interpreted as a local file name,
+	or it can be a file-like object.
+	"""
+	if isinstance(source, basestring):
+		source = file(source)
+	infos = {}
+
+	# see load on this loop
+	chunks = None
+	for element in parser.parse(source, [V.INFO], raiseOnInvalid):
+		if isinstance(element, V.INFO):
+			infos.setdefault(element.name, []).append(element)
+		else:
+			if chunks is not None:
+				break
+			fields = TableMetadata(element.tableDefinition, infos)
+			chunks = list(element.iterArrays(chunkSize))
+	if chunks is None: # No table included
+		return None, None
+	if not chunks:
+		from gavo.votable import dec_binarray
+		return numpy.ma.array([], dtype=dec_binarray.ArrayDecoder(
+			fields.votTable).dtype), fields
+	return numpy.ma.concatenate(chunks), fields
+
+
 def loads(stuff, raiseOnInvalid=True):
 	"""returns data,metadata for a VOTable literal in stuff.
 	"""
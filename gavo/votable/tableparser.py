@@ -11,6 +11,14 @@ events (utils.iterparse doesn't).
 #c COPYING file in the source distribution.
 
 
+import itertools
+
+try:
+	import numpy
+except ImportError:
+	# keep numpy optional
+	pass
+
 from gavo.votable import coding
 from gavo.votable import common
 from gavo.votable import dec_binary
@@ -165,6 +173,18 @@ class _StreamData(object):
 		self.lastRes = self.curChunk[self.fPos:self.fPos+nBytes]
 		self.fPos += nBytes
 		return self.lastRes
+
+	def readUpTo(self, nBytes):
+		"""returns a string containing at most the next nBytes of the
+		input stream.
+
+		Less than nBytes are only returned at the end of the stream.
+		"""
+		while self.fPos+nBytes>len(self.curChunk) and not self._eof:
+			self._fillBuffer(nBytes)
+		self.lastRes = self.curChunk[self.fPos:self.fPos+nBytes]
+		self.fPos += len(self.lastRes)
+		return self.lastRes
 	
 	def atEnd(self):
 		return self._eof and self.fPos==len(self.curChunk)
@@ -178,9 +198,10 @@ class BinaryIteratorBase(DataIterator):
 	present the data stream coming from the parser as a file to the decoder.  
 	"""
 
-	# I need to override __iter__ since we're not actually doing XML parsing
-	# here; almost all of our work is done within the stream element.
-	def __iter__(self):
+	def _openStream(self):
+		"""returns a _StreamData instance for the STREAM child of the 
+		current element.
+		"""
 		for type, tag, payload in self.nodeIterator:
 			if type!="data":
 				break
@@ -189,8 +210,12 @@ class BinaryIteratorBase(DataIterator):
 				and payload.get("encoding")=="base64"):
 			raise common.VOTableError("Can only read BINARY data from base64"
 				" encoded streams")
-		
-		inF = _StreamData(self.nodeIterator)
+		return _StreamData(self.nodeIterator)
+
+	# I need to override __iter__ since we're not actually doing XML parsing
+	# here; almost all of our work is done within the stream element.
+	def __iter__(self):
+		inF = self._openStream()
 		while not inF.atEnd():
 			row = self._decodeRawRow(inF)
 			if row is not None:
@@ -205,6 +230,24 @@ class Binary2Iterator(BinaryIteratorBase):
 	decoderModule = dec_binary2
 
 
+class BinaryArrayIterator(BinaryIteratorBase):
+	"""An iterator over numpy masked record arrays decoded from a
+	BINARY or BINARY2 stream.
+
+	This only works for tables having only fixed-width fields; use
+	dec_binarray.canDecode to check beforehand.
+	"""
+	def __init__(self, tableDefinition, nodeIterator, withNullFlags,
+			chunkSize=10000):
+		from gavo.votable import dec_binarray
+		self.nodeIterator, self.chunkSize = nodeIterator, chunkSize
+		self.decoder = dec_binarray.ArrayDecoder(
+			tableDefinition, withNullFlags)
+
+	def __iter__(self):
+		return self.decoder.iterArrays(self._openStream(), self.chunkSize)
+
+
 def _makeTableIterator(elementName, tableDefinition, nodeIterator):
 	"""returns an iterator for the rows contained within node.
 	"""
@@ -221,6 +264,31 @@ def _makeTableIterator(elementName, tableDefinition, nodeIterator):
 				" and BINARY coding")
 
 
+def _iterArraysFromRows(tableDefinition, rowIterator, chunkSize):
+	"""iterates over numpy masked record arrays made from chunks of
+	rowIterator.
+
+	This is for serializations we do not have vectorized decoders for.
+	"""
+	from gavo.votable import dec_binarray
+	decoder = dec_binarray.ArrayDecoder(tableDefinition)
+	nullRow = tuple(numpy.zeros(1, decoder.dtype)[0])
+
+	while True:
+		rows = list(itertools.islice(rowIterator, chunkSize))
+		if not rows:
+			break
+		arr = numpy.ma.array(
+			[tuple(nullRow[i] if v is None else v for i, v in enumerate(row))
+				for row in rows],
+			mask=[tuple(v is None for v in row) for row in rows],
+			dtype=decoder.dtype)
+		for name in decoder.dtype.names:
+			if decoder.dtype.fields[name][0].base.kind in "fc":
+				arr.mask[name] |= numpy.isnan(arr.data[name])
+		yield arr
+
+
 class Rows(object):
 	"""a wrapper for data within a VOTable.
 
@@ -242,3 +310,27 @@ class Rows(object):
 			else:
 				return _makeTableIterator(tag, 
 					self.tableDefinition, self.nodeIterator)
+
+	def iterArrays(self, chunkSize=10000):
+		"""iterates over numpy masked record arrays of at most chunkSize
+		rows each.
+
+		This is an alternative to plain iteration for large tables; 
+		for BINARY and BINARY2 serializations, whole chunks are decoded
+		at a time, which is much faster than decoding row by row.  For
+		TABLEDATA, the arrays are built from the rows.
+
+		NULL values are masked.  Only tables with fixed-width fields
+		can be decoded in this way; for others, a VOTableError is raised.
+		This requires numpy.
+		"""
+		for type, tag, payload in self.nodeIterator:
+			if type=="data" or tag=="INFO":
+				pass
+			elif tag=='BINARY' or tag=='BINARY2':
+				return iter(BinaryArrayIterator(self.tableDefinition, 
+					self.nodeIterator, tag=='BINARY2', chunkSize))
+			else:
+				return _iterArraysFromRows(self.tableDefinition,
+					_makeTableIterator(tag, self.tableDefinition, self.nodeIterator),
+					chunkSize)
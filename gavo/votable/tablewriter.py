@@ -8,6 +8,7 @@ Writing tabular data within VOTables.
 #c COPYING file in the source distribution.
 
 
+import itertools
 from cStringIO import StringIO
 
 from gavo import utils
@@ -86,6 +87,28 @@ class OverflowElement(stanxml.Stub):
 			write(self.overflowStan, outputFile, xmlDecl=False)
 
 
+# number of rows serialized at a time by vectorized encoders
+BATCH_SIZE = 1000
+
+
+def _getBatchEncoder(tableDefinition, contentElement, encodeRow):
+	"""returns an enc_binarray.BatchEncoder for tableDefinition if
+	contentElement is BINARY2, numpy is available, and the table's
+	fields are suitable, None otherwise.
+	"""
+	if contentElement is not VOTable.BINARY2:
+		return None
+	try:
+		from gavo.votable import enc_binarray
+	except ImportError:
+		# no numpy, no vectorized encoding
+		return None
+	if not tableDefinition.getFields() or not enc_binarray.canEncode(
+			tableDefinition):
+		return None
+	return enc_binarray.BatchEncoder(tableDefinition, encodeRow)
+
+
 def DelayedTable(tableDefinition, rowIterator, contentElement,
 		overflowElement=None, **attrs):
 	"""returns tableDefinition such that when serialized, it contains
@@ -111,6 +134,19 @@ def DelayedTable(tableDefinition, rowIterator, contentElement,
 			yield encodeRow(row)
 		if overflowElement is not None:
 			overflowElement.setRowsDelivered(numRows)
+
+	batchEncoder = _getBatchEncoder(tableDefinition, contentElement, encodeRow)
+	if batchEncoder is not None:
+		def iterSerialized(): #noflake: conditional re-definition
+			numRows, rows = 0, iter(rowIterator)
+			while True:
+				batch = list(itertools.islice(rows, BATCH_SIZE))
+				if not batch:
+					break
+				numRows += len(batch)
+				yield batchEncoder.encodeBatch(batch)
+			if overflowElement is not None:
+				overflowElement.setRowsDelivered(numRows)
 	
 	content = contentElement(**attrs)
 	content.text_ = "Placeholder for real data"
@@ -735,7 +735,9 @@ class ADQLTAPJob(_WithEndpoint):
 		"""returns a file-like object you can read the default TAP result off.
 
 		To have the embedded VOTable returned, say
-		votable.load(job.openResult()).
+		votable.load(job.openResult()).  For large results, 
+		votable.loadArray(job.openResult()) gives you a numpy array
+		much faster.
 
 		If you pass simple=False, the URL will be taken from the
 		service's result list (the first one given there).  Otherwise (the
@@ -16,6 +16,7 @@ from nevow import tags as T
 from gavo import base
 from gavo import stc
 from gavo import svcs
+from gavo import utils
 from gavo.imp import formal
 from gavo.web import common
 from gavo.web import grend
@@ -101,6 +102,34 @@ class AdminRenderer(formal.ResourceMixin,
 		"""
 		return sorted(self.clientRD.services)
 
+	def data_cachestats(self, ctx, data):
+		"""returns a sorted sequence of (cache name, statistics) pairs
+		for the named caches of the server process.
+		"""
+		return sorted(base.caches.getCacheStats().iteritems())
+
+	def render_cachestat(self, ctx, data):
+		"""renders a table row for an item from data_cachestats.
+		"""
+		name, stats = data
+		return ctx.tag[T.td[name]][[T.td[stats[key]] 
+			for key in ["entries", "hits", "misses", "evictions"]]]
+
+	def data_fitsstats(self, ctx, data):
+		"""returns a sorted sequence of (operation name, statistics) pairs
+		for the operations under the fitsLock in the server process.
+		"""
+		return sorted(utils.fitsLock.getStats().iteritems())
+
+	def render_fitsstat(self, ctx, data):
+		"""renders a table row for an item from data_fitsstats.
+		"""
+		name, stats = data
+		return ctx.tag[T.td[name], T.td[stats["count"]], 
+			T.td[stats["rejected"]]][[T.td["%.3f"%stats[key]] 
+			for key in ["waitSeconds", "maxWaitSeconds", 
+				"holdSeconds", "maxHoldSeconds"]]]
+
 	def render_svclink(self, ctx, data):
 		"""renders a link to a service info with a service title.
 		
@@ -3,6 +3,11 @@ A simple caching system for nevow pages.
 
 The basic idea is to monkeypatch the request object in order to
 snarf content and headers.
+
+Cached pages are kept in a global store limited to [web]pageCacheSize
+bytes; the least recently used pages are evicted when this is exceeded.
+Each page is kept both verbatim and gzipped, such that clients accepting
+gzip get the compressed variant without any per-request compression.
 """
 
 #c Copyright 2008-2017, the GAVO project
@@ -11,24 +16,33 @@ snarf content and headers.
 #c COPYING file in the source distribution.
 
 
+import gzip
+import hashlib
 import time
+from cStringIO import StringIO
 
 from nevow import compression
 from nevow import inevow
 from nevow import rend
+from twisted.web import http
 
+from gavo import base
 from gavo import utils
 
 
+# headers of the original response we must not replay from the cache
+_VOLATILE_HEADERS = frozenset(["last-modified", "content-length",
+	"content-encoding", "date", "etag", "vary"])
+
+
 def instrumentRequestForCaching(request, finishAction):
 	"""changes request such that finishAction is called with the request and
 	the content written for a successful page render.
+
+	When request is a nevow CompressingRequestWrapper, the uncompressed
+	content is passed to finishAction.
 	"""
 	request = inevow.IRequest(request)
-	# For now, we don't cache compressed responses
-	if isinstance(request, compression.CompressingRequestWrapper):
-		return
-
 	builder = CacheItemBuilder(finishAction)
 	origWrite, origFinishRequest = request.write, request.finishRequest
 
@@ -63,28 +77,133 @@ class CacheItemBuilder(object):
 			self.finishAction(request, "".join(self.contentBuffer))
 
 
+def _gzip(content):
+	"""returns content gzipped.
+
+	The gzip header's mtime is fixed so the result only depends on content.
+	"""
+	f = StringIO()
+	zipped = gzip.GzipFile(fileobj=f, mode="wb", compresslevel=6, mtime=0)
+	zipped.write(content)
+	zipped.close()
+	return f.getvalue()
+
+
+def _acceptsGzip(request):
+	"""returns True if the client has said it accepts gzip encoding.
+	"""
+	value = request.getHeader("accept-encoding")
+	if value is None:
+		return False
+	try:
+		return compression.parseAcceptEncoding(value).get("gzip", 0)>0
+	except ValueError:  # malformed qvalues
+		return False
+
+
+def _matchesETag(request, etag):
+	"""returns True if request has an If-None-Match header matching etag.
+	"""
+	tags = request.getHeader("if-none-match")
+	if not tags:
+		return False
+	tags = [t.strip() for t in tags.split(",")]
+	return etag in tags or "*" in tags
+
+
 class CachedPage(rend.Page):
+	"""A page rendered from the cache.
+
+	The page keeps content both verbatim and gzipped (unless gzip does
+	not make it smaller) and delivers the gzipped variant to clients
+	accepting it.  It sets ETag and Last-Modified headers and answers
+	conditional GETs with a 304 where possible.
+	"""
 	def __init__(self, content, headers, lastModified):
 		self.content = content
 		self.creationStamp = time.time()
+		headers = dict((key.lower(), value) for key, value in headers.iteritems()
+			if key.lower() not in _VOLATILE_HEADERS)
 		headers["x-cache-creation"] = str(self.creationStamp)
 		self.changeStamp = self.lastModified = lastModified
-		if "last-modified" in headers:
-			del headers["last-modified"]
 		self.headers = headers.items()
 
+		self.gzipped = _gzip(content)
+		if len(self.gzipped)>=len(content):
+			self.gzipped = None
+		self.etag = '"%s"'%hashlib.md5(content).hexdigest()
+
+	def getSize(self):
+		"""returns the approximate number of bytes this page takes up.
+		"""
+		return (len(self.content)+len(self.gzipped or "")
+			+base.caches.estimateSize(self.headers)+200)
+
 	def renderHTTP(self, ctx):
 		request = inevow.IRequest(ctx)
-		if self.lastModified:
-			request.setLastModified(self.lastModified)
 		for key, value in self.headers:
 			request.setHeader(key, value)
 		request.setHeader('date', utils.formatRFC2616Date())
-		return self.content
+
+		content, etag = self.content, self.etag
+		if self.gzipped is not None:
+			request.setHeader("vary", "Accept-Encoding")
+			if _acceptsGzip(request):
+				content, etag = self.gzipped, self.etag[:-1]+'-gz"'
+				request.setHeader("content-encoding", "gzip")
+
+		request.setHeader("etag", etag)
+		if _matchesETag(request, etag):
+			request.setResponseCode(http.NOT_MODIFIED)
+			return ""
+		if self.lastModified:
+			if request.setLastModified(self.lastModified) is http.CACHED:
+				return ""
+
+		request.setHeader("content-length", str(len(content)))
+		return content
+
+
+_pageStore = base.caches.BoundedCache(
+	maxBytes=base.getConfig("web", "pageCacheSize"),
+	sizeFunction=lambda page: page.getSize())
+base.caches.registerCache("getPageStore", _pageStore, lambda: _pageStore)
+
+
+class PageCache(object):
+	"""The page cache for one RD.
+
+	This is a dictionary-like view on the global page store; keys are
+	whatever the callers use to identify their pages (segments, file
+	names).  Creating a PageCache discards all pages stored for its
+	RD previously, which is how pages are cleared when an RD is reloaded.
+	"""
+	def __init__(self, rdId, store=_pageStore):
+		self.rdId, self.store = rdId, store
+		self.clear()
+
+	def __contains__(self, key):
+		return (self.rdId, key) in self.store
+
+	def __getitem__(self, key):
+		return self.store[self.rdId, key]
+
+	def __setitem__(self, key, page):
+		self.store[self.rdId, key] = page
+
+	def get(self, key, default=None):
+		return self.store.get((self.rdId, key), default)
+
+	def clear(self):
+		for key in self.store.keys():
+			if key[0]==self.rdId:
+				self.store.pop(key)
 
 
 def enterIntoCacheAs(key, destDict):
 	"""returns a finishAction that enters a page into destDict under key.
+
+	destDict usually is a PageCache.
 	"""
 	def finishAction(request, content):
 		destDict[key] = CachedPage(content, request.headers, 
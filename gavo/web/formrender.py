@@ -523,6 +523,7 @@ class FormMixin(formal.ResourceMixin):
 			resultWriter = serviceresults.getFormat(queryMeta["format"])
 
 		if resultWriter.compute:
+			queryMeta["streamResult"] = getattr(resultWriter, "streamable", False)
 			d = self.runService(svcs.PreparsedInput(data), queryMeta)
 		else:
 			d = defer.succeed(None)
@@ -63,6 +63,14 @@ class ProductRenderer(grend.ServiceBasedPage):
 		return content
 	
 	def _deliverPreviewFailure(self, failure, request):
+		if failure.check(products.PreviewQueueFull):
+			data = "Server busy computing previews, please try again later"
+			request.setResponseCode(503)
+			request.setHeader("retry-after", "10")
+			request.setHeader("content-type", "text/plain")
+			request.setHeader("content-length", str(len(data)))
+			return data
+
 		failure.printTraceback()
 		data = "Not an image (preview generation failed, please report)"
 		request.setResponseCode(500)
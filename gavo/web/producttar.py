@@ -16,8 +16,12 @@ must at least contain accref, owner, embargo, and accsize fields.
 # redirected to from the current TarResponse.
 
 from cStringIO import StringIO
+import Queue
+import collections
 import os
 import tarfile
+import tempfile
+import threading
 import time
 
 from gavo import base
@@ -30,6 +34,14 @@ from gavo.svcs import streaming
 
 MS = base.makeStruct
 
+# Number of threads computing non-file products (cutouts, scaled images,
+# remote data) for a tar.
+PREFETCH_THREADS = 4
+# Maximal number of products computed ahead of the one currently written.
+PREFETCH_WINDOW = 16
+# Computed products larger than this many bytes are spooled to disk.
+SPOOL_THRESHOLD = 5000000
+
 
 class UniqueNameGenerator(object):
 	"""A factory to build unique names from possibly ambiguous ones.
@@ -103,6 +115,99 @@ class ColToRowGrammar(grammars.Grammar):
 		itemAttD=base.UnicodeAttribute("sourceKey"))
 
 
+class _PrefetchedProduct(object):
+	"""A product the data of which is being computed in the background.
+
+	Call fetch (usually from a prefetch thread) to compute the data
+	into a temporary file (that stays in memory if small).  Users call
+	wait; afterwards, either the spool and size or the error attribute
+	are set.
+	"""
+	def __init__(self, prod):
+		self.prod = prod
+		self.spool, self.size, self.error = None, None, None
+		self.done = threading.Event()
+
+	def fetch(self):
+		try:
+			spool = tempfile.SpooledTemporaryFile(SPOOL_THRESHOLD)
+			for chunk in self.prod.iterData():
+				spool.write(chunk)
+			self.size = spool.tell()
+			spool.seek(0)
+			self.spool = spool
+		except Exception, ex:
+			base.ui.notifyError("Computing %s for a tar failed: %s"%(
+				self.prod.name, utils.safe_str(ex)))
+			self.error = ex
+		finally:
+			self.done.set()
+
+	def wait(self):
+		self.done.wait()
+
+	def close(self):
+		if self.spool is not None:
+			self.spool.close()
+			self.spool = None
+
+
+class _Prefetcher(object):
+	"""A pool of threads computing products for a tar ahead of time.
+
+	Use iterPrefetched to get the products in the order they were 
+	passed in, paired with a _PrefetchedProduct if they need computing.
+	At most PREFETCH_WINDOW products are in flight at any time; with
+	products above SPOOL_THRESHOLD going to disk, this bounds the memory 
+	used.
+	"""
+	def __init__(self, nThreads=PREFETCH_THREADS, window=PREFETCH_WINDOW):
+		self.window = window
+		self.jobs = Queue.Queue()
+		self.threads = [threading.Thread(target=self._work)
+			for i in range(nThreads)]
+		for t in self.threads:
+			t.daemon = True
+			t.start()
+
+	def _work(self):
+		for job in iter(self.jobs.get, None):
+			job.fetch()
+
+	def close(self):
+		for t in self.threads:
+			self.jobs.put(None)
+
+	def iterPrefetched(self, sources, needsFetching):
+		"""iterates over pairs of (source, prefetched) for the products in
+		sources.
+
+		prefetched is a _PrefetchedProduct for sources for which
+		needsFetching returns True, None otherwise.  Closing the 
+		_PrefetchedProduct is up to the caller.
+		"""
+		pending = collections.deque()
+		try:
+			for src in sources:
+				job = None
+				if needsFetching(src):
+					job = _PrefetchedProduct(src)
+					self.jobs.put(job)
+				pending.append((src, job))
+
+				while len(pending)>=self.window:
+					yield pending.popleft()
+
+			while pending:
+				yield pending.popleft()
+		finally:
+			# if our consumer has given up, clean up what has been computed
+			for src, job in pending:
+				if job is not None:
+					job.wait()
+					job.close()
+
+
 class ProductTarMaker(object):
 	"""A factory for tar files.
 
@@ -122,19 +227,24 @@ class ProductTarMaker(object):
 		b.mtime = time.time()
 		return b, stuff
 
-	def _getTarInfoFromProduct(self, prod, name):
-		"""returns a tar info from a general products.PlainProduct instance
-		prod.
+	def _getTarInfoFromPrefetched(self, prefetched, name):
+		"""returns a tar info from a _PrefetchedProduct.
 
-		This is relatively inefficient for data that's actually on disk,
-		so you should only use it when data is being computed on the fly.
+		If the computation failed, a short text file explaining that
+		is returned instead.
 		"""
-		assert not isinstance(prod, products.UnauthorizedProduct)
-		data = "".join(prod.iterData())
-		b = tarfile.TarInfo(name)
-		b.size = len(data)
+		prefetched.wait()
+		if prefetched.error is not None:
+			stuff = StringIO("Computing this file failed: %s\n"%
+				utils.safe_str(prefetched.error))
+			b = tarfile.TarInfo(name+".error.txt")
+			b.size = len(stuff.getvalue())
+		else:
+			stuff = prefetched.spool
+			b = tarfile.TarInfo(name)
+			b.size = prefetched.size
 		b.mtime = time.time()
-		return b, StringIO(data)
+		return b, stuff
 
 	def _getHeaderVals(self, queryMeta):
 		if queryMeta.get("Overflow"):
@@ -142,27 +252,42 @@ class ProductTarMaker(object):
 		else:
 			return "data.tar", "application/x-tar"
 
+	def _needsFetching(self, src):
+		return not isinstance(src, (products.NonExistingProduct,
+			products.UnauthorizedProduct, products.FileProduct))
+
 	def _productsToTar(self, productData, destination):
 		"""actually writes the tar.
+
+		Products that need computing are computed in parallel by a _Prefetcher
+		while the tar is being written.
 		"""
 		nameGen = UniqueNameGenerator()
 		outputTar = tarfile.TarFile.open("data.tar", "w|", destination)
-		for prodRec in productData.getPrimaryTable():
-			src = prodRec["source"]
-			if isinstance(src, products.NonExistingProduct):
-				continue # just skip files that somehow don't exist any more
-
-			elif isinstance(src, products.UnauthorizedProduct):
-				outputTar.addfile(*self._getEmbargoedFile(src.name))
-
-			elif isinstance(src, products.FileProduct):
-				# actual file in the file system
-				targetName = nameGen.makeName(src.name)
-				outputTar.add(str(src.rAccref.localpath), targetName)
-
-			else: # anything else is read from the src
-				outputTar.addfile(*self._getTarInfoFromProduct(src,
-					nameGen.makeName(src.name)))
+		prefetcher = _Prefetcher()
+		try:
+			for src, prefetched in prefetcher.iterPrefetched(
+					(prodRec["source"] for prodRec in productData.getPrimaryTable()),
+					self._needsFetching):
+				if isinstance(src, products.NonExistingProduct):
+					continue # just skip files that somehow don't exist any more
+
+				elif isinstance(src, products.UnauthorizedProduct):
+					outputTar.addfile(*self._getEmbargoedFile(src.name))
+
+				elif isinstance(src, products.FileProduct):
+					# actual file in the file system
+					targetName = nameGen.makeName(src.name)
+					outputTar.add(str(src.rAccref.localpath), targetName)
+
+				else: # anything else has been computed by the prefetcher
+					try:
+						outputTar.addfile(*self._getTarInfoFromPrefetched(prefetched,
+							nameGen.makeName(src.name)))
+					finally:
+						prefetched.close()
+		finally:
+			prefetcher.close()
 		outputTar.close()
 		return ""  # finish off request if necessary.
 
@@ -17,7 +17,6 @@ from twisted.python import threadable
 threadable.init()
 
 from nevow import appserver
-from nevow import compression
 from nevow import inevow
 from nevow import rend
 from nevow import tags as T
@@ -104,8 +103,9 @@ def _authorizeCORS(request):
 # A cache for RD-specific page caches.  Each of these maps segments
 # (tuples) to a finished text document.  The argument is the id of the
 # RD responsible for generating that data.  This ensures that pre-computed
-# data is cleared when the RD is reloaded.
-base.caches.makeCache("getPageCache", lambda rdId: {})
+# data is cleared when the RD is reloaded.  The pages themselves live
+# in caching's global, size-limited page store.
+base.caches.makeCache("getPageCache", caching.PageCache)
 
 
 class ArchiveService(rend.Page):
@@ -236,8 +236,9 @@ class ArchiveService(rend.Page):
 		
 		cache = base.caches.getPageCache(service.rd.sourceId)
 		segments = tuple(segments)
-		if segments in cache:
-			return compression.CompressingResourceWrapper(cache[segments])
+		cachedPage = cache.get(segments)
+		if cachedPage is not None:
+			return cachedPage
 
 		caching.instrumentRequestForCaching(request,
 			caching.enterIntoCacheAs(segments, cache))
@@ -58,9 +58,12 @@ class ServiceResult(object):
 	  the format (defaults to label).
 	- compute -- if False, at least the form renderer will not run
 	  the service (this is when you just return a container).
+	- streamable -- if True, _formatOutput only iterates over the result
+	  rows once, and thus DB-based cores may return streaming tables.
 	"""
 
 	compute = True
+	streamable = False
 	code = None
 	label = None
 
@@ -86,6 +89,7 @@ class VOTableResult(ServiceResult):
 	will just stand as it is.
 	"""
 	code = "VOTable"
+	streamable = True
 
 	@classmethod
 	def _formatOutput(cls, data, ctx):
@@ -105,6 +109,7 @@ class FITSTableResult(ServiceResult):
 	"""
 	code = "FITS"
 	label = "FITS table"
+	streamable = True
 
 	@classmethod
 	def getTargetName(cls, data):
@@ -150,6 +155,7 @@ class TSVResponse(ServiceResult):
 class TextResponse(ServiceResult):
 	code = "txt"
 	label = "Text (fixed columns)"
+	streamable = True
 
 	@classmethod
 	def _formatOutput(cls, data, ctx):
@@ -167,6 +173,7 @@ class TextResponse(ServiceResult):
 class CSVResponse(ServiceResult):
 	code = "CSV"
 	label = "CSV"
+	streamable = True
 
 	@classmethod
 	def _formatOutput(cls, data, ctx):
@@ -185,6 +192,7 @@ class CSVResponse(ServiceResult):
 class JsonResponse(ServiceResult):
 	code = "JSON"
 	label = "JSON"
+	streamable = True
 
 	@classmethod
 	def _formatOutput(cls, data, ctx):
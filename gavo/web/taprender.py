@@ -18,6 +18,7 @@ from nevow import rend
 from twisted.internet import threads
 
 from gavo import base
+from gavo import formats
 from gavo import svcs
 from gavo import utils
 from gavo.protocols import tap
@@ -39,13 +40,64 @@ def getTAPVersion():
 class TAPQueryResource(rend.Page):
 	"""the resource executing sync TAP queries.
 
-	While not really going through UWS, this does create a UWS job and
-	tears it down later.
+	Unless [async]streamSync is False or there are uploads, the query
+	result is streamed to the client as the rows come in from the database.
+	The query is started before the response is begun, so errors in running
+	it still result in proper error responses.
+
+	Otherwise, while not really going through UWS, this does create a 
+	UWS job and tears it down later.
 	"""
 	def __init__(self, service, ctx):
 		self.service = service
 		rend.Page.__init__(self)
 
+	def _canStream(self, request):
+		return (base.getConfig("async", "streamSync")
+			and not [u for u in request.args.get("upload", []) if u])
+
+	def _prepareStreaming(self, ctx):
+		parameters = {}
+		for key, value in inevow.IRequest(ctx).args.iteritems():
+			# (this is what UWSJob._setParamsFromDict does)
+			if value and isinstance(value[0], basestring) and " ".join(value):
+				parameters[key] = " ".join(value)
+		# LANG is validated by tap.LangParameter in the UWS case
+		if parameters.get("lang", "ADQL") not in tap.SUPPORTED_LANGUAGES:
+			raise base.ValidationError("This service does not support the"
+				" query language %s"%parameters["lang"], "LANG")
+
+		format, data = taprunner.prepareSyncQuery(parameters,
+			base.getConfig("async", "defaultExecTimeSync"))
+		return format, formats.getMIMEFor(format, parameters.get("format")), data
+
+	def _streamResult(self, res, ctx):
+		request = inevow.IRequest(ctx)
+		format, type, data = res
+
+		def writeTable(outputFile):
+			try:
+				taprunner.writeResultTo(format, data, outputFile)
+			except streaming.StopWriting:
+				raise
+			except Exception, ex:
+				if not format.startswith("votable"):
+					raise
+				# the VOTable writer has already appended an error INFO
+				# to the document, so all we can still do is log the problem.
+				base.ui.notifyError("Error while streaming sync TAP result: %s"%
+					utils.safe_str(ex))
+			finally:
+				data.getPrimaryTable().cleanup()
+
+		request.setHeader("content-type", str(type))
+		# if request has an accumulator, we're testing.
+		if hasattr(request, "accumulator"):
+			writeTable(request)
+			return ""
+		else:
+			return streaming.streamOut(writeTable, request)
+
 	def _doRender(self, ctx):
 		jobId = tap.WORKER_SYSTEM.getNewIdFromRequest(
 			inevow.IRequest(ctx), self.service)
@@ -79,6 +131,10 @@ class TAPQueryResource(rend.Page):
 
 	def renderHTTP(self, ctx):
 		try:
+			if self._canStream(inevow.IRequest(ctx)):
+				return threads.deferToThread(self._prepareStreaming, ctx
+					).addCallback(self._streamResult, ctx
+					).addErrback(self._formatError)
 			return threads.deferToThread(self._doRender, ctx
 				).addCallback(self._formatResult, ctx
 				).addErrback(self._formatError)
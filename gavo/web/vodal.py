@@ -142,6 +142,9 @@ class DALRenderer(grend.ServiceBasedPage):
 #					" this service: %s"%self.version)
 
 		dali.mangleUploads(request)
+		# all our outputs are written while iterating the result rows,
+		# so DB-based cores need not materialize them.
+		queryMeta["streamResult"] = True
 		return self.runService(request.args, queryMeta
 			).addCallback(self._formatOutput, ctx)
 
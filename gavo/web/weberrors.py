@@ -259,6 +259,15 @@ class NotAcceptable(ErrorPage):
 	afterMessage = ""
 
 
+class FITSBusyPage(ErrorPage):
+	handles = utils.FITSBusy
+	status = 503
+	titleMessage = "Server Busy"
+	beforeMessage = ("The server is too busy processing FITS files right"
+		" now to handle your request:")
+	afterMessage = T.p["Please try again in a few moments."]
+
+
 class ErrorDisplay(ErrorPage):
 	handles = base.ReportableError
 	status = 500
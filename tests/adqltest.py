@@ -22,6 +22,7 @@ from gavo import rsc
 from gavo import rscdef
 from gavo import utils
 from gavo.adql import annotations
+from gavo.adql import descent
 from gavo.adql import morphpg
 from gavo.adql import nodes
 from gavo.adql import tree
@@ -572,6 +573,132 @@ class ParseErrorTest(testhelpers.VerboseTest):
 	]
 
 
+class _DescentGrammar(object):
+	"""a stand-in for a pyparsing grammar parsing with adql.descent.
+	"""
+	def parseString(self, statement):
+		try:
+			return [descent.parseToTree(statement)]
+		except adql.Error:
+			# the statement parsed, but the nodes did not like it
+			return []
+
+
+class DescentParseErrorTest(ParseErrorTest):
+	"""tests for the error messages of the recursive descent parser.
+	"""
+	def _runTest(self, sample):
+		query, msgFragment = sample
+		try:
+			descent.parseToTree(query)
+		except (adql.ParseException, adql.ParseSyntaxException), ex:
+			msg = unicode(ex)
+			self.failUnless(msgFragment in msg,
+				"'%s' does not contain '%s'"%(msg, msgFragment))
+		else:
+			self.fail("'%s' parses but should not"%query)
+
+
+class DescentNakedParseTest(NakedParseTest):
+	"""runs the plain parsing tests through the recursive descent parser.
+	"""
+	def setUp(self):
+		NakedParseTest.setUp(self)
+		self.grammar = _DescentGrammar()
+
+
+class DescentFunctionsParseTest(FunctionsParseTest):
+	def setUp(self):
+		FunctionsParseTest.setUp(self)
+		self.grammar = _DescentGrammar()
+
+
+class DescentSetExpressionsTest(SetExpressionsTest):
+	def setUp(self):
+		SetExpressionsTest.setUp(self)
+		self.grammar = _DescentGrammar()
+
+
+class DescentTreeTest(testhelpers.VerboseTest):
+	"""tests for the recursive descent parser building the same trees as
+	the pyparsing grammar.
+	"""
+	__metaclass__ = testhelpers.SamplesBasedAutoTest
+
+	def _getStructure(self, tree):
+		return [(name, val.__class__) for name, val in tree.iterTree()
+			if not isinstance(val, basestring)]
+
+	def _runTest(self, query):
+		expected = adql.PARSERS["pyparsing"](query)
+		found = descent.parseToTree(query)
+		self.assertEqual(self._getStructure(found), self._getStructure(expected))
+		self.assertEqual(nodes.flatten(found), nodes.flatten(expected))
+
+	samples = [
+		"select a||b, 'x' || c, upper('x'||a) from t where a||'x' like 'y%'"
+			" and b not like lower(c)",
+		"select * from t where a in (1, 2, 3) and b not in (select x from u)"
+			" and c in (x)",
+		"select count(distinct x), count(*), sum(all y), max(z), MiN(q) from t"
+			" group by k, l having count(*)>2 order by 2 desc, k asc",
+		"select round(x, -2), truncate(y), rand(3), rand(), pi(), atan2(x,y),"
+			" mod(a, 3), power(2, x), log10(y), cot(x) from t",
+		"select ucdcol('phys.mag'), \"quoted\"\"name\", x.y.z.w from t as \"q\"",
+# 5
+		"select distinct top 10 a.*, b.c.* from (select * from x) as a"
+			" natural join b left outer join c on a.x=c.x cross join d",
+		"select * from ((a join b) join c on a.x=c.y)",
+		"select * from a, b, c where a.x=b.x",
+		"select x from t union all select y from u intersect select z from v"
+			" except (select w from q) offset 5",
+		"select x from t -- comment here\n\twhere\ty=2",
+# 10
+		"select x from t where 1=contains(point(NULL, 1, 2),"
+			" circle('galactic', ra, dec, 3)) or 0=intersects(x, y)",
+		"select centroid(circle('icrs', 1, 2, 3)), area(x),"
+			" distance(point('icrs', 1, 2), p), coord1(p), coordsys(p) from t",
+		"select * from t where 1=contains(point('icrs', ra, dec),"
+			" circle('icrs', 1, 2, 3)) and intersects(x, y)=0",
+		"select crossmatch(a, b, c, d, e), ivo_hasword(a, 'b') from t",
+		"select -x, +3, 3e5, .5, 1.e3, 2*(x+y)/-3 from t where x between 1 and 2"
+			" and y not between -1 and x+1",
+# 15
+		"select * from t where x is null or y is not null"
+			" or not exists (select * from u)",
+		"select x as y, z as \"Z\" from t where (x=1 or (y<2 and z>=3))"
+			" and not x!=4",
+		"select x from t where ((x))=((2))",
+		"select cos(x) as cot, cot from t",
+		"select * from t where x = 'a''b' 'c'",
+# 20
+		"select t.* from s.t as t join (select 1 as a from u) as v"
+			" on (t.x=v.a)",
+		"select * from (select * from x join y using (a, b)) as q",
+	]
+
+
+class ParserSelectionTest(testhelpers.VerboseTest):
+	def testSelection(self):
+		adql.useParser("descent")
+		try:
+			self.assertEqual(
+				nodes.flatten(adql.parseToTree("select x from t where y=2")),
+				"SELECT x FROM t WHERE y = 2")
+			self.assertRaisesWithMsg(adql.ParseException,
+				'Expected "FROM" (at char 8), (line:1, col:9)',
+				adql.parseToTree,
+				("select x",))
+		finally:
+			adql.useParser("pyparsing")
+
+	def testBadParser(self):
+		self.assertRaisesWithMsg(adql.Error,
+			"Unknown ADQL parser: lalr",
+			adql.useParser,
+			("lalr",))
+
+
 class JoinTypeTest(testhelpers.VerboseTest):
 	__metaclass__ = testhelpers.SamplesBasedAutoTest
 	sym = adql.getSymbols()["joinedTable"]
@@ -1884,6 +2011,11 @@ class GlueTest(testhelpers.VerboseTest):
 		self.assertEqual(td.columns[0].type, 'smallint')
 		self.assertEqual(td.columns[0].values.nullLiteral, "-32768")
 
+	def testNormalization(self):
+		self.assertEqual(adqlglue.normalizeADQL(
+			'select\n  "a  b", x -- a  comment\n\tfrom t where y=\'  \''),
+			'select "a  b", x -- a  comment\n from t where y=\'  \'')
+
 
 class QueryTest(testhelpers.VerboseTest):
 	"""performs some actual queries to test the whole thing.
@@ -1950,6 +2082,16 @@ class QueryTest(testhelpers.VerboseTest):
 			("description", 'A sample RA'), ("unit", 'deg'), 
 			("tablehead", "Raw RA")])
 
+	def testMorphCaching(self):
+		hitsBefore = adqlglue._morphCache.getStats()["hits"]
+		query = "select alpha from %s where mag<0"%self.tableName
+		res1 = self.runQuery(query)
+		res2 = self.runQuery(query.replace(" ", "\n  "))
+		self.failUnless(adqlglue._morphCache.getStats()["hits"]>hitsBefore)
+		self.failIf(res1 is res2)
+		self.assertEqual(len(res2.rows), 1)
+		self.assertEqual(res2.rows[0]["alpha"], 290.125)
+
 	def testNoCase(self):
 		# will just raise an Exception if things are broken.
 		self.runQuery("select ALPHA, DeLtA, MaG from %s"%self.tableName)
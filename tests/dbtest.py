@@ -515,5 +515,69 @@ class TestIgnoreFrom(testhelpers.VerboseTest):
 		self.assertEqual(data2.nAffected, 0)
 
 
+class IncrementalImportTest(testhelpers.VerboseTest):
+	resources = [("connection", tresc.dbConnection)]
+
+	def setUp(self):
+		testhelpers.VerboseTest.setUp(self)
+		self.dd = testhelpers.getTestRD().getById("productimport-incremental")
+		self.connection.execute("DELETE FROM dc.sourcefingerprints"
+			" WHERE ddId=%(ddId)s", {"ddId": self.dd.getFullId()})
+		self.connection.execute("DELETE FROM test.prodtest")
+
+	def _import(self):
+		return rsc.makeData(self.dd,
+			rsc.getParseOptions(keepGoing=True, incremental=True),
+			connection=self.connection)
+
+	def testUnchangedSkipped(self):
+		self.assertEqual(self._import().nAffected, 2)
+		self.assertEqual(self._import().nAffected, 0)
+		self.assertEqual(
+			set(self.connection.query("select object from test.prodtest")),
+			set([('gabriel',), ('michael',)]))
+
+	def testChangedReingested(self):
+		self._import()
+		srcPath = os.path.join(base.getConfig("inputsDir"), "data", "a.imp")
+		os.utime(srcPath, None)
+		self.assertEqual(self._import().nAffected, 1)
+		self.assertEqual(
+			list(self.connection.query("select count(*) from test.prodtest"))[0][0],
+			2)
+
+	def testNoSourceColumnRejected(self):
+		self.assertRaisesWithMsg(base.ReportableError,
+			"Cannot import data/test#productimport incrementally: make for"
+			" prodtest has no sourceColumn.",
+			rsc.makeData,
+			(testhelpers.getTestRD().getById("productimport"),
+				rsc.getParseOptions(incremental=True), None, self.connection))
+
+
+class ParallelImportTest(testhelpers.VerboseTest):
+	resources = [("connection", tresc.dbConnection)]
+
+	def testParallelImport(self):
+		data = rsc.makeData(
+			testhelpers.getTestRD().getById("productimport"),
+			rsc.getParseOptions(keepGoing=True, nParallel=2),
+			connection=self.connection)
+		self.assertEqual(data.nAffected, 2)
+		self.assertEqual(
+			set(self.connection.query("select object from test.prodtest")),
+			set([('gabriel',), ('michael',)]))
+
+	def testParallelMaxRows(self):
+		data = rsc.makeData(
+			testhelpers.getTestRD().getById("productimport"),
+			rsc.getParseOptions(maxRows=1, nParallel=2),
+			connection=self.connection)
+		self.assertEqual(data.nAffected, 1)
+		self.assertEqual(
+			len(list(self.connection.query("select object from test.prodtest"))),
+			1)
+
+
 if __name__=="__main__":
 	testhelpers.main(AdhocQuerierTest)
@@ -361,6 +361,99 @@ class FITSCutoutTest(testhelpers.VerboseTest):
 		self.assertEqual(res.header["CRPIX1"], 37.)
 
 
+class SeekCutoutTest(testhelpers.VerboseTest):
+	def setUp(self):
+		self.srcName = os.path.join(base.getConfig("inputsDir"),
+			"data", "excube.fits")
+		self.origHDU = pyfits.open(self.srcName, 
+			do_not_scale_image_data=True)[0]
+
+	def _assertSameAsCutoutFITS(self, *cuts):
+		ref = fitstools.cutoutFITS(self.origHDU, *cuts)
+		res = fitstools.SeekCutout(self.srcName).cutout(*cuts).getHDU()
+		self.assertEqual(res.data.shape, ref.data.shape)
+		self.failUnless((res.data==ref.data).all())
+		for key in ["NAXIS1", "NAXIS2", "NAXIS3", "CRPIX1", "CRPIX2", "CRPIX3"]:
+			self.assertEqual(res.header[key], ref.header[key])
+
+	def testPlaneCutout(self):
+		self._assertSameAsCutoutFITS((1, 2, 3))
+
+	def testMultiCutout(self):
+		self._assertSameAsCutoutFITS((1, 6, 8), (2, 3, 3), (3, 2, 4))
+
+	def testFullPlanes(self):
+		self._assertSameAsCutoutFITS((3, 2, 3))
+
+	def testSwappedLimits(self):
+		self._assertSameAsCutoutFITS((1, 8, 7), (2, -1, 30))
+
+	def testRepeatedCutout(self):
+		res = fitstools.SeekCutout(self.srcName).cutout((1, 3, 9)
+			).cutout((1, 2, 3)).getHDU()
+		self.assertEqual(res.header["NAXIS1"], 2)
+		self.assertEqual(res.header["CRPIX1"], 34.)
+		self.assertAlmostEqual(res.data[0][0][0], 
+			self.origHDU.data[0][0][3])
+
+	def testStreamed(self):
+		cutout = fitstools.SeekCutout(self.srcName).cutout((1, 6, 8), (3, 2, 4))
+		serialized = "".join(cutout.iterData(chunkSize=20))
+		self.assertEqual(len(serialized)%fitstools.FITS_BLOCK_SIZE, 0)
+		res = pyfits.open(cStringIO.StringIO(serialized))[0]
+		self.assertEqual(res.data.shape, (3, 7, 3))
+		self.assertAlmostEqual(res.data[-1][-1][-1], 
+			self.origHDU.data[3][6][7])
+
+
+class FITSLockTest(testhelpers.VerboseTest):
+	def testStats(self):
+		lock = fitstools._FITSLock()
+		with lock("op1"):
+			with lock("op2"):
+				pass
+		with lock("op1"):
+			pass
+		stats = lock.getStats()
+		self.assertEqual(stats.keys(), ["op1"])
+		self.assertEqual(stats["op1"]["count"], 2)
+		self.assertEqual(stats["op1"]["rejected"], 0)
+		self.failUnless(stats["op1"]["holdSeconds"]>=0)
+
+	def testRejection(self):
+		import threading
+		lock = fitstools._FITSLock()
+		lock.maxWaiting = 0
+		def acquire():
+			with lock("busy"):
+				pass
+
+		# a free lock is always granted
+		acquire()
+
+		holding, release = threading.Event(), threading.Event()
+		def hold():
+			with lock("holder"):
+				holding.set()
+				release.wait(5)
+		holder = threading.Thread(target=hold)
+		holder.start()
+		try:
+			holding.wait(5)
+			self.assertRaisesWithMsg(fitstools.FITSBusy,
+				"Too many FITS operations are pending.",
+				acquire,
+				())
+		finally:
+			release.set()
+			holder.join()
+
+		self.assertEqual(lock.getStats()["busy"]["rejected"], 1)
+		self.assertEqual(lock.getStats()["busy"]["count"], 1)
+		self.assertEqual(lock.waiting, 0)
+		acquire()
+
+
 class WCSAxisTest(testhelpers.VerboseTest):
 	def testTransformations(self):
 		ax = fitstools.WCSAxis("test", 4, 9, 0.5)
@@ -25,6 +25,7 @@ from gavo.grammars import columngrammar
 from gavo.grammars import common
 from gavo.grammars import directgrammar
 from gavo.grammars import fitsprodgrammar
+from gavo.grammars import fitstablegrammar
 from gavo.grammars import pdsgrammar
 from gavo.grammars import regrammar
 from gavo.helpers import testtricks
@@ -475,6 +476,41 @@ class FITSProdGrammarTest(testhelpers.VerboseTest):
 		self.assertEqual(d["__HDUS"][0].data[0][0], 7896.0)
 
 
+class FITSTableGrammarTest(testhelpers.VerboseTest):
+
+	sample = os.path.join(
+		base.getConfig("inputsDir"), "data", "extable.fitstable")
+	grammarT = fitstablegrammar.FITSTableGrammar
+
+	def _getParse(self, grammarDef):
+		grammar = base.parseFromString(self.grammarT, grammarDef)
+		return getCleaned(grammar.parse(self.sample))
+
+	def testPlain(self):
+		rows = self._getParse("<fitsTableGrammar/>")
+		self.assertEqual(len(rows), 1)
+		self.assertEqual(rows[0]["i"], 450000)
+		self.assertEqual(rows[0]["text"], "foobar")
+
+	def testChunked(self):
+		self.assertEqual(self._getParse('<fitsTableGrammar chunkSize="10"/>'),
+			[{'b': 4009249430, 'd': 5e+120, 'f': 3.200000047683716,
+				'i': 450000, 'text': 'foobar'}])
+
+	def testChunks(self):
+		grammar = base.parseFromString(self.grammarT,
+			'<fitsTableGrammar chunkSize="10"/>')
+		chunks = list(grammar.parse(self.sample)._iterChunks())
+		self.assertEqual(len(chunks), 1)
+		self.assertEqual(chunks[0]["b"].dtype.isnative, True)
+		self.assertEqual(list(chunks[0]["b"]), [4009249430])
+
+	def testBadChunkSize(self):
+		self.assertRaises(base.StructureError,
+			base.parseFromString,
+			self.grammarT, '<fitsTableGrammar chunkSize="0"/>')
+
+
 class ReGrammarTest(testhelpers.VerboseTest):
 	def testBadInputRejection(self):
 		grammar = base.parseFromString(regrammar.REGrammar,
@@ -887,6 +887,114 @@ class Binary2RoundtripTest(testhelpers.VerboseTest):
 	]
 
 
+class ArrayDecodingTest(testhelpers.VerboseTest):
+	"""tests for decoding tables into numpy arrays.
+	"""
+	def _getArray(self, fielddefs, rows, encoding):
+		vot = V.VOTABLE[V.RESOURCE[votable.DelayedTable(
+			V.TABLE[fielddefs], rows, encoding)]]
+		return votable.loadArray(StringIO(votable.asString(vot)), 
+			chunkSize=2)[0]
+
+	def _assertDecodes(self, encoding):
+		arr = self._getArray([
+				V.FIELD(name="a", datatype="int")[V.VALUES(null="-1")],
+				V.FIELD(name="b", datatype="double"),
+				V.FIELD(name="c", datatype="char", arraysize="3"),
+				V.FIELD(name="d", datatype="boolean"),
+				V.FIELD(name="e", datatype="short", arraysize="2")],
+			[[1, 0.5, "abc", True, [1, 2]],
+				[-1, None, "xyz", None, [3, 4]],
+				[None, 2.5, "uvw", False, [5, 6]]],
+			encoding)
+		self.assertEqual(len(arr), 3)
+		self.assertEqual(arr["a"].tolist(), [1, None, None])
+		self.assertEqual(arr["b"].tolist(), [0.5, None, 2.5])
+		self.assertEqual(arr["c"].tolist(), ["abc", "xyz", "uvw"])
+		self.assertEqual(arr["d"].tolist(), [True, None, False])
+		self.assertEqual(arr["e"].tolist(), [[1, 2], [3, 4], [5, 6]])
+
+	def testBinary(self):
+		self._assertDecodes(V.BINARY)
+
+	def testBinary2(self):
+		self._assertDecodes(V.BINARY2)
+		arr = self._getArray([
+				V.FIELD(name="a", datatype="int"),
+				V.FIELD(name="b", datatype="char", arraysize="2")],
+			[[None, "ab"], [3, None]],
+			V.BINARY2)
+		self.assertEqual(arr["a"].tolist(), [None, 3])
+		self.assertEqual(arr["b"].tolist(), ["ab", None])
+
+	def testTabledata(self):
+		arr = self._getArray([
+				V.FIELD(name="a", datatype="int")[V.VALUES(null="-1")],
+				V.FIELD(name="b", datatype="float")],
+			[[1, None], [None, 4.25], [3, 1.5]],
+			V.TABLEDATA)
+		self.assertEqual(arr["a"].tolist(), [1, None, 3])
+		self.assertEqual(arr["b"].tolist(), [None, 4.25, 1.5])
+
+	def testVarLengthRejected(self):
+		self.assertRaisesWithMsg(common.VOTableError,
+			"Field b has a variable length",
+			self._getArray,
+			([V.FIELD(name="a", datatype="int"),
+				V.FIELD(name="b", datatype="char", arraysize="*")],
+			[[1, "abc"]], V.BINARY2))
+
+	def testEmpty(self):
+		arr = self._getArray([V.FIELD(name="a", datatype="int")], [],
+			V.BINARY)
+		self.assertEqual(len(arr), 0)
+		self.assertEqual(arr.dtype.names, ("a",))
+
+
+class Binary2BatchEncodingTest(testhelpers.VerboseTest):
+	"""tests for the vectorized BINARY2 encoder.
+	"""
+	fielddefs = [
+		V.FIELD(datatype="int"), 
+		V.FIELD(datatype="double"),
+		V.FIELD(datatype="boolean"),
+		V.FIELD(datatype="char", arraysize="3"),
+		V.FIELD(datatype="floatComplex")]
+	rows = [
+		[5, None, True, "abc", 1+1j],
+		[None, 4.25, None, u"x\xe4", None],
+		[-3, -1.5, False, None, 0.25j]]
+
+	def _serialize(self, rows, batched=True):
+		vot = V.VOTABLE[V.RESOURCE[votable.DelayedTable(
+			V.TABLE[self.fielddefs], rows, V.BINARY2)]]
+		if batched:
+			return votable.asString(vot)
+		else:
+			origBatchEncoder = votable.tablewriter._getBatchEncoder
+			votable.tablewriter._getBatchEncoder = lambda *args: None
+			try:
+				return votable.asString(vot)
+			finally:
+				votable.tablewriter._getBatchEncoder = origBatchEncoder
+
+	def testSameAsRowEncoder(self):
+		self.assertEqual(self._serialize(self.rows), 
+			self._serialize(self.rows, batched=False))
+	
+	def testRoundtrip(self):
+		self.assertEqual(list(votable.parseString(
+				self._serialize(self.rows)).next()), [
+			[5, None, True, "abc", 1+1j],
+			[None, 4.25, None, "x?\x00", None],
+			[-3, -1.5, False, None, 0.25j]])
+
+	def testOverflowFallback(self):
+		res = self._serialize([[2**33, None, None, None, None]])
+		self.failUnless("Field 'FIELD_" in res)
+		self.failUnless("value '8589934592': 'i' format requires" in res)
+
+
 class NDArrayTest(testhelpers.VerboseTest):
 	"""tests for the (non-existing) support for multi-D arrays.
 	"""
@@ -338,6 +338,25 @@ class StanXMLTest(testhelpers.VerboseTest):
 		M = self.Model
 		rendered = M.Root[M.Nilble(restatt="x")].render()
 		self.failUnless('<Nilble restatt="x" xsi:nil="true"></Nilble>' in rendered)
+
+	def testAttributeSerialization(self):
+		class Attrd(self.Model.MEl):
+			_a_b = None
+			_a_a = None
+			_a_ab = None
+			_name_a_ab = "a-b"
+		el = Attrd(b="x", a='"<&', ab=2)["t"]
+		el.addAttribute("b", "y")
+		el.addAttribute("c", "z")
+		self.assertEqual(el.render(), 
+			'<Attrd a-b="2" a="&quot;&lt;&amp;" b="y" c="z">t</Attrd>')
+
+	def testWriteChunking(self):
+		M = self.Model
+		tree = M.Other[[M.Other[str(i)] for i in range(5000)]]
+		self.assertEqual(tree.render(), 
+			"<Other>%s</Other>"%"".join("<Other>%d</Other>"%i 
+				for i in range(5000)))
 	
 
 class StanXMLNamespaceTest(testhelpers.VerboseTest):
@@ -595,6 +614,105 @@ class ObscoreModificationTest(testhelpers.VerboseTest):
 			substrateTD.getProperty("obscoreClause"))
 
 
+class _MaterializedObscore(testhelpers.TestResource):
+	"""a connection with ivoa.obscore materialised in ivoa._obscorecache.
+	"""
+	resources = [('conn', tresc.dbConnection)]
+
+	def _remakeObscore(self, conn, materialize):
+		from gavo import rsc
+		base.setConfig("ivoa", "materializeObscore", str(materialize))
+		rsc.makeData(base.caches.getRD("//obscore").getById("create"),
+			connection=conn)
+		conn.commit()
+
+	def make(self, dependents):
+		conn = dependents["conn"]
+		self._remakeObscore(conn, True)
+		return conn
+
+	def clean(self, conn):
+		self._remakeObscore(conn, False)
+
+
+class MaterializedObscoreTest(testhelpers.VerboseTest):
+
+	resources = [('conn', _MaterializedObscore())]
+
+	def _importGlob(self, accref="foo/bar", **parseOptions):
+		from gavo import rsc
+		dd = base.parseFromString(rscdesc.RD, 
+			_obscoreRDTrunk%'productType="\'image\'"').getById("import")
+		dd.rd.sourceId = "__testing__"
+		data = rsc.makeData(dd, forceSource=[{"accref": accref}],
+			parseOptions=rsc.getParseOptions(validateRows=False,
+				**parseOptions),
+			connection=self.conn)
+		self.conn.commit()
+		return data
+
+	def _dropGlob(self, data):
+		data.drop(data.dd, connection=self.conn)
+		self.conn.commit()
+
+	def _getCachedIds(self):
+		return [r[0] for r in self.conn.query("SELECT obs_id"
+			" FROM ivoa._obscorecache WHERE obscore_source='test.glob'")]
+
+	def _getObscoreIds(self):
+		return [r[0] for r in self.conn.query("SELECT obs_id"
+			" FROM ivoa.obscore WHERE obs_id='foo/bar'")]
+
+	def _getViewDefinition(self):
+		return list(self.conn.query("SELECT definition FROM pg_views"
+			" WHERE schemaname='ivoa' AND viewname='obscore'"))[0][0]
+
+	def testViewOverCache(self):
+		self.failUnless("_obscorecache" in self._getViewDefinition())
+
+	def testImportAndDrop(self):
+		data = self._importGlob()
+		try:
+			self.assertEqual(self._getCachedIds(), ["foo/bar"])
+			self.assertEqual(self._getObscoreIds(), ["foo/bar"])
+		finally:
+			self._dropGlob(data)
+		self.assertEqual(self._getCachedIds(), [])
+		self.assertEqual(self._getObscoreIds(), [])
+
+	def testReimportReplaces(self):
+		data = self._importGlob()
+		try:
+			self._importGlob()
+			self.assertEqual(self._getCachedIds(), ["foo/bar"])
+		finally:
+			self._dropGlob(data)
+
+	def testUpdatingImportAdds(self):
+		data = self._importGlob()
+		try:
+			self._importGlob("foo/baz", updateMode=True)
+			self.assertEqual(sorted(self._getCachedIds()), ["foo/bar", "foo/baz"])
+		finally:
+			self._dropGlob(data)
+
+	def testSwitchingOff(self):
+		res = _MaterializedObscore()
+		data = self._importGlob()
+		try:
+			res._remakeObscore(self.conn, False)
+			self.failIf(list(self.conn.query("SELECT 1 FROM pg_tables"
+				" WHERE schemaname='ivoa' AND tablename='_obscorecache'")))
+			self.failIf("_obscorecache" in self._getViewDefinition())
+			self.assertEqual(self._getObscoreIds(), ["foo/bar"])
+
+			res._remakeObscore(self.conn, True)
+			self.assertEqual(self._getCachedIds(), ["foo/bar"])
+		finally:
+			res._remakeObscore(self.conn, True)
+			self._dropGlob(data)
+
+
 @contextlib.contextmanager
 def _fakeHTTPLib(respData="", respStatus=200, 
 		mime="application/x-votable", exception=None):
@@ -1097,5 +1215,66 @@ class RDManiTest(testhelpers.VerboseTest):
 			in res)
 
 
+class BoundedCacheTest(testhelpers.VerboseTest):
+	def testLRUEviction(self):
+		cache = base.caches.BoundedCache(maxEntries=2)
+		cache["a"], cache["b"] = 1, 2
+		cache.get("a")
+		cache["c"] = 3
+		self.assertEqual(cache.keys(), ["a", "c"])
+		self.assertEqual(cache.getStats()["evictions"], 1)
+
+	def testByteLimit(self):
+		cache = base.caches.BoundedCache(maxBytes=10, sizeFunction=len)
+		cache["a"] = "x"*6
+		cache["b"] = "y"*6
+		cache["c"] = "z"*12
+		self.assertEqual(cache.keys(), ["b"])
+		self.assertEqual(cache.getStats()["bytes"], 6)
+
+	def testTTL(self):
+		cache = base.caches.BoundedCache(ttl=-1)
+		cache["a"] = 1
+		self.assertEqual(cache.get("a"), None)
+		stats = cache.getStats()
+		self.assertEqual((stats["misses"], stats["expirations"]), (1, 1))
+
+	def testSingleFlight(self):
+		import threading, time
+		calls = []
+		def create(id):
+			calls.append(id)
+			time.sleep(0.1)
+			return id*2
+		getStuff = base.caches._makeCache(create, None)
+
+		threads = [threading.Thread(target=getStuff, args=(4,))
+			for i in range(5)]
+		for t in threads:
+			t.start()
+		for t in threads:
+			t.join()
+		self.assertEqual(calls, [4])
+		self.assertEqual(getStuff(4), 8)
+		self.assertEqual(getStuff.cache.getStats()["hits"], 1)
+
+	def testMakeCacheBoundedByDefault(self):
+		base.caches.makeCache("getTestingStuff", lambda id: id*2)
+		try:
+			self.assertEqual(base.caches.getTestingStuff.cache.maxEntries,
+				base.getConfig("memoCacheSize"))
+		finally:
+			del base.caches.getTestingStuff
+
+	def testObjectCacheBounded(self):
+		from gavo.protocols import simbadinterface
+		oc = simbadinterface.ObjectCache("bounded_test")
+		for i in range(base.getConfig("web", "sesameCacheSize")+2):
+			oc.addItem("object %d"%i, {"RA": i}, save=False)
+		self.assertEqual(len(oc.cache), base.getConfig("web", "sesameCacheSize"))
+		self.assertRaises(KeyError, oc.getItem, "object 0")
+		self.assertEqual(oc.getItem("object 2"), {"RA": 2})
+
+
 if __name__=="__main__":
 	testhelpers.main(KVLMakeTest)
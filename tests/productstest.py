@@ -106,6 +106,45 @@ class TarTest(_TestWithProductsTable):
 		self.failIf("\nobject: gabriel" in res)
 
 
+class _ComputedProduct(object):
+	def __init__(self, name, size, fails=False):
+		self.name, self.size, self.fails = name, size, fails
+	
+	def iterData(self):
+		if self.fails:
+			raise ValueError("Out of cheese")
+		for i in range(self.size):
+			yield "x"
+
+
+class _FakeProductData(object):
+	def __init__(self, prods):
+		self.prods = prods
+	
+	def getPrimaryTable(self):
+		return [{"source": p} for p in self.prods]
+
+
+class PrefetchingTarTest(testhelpers.VerboseTest):
+	def _getTarMembers(self, prods):
+		dest = StringIO()
+		maker = producttar.ProductTarMaker.__new__(producttar.ProductTarMaker)
+		maker._productsToTar(_FakeProductData(prods), dest)
+		f = tarfile.open("data.tar", "r:*", StringIO(dest.getvalue()))
+		return [(info.name, info.size) for info in f.getmembers()]
+
+	def testOrderPreserved(self):
+		self.assertEqual(self._getTarMembers(
+				[_ComputedProduct("p%d"%i, i*1000) for i in range(40)]),
+			[("dc_data/p%d"%i, i*1000) for i in range(40)])
+
+	def testFailureReported(self):
+		self.assertEqual(self._getTarMembers([
+				_ComputedProduct("ok", 10),
+				_ComputedProduct("broken", 10, True)]),
+			[("dc_data/ok", 10), ("dc_data/broken.error.txt", 42)])
+
+
 class _FakeRequest(object):
 	def __init__(self, **kwargs):
 		self.args = dict((key, [value]) for key, value in kwargs.iteritems())
@@ -342,6 +381,54 @@ class AutoPreviewTest(testhelpers.VerboseTest):
 			self.assertEqual(prod.read(200), "Abc, die Katze")
 
 
+class PreviewPoolTest(testhelpers.VerboseTest):
+	def testQueueBounded(self):
+		pool = products.PreviewPool(0, 0)
+		self.assertRaisesWithMsg(products.PreviewQueueFull,
+			"Too many previews are being computed right now.",
+			pool.submit,
+			(None,))
+
+	def testWorkerFailureReported(self):
+		success, msg = products._computePreviewInWorker(("data/junk.txt", 
+			{"accref": "data/junk.txt", "accessPath": "data/junk.txt",
+				"mime": "text/plain", "owner": None, "embargo": None,
+				"sourceTable": None, "datalink": None, "preview": None}))
+		self.assertFalse(success)
+		self.assertTrue(msg.startswith(
+			"DataError: Cannot make automatic preview for"))
+
+	def testDeadWorker(self):
+		class NeverReady(object):
+			def ready(self):
+				return False
+
+		class DeadWorkers(object):
+			def apply_async(self, func, args, callback):
+				self.asyncResult = NeverReady()
+				return self.asyncResult
+
+		class Shippable(object):
+			rAccref = products.RAccref("foo")
+			pr = {"accref": "foo"}
+
+		pool = products.PreviewPool(1, 1, timeout=1000)
+		pool.pool = DeadWorkers()
+		errors = []
+		d = pool.submit(Shippable()).addErrback(errors.append)
+		self.assertRaises(products.PreviewQueueFull, pool.submit, Shippable())
+
+		pool._expireJob(pool.pool.asyncResult, d)
+		self.assertEqual(pool.pending, 0)
+		self.assertEqual(errors[0].getErrorMessage(), 
+			"Preview generation took too long or failed in its worker process.")
+
+	def testUnshippableProduct(self):
+		class NoRow(object):
+			rAccref = products.RAccref("foo")
+		self.assertEqual(products._makePreviewJob(NoRow()), None)
+
+
 class MangledFITSProductsTest(testhelpers.VerboseTest):
 	resources = [("fitsTable", tresc.fitsTable)]
 
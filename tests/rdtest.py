@@ -10,6 +10,7 @@ Tests for resource descriptor handling
 
 import cStringIO
 import os
+import sys
 import threading
 import time
 import unittest
@@ -20,6 +21,7 @@ from gavo import base
 from gavo import rsc
 from gavo import rscdef
 from gavo import rscdesc
+from gavo import protocols
 from gavo.base import meta
 from gavo.protocols import tap
 from gavo.rscdef import regtest
@@ -431,6 +433,102 @@ class CachesTest(testhelpers.VerboseTest):
 		self.assertRaises(base.RDNotFound, base.caches.getRD, rdName)
 
 
+class RDPickleTest(testhelpers.VerboseTest):
+	def setUp(self):
+		base.setConfig("general", "pickleRDs", "True")
+	
+	def tearDown(self):
+		base.setConfig("general", "pickleRDs", "False")
+
+	def _writeRD(self, name, content):
+		return testhelpers.testFile(name+".rd", content,
+			inDir=base.getConfig("inputsDir"))
+
+	def _loadFresh(self, rdId):
+		base.caches.clearForName(rdId)
+		return base.caches.getRD(rdId)
+
+	def _touch(self, path):
+		os.utime(path, (time.time()+2, time.time()+2))
+
+	def testRestore(self):
+		with self._writeRD("pickled", '<resource schema="test">'
+				'<macDef name="greet">hello</macDef>'
+				'<table id="t"><column name="x"/></table></resource>'):
+			origRD = self._loadFresh("pickled")
+			rd = rscdesc.RD("pickled")
+			self.failUnless(rscdesc._restoreRD(rd))
+			self.failIf(rd is origRD)
+			self.assertEqual(rd.expand(r"\greet"), "hello")
+			self.failUnless(rd.getById("t").parent is rd)
+			self.assertEqual(rd.getById("t").rd.sourceId, "pickled")
+			self.assertEqual(rd.getById("t").columns[0].name, "x")
+
+	def testChangeInvalidates(self):
+		with self._writeRD("pickled", '<resource schema="test">'
+				'<table id="t"/></resource>') as srcPath:
+			self._loadFresh("pickled")
+			self._touch(srcPath)
+			self.failIf(rscdesc._restoreRD(rscdesc.RD("pickled")))
+
+	def testDependencyInvalidates(self):
+		with self._writeRD("pickledbase", '<resource schema="test">'
+				'<table id="t"><column name="x"/></table></resource>') as basePath:
+			with self._writeRD("pickled", '<resource schema="test">'
+					'<table id="u" original="pickledbase#t"/></resource>'):
+				self._loadFresh("pickledbase")
+				self._loadFresh("pickled")
+				self.failUnless(rscdesc._restoreRD(rscdesc.RD("pickled")))
+				self._touch(basePath)
+				self.failIf(rscdesc._restoreRD(rscdesc.RD("pickled")))
+
+	def testForeignElementsReferenced(self):
+		with self._writeRD("pickled", '<resource schema="test">'
+				'<table id="u" original="//users#users"/>'
+				'<service id="s" core="//dc_tables#queryList"/></resource>'):
+			self._loadFresh("pickled")
+			rd = rscdesc.RD("pickled")
+			self.failUnless(rscdesc._restoreRD(rd))
+			self.failUnless(rd.getById("s").core is 
+				base.caches.getRD("//dc_tables").getById("queryList"))
+
+	def testConfigChangeInvalidates(self):
+		configPath = os.environ["GAVOSETTINGS"]
+		oldStat = os.stat(configPath)
+		with self._writeRD("pickled", '<resource schema="test">'
+				'<table id="t"><column name="x"'
+				' description="\\getConfig{web}{sitename}"/></table>'
+				'</resource>'):
+			self._loadFresh("pickled")
+			self.failUnless(rscdesc._restoreRD(rscdesc.RD("pickled")))
+			self._touch(configPath)
+			try:
+				self.failIf(rscdesc._restoreRD(rscdesc.RD("pickled")))
+			finally:
+				os.utime(configPath, (oldStat.st_atime, oldStat.st_mtime))
+
+	def testUserconfigInvalidates(self):
+		with self._writeRD("pickled", '<resource schema="test">'
+				'<table id="t"/></resource>'):
+			self._loadFresh("pickled")
+			self.failUnless(rscdesc._restoreRD(rscdesc.RD("pickled")))
+			with testhelpers.userconfigContent("<macDef name='x'>y</macDef>"):
+				self.failIf(rscdesc._restoreRD(rscdesc.RD("pickled")))
+
+	def testRequireImported(self):
+		modName = "gavo.protocols.simbadinterface"
+		with self._writeRD("pickled", '<resource schema="test"'
+				' require="protocols.simbadinterface"/>'):
+			self._loadFresh("pickled")
+			origModule = sys.modules.pop(modName)
+			del protocols.simbadinterface
+			try:
+				self.failUnless(rscdesc._restoreRD(rscdesc.RD("pickled")))
+				self.failUnless(modName in sys.modules)
+			finally:
+				sys.modules[modName] = protocols.simbadinterface = origModule
+
+
 class DependentsTest(testhelpers.VerboseTest):
 	resources = [("conn", tresc.dbConnection)]
 
@@ -1239,10 +1239,14 @@ class OAIParameterTest(testhelpers.VerboseTest):
 class ResumptionTokenTest(testhelpers.VerboseTest):
 	def testBasic(self):
 		pars = {"verb": "listSets"}
-		pars["resumptionToken"] = oaiinter.makeResumptionToken(pars, 20)
+		pars["resumptionToken"] = oaiinter.makeResumptionToken(pars, {
+			"recTimestamp": datetime.datetime(2017, 3, 4, 10, 20, 30, 500),
+			"sourceRD": "data/pubtest",
+			"resId": "moribund"})
 		newPars = oaiinter.parseResumptionToken(pars)
 		self.assertEqual(pars["verb"], newPars["verb"])
-		self.assertEqual(newPars["resumptionToken"], 20)
+		self.assertEqual(newPars["resumptionToken"], 
+			("2017-03-04T10:20:30.000500", "data/pubtest", "moribund"))
 		
 
 	def testBadTokenFailsProperly(self):
@@ -1252,6 +1256,15 @@ class ResumptionTokenTest(testhelpers.VerboseTest):
 			({"resumptionToken": "xyz"},))
 
 
+class StoredRecordTest(testhelpers.VerboseTest):
+	def testRecordIsNotEscaped(self):
+		res = OAI.PMH[OAI.ListRecords[
+			OAI.storedRecord[u'<oai:record>R\xe4cord &amp; Co</oai:record>'],
+			OAI.storedRecord[u'<oai:record>2</oai:record>']]].render()
+		self.failUnless("<oai:ListRecords><oai:record>R\xc3\xa4cord &amp; Co"
+			"</oai:record><oai:record>2</oai:record></oai:ListRecords>" in res)
+
+
 class MetaExpandedTest(testhelpers.VerboseTest):
 	def testWithTAPRecord(self):
 		rd = base.caches.getRD("//tap")
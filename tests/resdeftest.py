@@ -376,6 +376,67 @@ class TableDefTest(testhelpers.VerboseTest):
 		self.assertEqual(t.getDDL(), "CREATE TEMP TABLE test (a real)")
 
 
+class RowValidationTest(testhelpers.VerboseTest):
+	def _getTD(self):
+		return base.parseFromString(rscdef.TableDef, '<table id="valt">'
+			'<column name="a" type="integer" required="True"/>'
+			'<column name="b" type="text"/>'
+			'<column name="quoted/c d"/></table>')
+
+	def testValidRow(self):
+		td = self._getTD()
+		self.assertRuns(td.validateRow, ({"a": 1, "b": None, "c d": 2.5},))
+		self.assertRuns(td.validateRow, ({"a": 1, "b": "x", "c d": None},))
+
+	def testMissing(self):
+		td = self._getTD()
+		self.assertRaisesWithMsg(base.ValidationError,
+			"Field b: Column b missing",
+			td.validateRow,
+			({"a": 1, "c d": 2.5},))
+		self.assertRaisesWithMsg(base.ValidationError,
+			'Field "c d": Column "c d" missing',
+			td.validateRow,
+			({"a": 1, "b": None},))
+
+	def testRequired(self):
+		td = self._getTD()
+		row = {"a": None, "b": "x", "c d": 2.5}
+		try:
+			td.validateRow(row)
+		except base.ValidationError, ex:
+			self.assertEqual(ex.colName, "a")
+			self.failUnless(ex.row is row)
+		else:
+			self.fail("Required column a not checked")
+
+	def testBatch(self):
+		td = self._getTD()
+		self.assertRuns(td.validateBatch, ([
+			{"a": 1, "b": None, "c d": 2.5},
+			{"a": 2, "b": "y", "c d": None}],))
+		self.assertRaisesWithMsg(base.ValidationError,
+			"Field a: Field a is empty but non-optional",
+			td.validateBatch,
+			([{"a": 1, "b": None, "c d": 2.5}, 
+				{"a": None, "b": "y", "c d": None}],))
+
+	def testMatchesGeneric(self):
+		td = self._getTD()
+		for row in [{}, {"a": 1}, {"a": None, "b": "x", "c d": 1}]:
+			try:
+				td._validateRowGenerically(row)
+			except base.ValidationError, ex:
+				expected = str(ex)
+			self.assertRaisesWithMsg(base.ValidationError, expected,
+				td.validateRow, (row,))
+
+	def testValidatorNotPickled(self):
+		td = self._getTD()
+		td.validateRow({"a": 1, "b": None, "c d": 2.5})
+		self.failIf("_cacheRowValidator" in td.__getstate__())
+
+
 class _QuotedNamesTable(testhelpers.TestResource):
 	def make(self, ignored):
 		return base.parseFromString(rscdef.TableDef, '<table id="t">'
@@ -313,6 +313,48 @@ class VarTest(testhelpers.VerboseTest):
 		self.assertEqual(mapper({}, None), {'si': None})
 
 
+class BatchTest(testhelpers.VerboseTest):
+	"""tests for processing lists of rows in rowmakers.
+	"""
+	def _getMapper(self, rowmakerCode):
+		dd, td = makeDD('<column name="si" type="smallint"/>'
+			'<column name="t" type="text"/>', rowmakerCode)
+		return dd.makes[0].rowmaker.compileForTableDef(td)
+
+	def testBasic(self):
+		mapper = self._getMapper('<var name="x">2*int(@a)</var>'
+			'<map dest="si">@x</map><map dest="t">@a+"x"</map>')
+		self.assertEqual(mapper.processBatch(
+				[{"a": "1"}, {"a": "2"}, {"a": "30"}], None),
+			[{"si": 2, "t": "1x"}, {"si": 4, "t": "2x"}, {"si": 60, "t": "30x"}])
+		self.assertEqual(mapper.rowsMade, 3)
+
+	def testIgnoredRowsDropped(self):
+		mapper = self._getMapper('<ignoreOn><keyIs key="a" value="2"/></ignoreOn>'
+			'<map dest="si">int(@a)</map><map dest="t">"x"</map>')
+		self.assertEqual(mapper.processBatch(
+				[{"a": "1"}, {"a": "2"}, {"a": "3"}], None),
+			[{"si": 1, "t": "x"}, {"si": 3, "t": "x"}])
+
+	def testErrorReported(self):
+		mapper = self._getMapper('<map dest="t">@a</map>'
+			'<map dest="si">int(@a)</map>')
+		try:
+			mapper.processBatch([{"a": "1"}, {"a": "zwei"}, {"a": "3"}], None)
+		except base.ValidationError, ex:
+			self.assertEqual(ex.colName, "si")
+			self.assertEqual(ex.row["a"], "zwei")
+		else:
+			self.fail("ValidationError not raised")
+
+	def testMultilineStringFallback(self):
+		mapper = self._getMapper('<map dest="t">"""a\nb"""+@a</map>'
+			'<map dest="si">1</map>')
+		self.assertEqual(mapper.batchFunction, None)
+		self.assertEqual(mapper.processBatch([{"a": "c"}], None),
+			[{"si": 1, "t": "a\nbc"}])
+
+
 class SimpleMapsTest(testhelpers.VerboseTest):
 	def testBasic(self):
 		dd, td = makeDD('<column name="si" type="smallint"/>'
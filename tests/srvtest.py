@@ -295,6 +295,42 @@ class EventDispatcherTest(testhelpers.VerboseTest):
 		self.assertEqual(ex.args[0], 
 			'[0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28, 29, 30, 31, 32, 33, 34, 35, 36, 37, 38, 39, 40, 41...')
 
+	def testBatchedRows(self):
+		ed = events.EventDispatcher()
+		got = []
+		ed.subscribeIncomingRows(got.append)
+		ed.notifyIncomingRows(20, {"a": 1})
+		ed.notifyIncomingRows(3, {"a": 2})
+		self.assertEqual(got, [20, 3])
+		self.assertEqual(ed.totalRead, 23)
+		self.assertEqual(ed.lastRow, {"a": 2})
+
+	def testProgress(self):
+		ed = events.EventDispatcher()
+		ed.progressInterval = 0
+		got = []
+		ed.subscribeProgress(got.append)
+		ed.notifyNewSource("src")
+		ed.notifyIncomingRows(5, None)
+		ed.notifyIncomingRows(5, None)
+		ed.notifySourceFinished()
+		self.assertEqual([(p.sourceName, p.sourceRead, p.sourceDone)
+			for p in got], 
+			[("src", 5, False), ("src", 10, False), ("src", 10, True)])
+		self.assertTrue(got[-1].rowsPerSecond>0)
+
+	def testProgressRateLimited(self):
+		ed = events.EventDispatcher()
+		got = []
+		ed.subscribeProgress(got.append)
+		ed.notifyNewSource("src")
+		for i in range(100):
+			ed.notifyIncomingRows(1000, None)
+		self.assertEqual(got, [])
+		ed.notifySourceFinished()
+		self.assertEqual(len(got), 1)
+		self.assertEqual(got[0].sourceRead, 100000)
+
 
 if __name__=="__main__":
 	testhelpers.main(CronTest)
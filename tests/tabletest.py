@@ -9,6 +9,8 @@ Tests for rsc.XTable
 
 
 import datetime
+import gc
+import weakref
 
 from gavo.helpers import testhelpers
 
@@ -17,7 +19,11 @@ from gavo import rsc
 from gavo import rscdef
 from gavo import rscdesc
 from gavo import svcs
+from gavo import utils
+from gavo.base import sqlsupport
+from gavo.rsc import qtable
 from gavo.stc import dm
+from gavo.svcs import service
 
 import tresc
 
@@ -275,6 +281,42 @@ class DBTableTest(tresc.TestWithDBConnection):
 			{'x': 50, 'y': "ab"}])
 		self.assertEqual(3, len([row for row in table]))
 
+	def _testCopyFeeding(self, copyMode):
+		td = self._getRD().getTableDefById("xy")
+		table = rsc.TableForDef(td, nometa=True, connection=self.conn)
+		table.recreate()
+		with table.getFeeder(copyMode=copyMode) as feeder:
+			for row in [
+					{'x': 100, 'y': "a\tb\\c"},
+					{'x': 200, 'y': None},
+					{'x': 50, 'y': u"\xe4"}]:
+				feeder.add(row)
+		self.assertEqual(feeder.getAffected(), 3)
+		self.assertEqual(sorted(row["y"] for row in table),
+			[None, u"a\tb\\c", u"\xe4"])
+
+	def testTextCopyFeeding(self):
+		self._testCopyFeeding("text")
+
+	def testBinaryCopyFeeding(self):
+		self._testCopyFeeding("binary")
+
+	def testCopyFallback(self):
+		td = self._getRD().getTableDefById("xy")
+		table = rsc.TableForDef(td, nometa=True, connection=self.conn)
+		table.recreate()
+		table.makeIndices()
+		try:
+			with table.getFeeder(copyMode="text") as feeder:
+				feeder.add({'x': 1, 'y': "a"})
+				feeder.add({'x': 1, 'y': "b"})
+		except sqlsupport.IntegrityError:
+			pass
+		else:
+			self.fail("Primary key violation in COPY not noticed")
+		finally:
+			self.conn.rollback()
+
 
 class DBTableQueryTest(tresc.TestWithDBConnection):
 	def setUp(self):
@@ -500,7 +542,8 @@ class QueryTableTest(testhelpers.VerboseTest):
 			"SELECT * FROM %s"%self.basetable.tableDef.getQName(),
 			base.getDBConnection("trustedquery"), autoClose=True)
 		rows = list(table)
-		self.failUnless(isinstance(rows[0], dict))
+		self.failUnless(isinstance(rows[0], utils.CompactRow))
+		self.assertEqual(rows[0]["alpha"], rows[0].asDict()["alpha"])
 
 	def testFromColumns(self):
 		with base.getTableConn() as conn:
@@ -528,6 +571,129 @@ class QueryTableTest(testhelpers.VerboseTest):
 			rows=[])
 
 
+class StreamingQueryTableTest(testhelpers.VerboseTest):
+	resources = [("basetable", tresc.csTestTable)]
+
+	def _makeTable(self, limit, **kwargs):
+		return rsc.StreamingQueryTable(self.basetable.tableDef,
+			"SELECT * FROM %s LIMIT %%(limit)s"%
+				self.basetable.tableDef.getQName(),
+			{"limit": limit+1}, matchLimit=limit, **kwargs)
+
+	def testOverflow(self):
+		table = self._makeTable(1)
+		rows = list(table)
+		self.assertEqual(len(rows), 1)
+		self.failUnless(isinstance(rows[0], utils.CompactRow))
+		self.assertEqual(table.overflowed, True)
+		self.assertEqual(table.getMeta("_queryStatus").getContent(), "OVERFLOW")
+
+	def testNoOverflow(self):
+		exhausted = []
+		table = self._makeTable(100000, onExhausted=exhausted.append)
+		rows = list(table)
+		self.assertEqual(table.overflowed, False)
+		self.assertEqual(table.rowsDelivered, len(rows))
+		self.assertEqual(exhausted, [table])
+		self.assertEqual(table.getMeta("_queryStatus").getContent(), "OK")
+
+	def testRowFilter(self):
+		table = self._makeTable(2)
+		table.addRowFilter(lambda row: dict(row, alpha=None))
+		rows = list(table)
+		self.failUnless(isinstance(rows[0], dict))
+		self.assertEqual(set(row["alpha"] for row in rows), set([None]))
+
+	def testConvertedTableCollected(self):
+		table = self._makeTable(2)
+		origAlphas = [row["alpha"] for row in self._makeTable(2)]
+		data = service.adaptTable(table, rscdef.ColumnList([
+			self.basetable.tableDef.getColumnByName("alpha").change(
+				unit="arcsec")]))
+		self.assertEqual([row["alpha"] for row in data.getPrimaryTable()],
+			[alpha*3600 for alpha in origAlphas])
+
+		tableRef = weakref.ref(table)
+		del table, data
+		gc.collect()
+		self.assertEqual(tableRef(), None)
+
+	def testRepeatedIteration(self):
+		table = self._makeTable(2)
+		list(table)
+		self.assertRaisesWithMsg(base.ReportableError,
+			"StreamingQueryTable already exhausted.",
+			list,
+			(table,))
+
+	def testAbandonedIteration(self):
+		table = self._makeTable(2)
+		rows = iter(table)
+		rows.next()
+		rows.close()
+		self.assertEqual(table.rowsDelivered, 1)
+		# connection must be back in the pool and usable
+		with base.getTableConn() as conn:
+			conn.cursor().execute("SELECT 1")
+
+	def testTimeoutOnStart(self):
+		table = rsc.StreamingQueryTable(
+			base.makeStruct(rscdef.TableDef, columns=[
+				base.makeStruct(rscdef.Column, name="x", type="text")]),
+			"SELECT pg_sleep(2)::TEXT AS x", timeout=0.05)
+		self.assertRaises(base.QueryCanceledError, table.start)
+		self.assertEqual(table.connection, None)
+		with base.getTableConn() as conn:
+			conn.cursor().execute("SELECT 1")
+
+	def testLateErrorInBand(self):
+		table = rsc.StreamingQueryTable(
+			base.makeStruct(rscdef.TableDef, columns=[
+				base.makeStruct(rscdef.Column, name="i", type="integer")]),
+			"SELECT CASE WHEN i<=%(safe)s THEN i ELSE 1/(i-i) END AS i"
+			" FROM generate_series(1, %(safe)s+10) AS i", 
+			{"safe": qtable.FETCH_SIZE},
+			errorMapper=lambda *excInfo: svcs.mapDBErrors(*excInfo))
+		table.start()
+		table.errorsInBand = True
+		rows = list(table)
+		self.assertEqual(len(rows), qtable.FETCH_SIZE)
+		self.failUnless(isinstance(table.error, base.ValidationError))
+		self.assertEqual(table.getMeta("_queryStatus").getContent(), "ERROR")
+
+	def testLateErrorRaised(self):
+		table = rsc.StreamingQueryTable(
+			base.makeStruct(rscdef.TableDef, columns=[
+				base.makeStruct(rscdef.Column, name="i", type="integer")]),
+			"SELECT CASE WHEN i<=%(safe)s THEN i ELSE 1/(i-i) END AS i"
+			" FROM generate_series(1, %(safe)s+10) AS i", 
+			{"safe": qtable.FETCH_SIZE})
+		self.assertRaises(base.DBError, list, table)
+		with base.getTableConn() as conn:
+			conn.cursor().execute("SELECT 1")
+
+	def testCoreTimeout(self):
+		core = base.makeStruct(svcs.DBCore, queriedTable=self.basetable.tableDef)
+		queryMeta = svcs.QueryMeta({})
+		queryMeta["timeout"] = 0.05
+		queryMeta["streamResult"] = True
+		try:
+			core._runQuery(core.outputTable, "pg_sleep(2) IS NOT NULL", {},
+				queryMeta)
+		except base.ValidationError, ex:
+			self.failUnless(str(ex).startswith(
+				"Field query: Query timed out (took too long)."))
+		else:
+			self.fail("Streamed query did not time out")
+
+	def testRefusesRows(self):
+		self.assertRaisesWithMsg(base.Error,
+			"StreamingQueryTables cannot be constructed with rows.",
+			rsc.StreamingQueryTable,
+			(None, ""),
+			rows=[])
+
+
 class RAMFeedingTest(testhelpers.VerboseTest):
 	def testWorks(self):
 		td = base.parseFromString(rscdef.TableDef, 
@@ -560,6 +726,29 @@ class RAMFeedingTest(testhelpers.VerboseTest):
 		self.assertRaises(base.DataError, f.add, {'x': 1})
 
 
+class MaxRowsTest(testhelpers.VerboseTest):
+	def testStopsAtMaxRows(self):
+		dd = base.parseFromString(rscdef.DataDescriptor,
+			'<data><table id="foo"><column name="x" type="integer"/></table>'
+			'<make table="foo"/><dictlistGrammar/></data>')
+		progress, oldTotal = [], base.ui.totalRead
+		# maxRows is checked against the dispatcher's running total
+		base.ui.totalRead = 0
+		base.ui.subscribeProgress(progress.append)
+		try:
+			data = rsc.makeData(dd,
+				forceSource=[{'x': i} for i in range(2500)],
+				parseOptions=rsc.getParseOptions(maxRows=1500))
+		finally:
+			base.ui.unsubscribeProgress(progress.append)
+			base.ui.totalRead = oldTotal
+		rows = data.getPrimaryTable().rows
+		self.assertEqual(len(rows), 1500)
+		self.assertEqual(rows[-1]['x'], 1499)
+		self.assertEqual(progress[-1].sourceRead, 1500)
+		self.assertTrue(progress[-1].sourceDone)
+
+
 class DBFeedingTest(tresc.TestWithDBConnection):
 	def testInactiveRaises(self):
 		td = base.parseFromString(rscdef.TableDef, 
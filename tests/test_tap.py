@@ -200,6 +200,34 @@ class SyncQueryTest(TAPRenderTest):
 			}, [
 				'BINARY2', 'AEAAAABBYAAA'])
 
+	def testStreamingQueryError(self):
+		def assertError(res):
+			self.assertEqual(res[1].code, 400)
+			self.failUnless('<INFO name="QUERY_STATUS" value="ERROR">' in res[0])
+			self.failUnless("division by zero" in res[0])
+
+		return trialhelpers.runQuery(self.renderer, "GET", "/sync", {
+				"REQUEST": "doQuery",
+				"LANG": "ADQL",
+				"QUERY": 'SELECT 1/(alpha-alpha) AS x FROM test.adql',
+				"FORMAT": "text/csv"
+			}).addCallback(assertError)
+
+	def testUWSFallback(self):
+		base.setConfig("async", "streamSync", "False")
+		def restoreConfig(res):
+			base.setConfig("async", "streamSync", "True")
+			return res
+
+		return self.assertGETHasStrings("/sync", {
+				"REQUEST": "doQuery",
+				"LANG": "ADQL",
+				"MAXREC": "1",
+				"QUERY": 'SELECT alpha FROM test.adql'
+			}, [
+				'<INFO name="QUERY_STATUS" value="OVERFLOW"', ]
+			).addBoth(restoreConfig)
+
 	def testBadUploadSyntax(self):
 		return self.assertPOSTHasStrings("/sync", {
 				"REQUEST": "doQuery",
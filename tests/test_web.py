@@ -10,10 +10,12 @@ Tests for various parts of the server infrastructure, using trial.
 
 from cStringIO import StringIO
 import atexit
+import gzip
 import time
 import os
 import re
 
+from nevow import inevow
 from twisted.internet import reactor
 
 import trialhelpers
@@ -420,6 +422,43 @@ class BuiltinResTest(trialhelpers.ArchiveTest):
 			['Disallow: /login'])
 
 
+class CachedPageTest(trialhelpers.ArchiveTest):
+	_content = "Eine Seite, die sich gut komprimieren laesst.\n"*100
+
+	def _render(self, headers={}):
+		def addHeaders(req):
+			for key, value in headers.iteritems():
+				req.received_headers[key] = value
+
+		from gavo.web import caching
+		page = caching.CachedPage(self._content, 
+			{"content-type": "text/plain", "content-length": "20"}, None)
+		ctx = trialhelpers.getRequestContext("/foo", requestMogrifier=addHeaders)
+		return page.renderHTTP(ctx), inevow.IRequest(ctx)
+
+	def testPlainDelivery(self):
+		content, request = self._render()
+		self.assertEqual(content, self._content)
+		self.assertEqual(request.headers["content-length"], 
+			str(len(self._content)))
+		self.assertEqual(request.headers["vary"], "Accept-Encoding")
+		self.failIf("content-encoding" in request.headers)
+
+	def testGzipDelivery(self):
+		content, request = self._render({"accept-encoding": "gzip, deflate"})
+		self.assertEqual(request.headers["content-encoding"], "gzip")
+		self.assertEqual(
+			gzip.GzipFile(fileobj=StringIO(content)).read(), self._content)
+		self.failUnless(len(content)<len(self._content)/10)
+
+	def testConditionalGET(self):
+		_, request = self._render()
+		content, request = self._render(
+			{"if-none-match": request.headers["etag"]})
+		self.assertEqual(content, "")
+		self.assertEqual(request.code, 304)
+
+
 class ConstantRenderTest(trialhelpers.ArchiveTest):
 	def testVOPlot(self):
 		return self.assertGETHasStrings("/__system__/run/voplot/fixed",
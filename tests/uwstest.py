@@ -398,5 +398,77 @@ class UserUWSTest(testhelpers.VerboseTest):
 			worker1.destroy(jobId)
 
 
+class _FakePool(object):
+	def __init__(self):
+		self.idle, self.gone = [], []
+
+	def workerIdle(self, worker):
+		self.idle.append(worker)
+	
+	def workerGone(self, worker):
+		self.gone.append(worker)
+
+
+class _FakeWorkerSystem(object):
+	def __init__(self):
+		self.checked = []
+
+	def getJob(self, jobId):
+		self.checked.append(jobId)
+		raise uws.JobNotFound(jobId)
+
+
+class _FakeTransport(object):
+	def __init__(self):
+		self.written, self.signals = [], []
+	
+	def writeToChild(self, fd, data):
+		self.written.append((fd, data))
+	
+	def signalProcess(self, sig):
+		self.signals.append(sig)
+
+
+class PoolWorkerProtocolTest(testhelpers.VerboseTest):
+	def _getWorker(self):
+		pool = _FakePool()
+		worker = uws._PoolWorkerProtocol(pool)
+		worker.transport = _FakeTransport()
+		return pool, worker
+
+	def testJobCycle(self):
+		pool, worker = self._getWorker()
+		worker.childDataReceived(3, "REA")
+		self.assertEqual(pool.idle, [])
+		worker.childDataReceived(3, "DY\n")
+		self.assertEqual(pool.idle, [worker])
+
+		ws = _FakeWorkerSystem()
+		worker.runJob("abc", ws, ["taprun", "--", "abc"])
+		self.assertEqual(worker.transport.written, 
+			[(0, '["taprun", "--", "abc"]\n')])
+		worker.childDataReceived(3, "DONE\n")
+		self.assertEqual(ws.checked, ["abc"])
+		self.assertEqual(pool.idle, [worker, worker])
+		self.assertEqual(worker.current, None)
+
+	def testRetireAfterKill(self):
+		pool, worker = self._getWorker()
+		ws = _FakeWorkerSystem()
+		worker.runJob("abc", ws, ["taprun", "--", "abc"])
+		worker.retireAfterJob = True
+		worker.childDataReceived(3, "DONE\n")
+		self.assertEqual(pool.idle, [])
+		self.assertEqual(worker.transport.signals, ["TERM"])
+
+	def testProcessDeath(self):
+		pool, worker = self._getWorker()
+		ws = _FakeWorkerSystem()
+		worker.runJob("abc", ws, ["taprun", "--", "abc"])
+		worker.processEnded(None)
+		self.assertEqual(ws.checked, ["abc"])
+		self.assertEqual(pool.gone, [worker])
+
+
 if __name__=="__main__":
 	testhelpers.main(JobHandlingTest)
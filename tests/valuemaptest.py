@@ -216,5 +216,38 @@ class STCMappingTest(_MapperTestBase):
 		self.failUnless(res["pos"].startswith("Position FK5"))
 
 
+class CompactRowTest(testhelpers.VerboseTest):
+	def _getTable(self, compact):
+		td = base.parseFromString(rscdef.TableDef, """<table>
+			<column name="a" type="integer"/>
+			<column name="d" type="date"/>
+			<column name="s" type="text"/></table>""")
+		if compact:
+			makeRow = td.getCompactRowClass()
+		else:
+			makeRow = td.makeRowFromTuple
+		return rsc.TableForDef(td, rows=[makeRow(tup) for tup in [
+			(1, datetime.date(2000, 1, 1), "x"), (2, None, "y")]])
+
+	def testTuples(self):
+		self.assertEqual(
+			list(valuemappers.SerManager(self._getTable(True)).getMappedTuples()),
+			list(valuemappers.SerManager(self._getTable(False)).getMappedTuples()))
+
+	def testValues(self):
+		res = list(valuemappers.SerManager(self._getTable(True)
+			).getMappedValues())
+		self.assertEqual(res,
+			list(valuemappers.SerManager(self._getTable(False)
+				).getMappedValues()))
+		self.failUnless(isinstance(res[0], dict))
+
+	def testClassesKeptWithTable(self):
+		td1, td2 = self._getTable(True).tableDef, self._getTable(True).tableDef
+		self.failUnless(td1.getCompactRowClass() is td1.getCompactRowClass())
+		self.failIf(td1.getCompactRowClass() is td2.getCompactRowClass())
+		self.assertEqual(td2.getCompactRowClass().fieldNames, ("a", "d", "s"))
+
+
 if __name__=="__main__":
 	testhelpers.main(HTMLMapperTest)